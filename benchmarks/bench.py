@@ -0,0 +1,293 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""time the things shell-themer does when a shell starts
+
+each benchmark is timed with timeit, and the results can be saved as json
+and compared against a saved baseline
+"""
+
+import argparse
+import datetime
+import fnmatch
+import functools
+import json
+import os
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import tomlkit
+
+from shell_themer.version import version_string
+
+from . import themes
+
+GENERATORS = [
+    "environment_variables",
+    "fzf",
+    "ls_colors",
+    "exa_colors",
+    "iterm",
+    "shell",
+]
+
+
+def _cold(func):
+    """func, with rich's caches emptied before every call, like they are
+    when a shell starts"""
+
+    def _wrapper():
+        themes.clear_caches()
+        return func()
+
+    return _wrapper
+
+
+def benchmarks(workdir, scales=()):
+    """all the benchmarks
+
+    workdir is a directory we can write theme files into
+    scales - also run against synthetic themes this many times bigger than
+        the defaults
+
+    :returns: a list of (name, function) tuples, the function is what gets
+        timed
+    """
+    # pylint: disable=protected-access, too-many-locals
+    cases = []
+    sizes = dict(themes.THEMES)
+    for factor in scales:
+        sizes[f"x{factor}"] = themes.scaled(factor)
+    for size, make_theme in sizes.items():
+        toml = make_theme()
+        thm = themes.load(toml)
+        scopes = themes.generated_scopes(thm)
+
+        theme_file = pathlib.Path(workdir) / f"{size}.toml"
+        theme_file.write_text(toml, encoding="utf-8")
+        cmd = [
+            sys.executable,
+            "-m",
+            "shell_themer",
+            "-f",
+            str(theme_file),
+            "generate",
+            "--scope",
+            ",".join(scopes),
+        ]
+        cold_start = functools.partial(
+            subprocess.run, cmd, stdout=subprocess.DEVNULL, check=True
+        )
+        cases.append((f"cold_start[{size}]", cold_start))
+        cases.append((f"load[{size}]", lambda toml=toml: tomlkit.loads(toml)))
+        cases.append(
+            (
+                f"process_definition[{size}]",
+                _cold(lambda thm=thm: thm._process_definition()),
+            )
+        )
+
+        # a value with a reference to every variable, or the first hundred
+        variables = list(thm.definition.get("variables", {}).keys())[:100]
+        variables = variables or ["missing"]
+        value = " ".join(f"{{var:{name}}}" for name in variables)
+        cases.append(
+            (
+                f"variable_interpolate[{size}]",
+                lambda thm=thm, value=value: thm.variable_interpolate(value),
+            )
+        )
+        styles = [name for name, style in thm.styles.items() if style.color][:100]
+        value = " ".join(f"{{style:{name}}}" for name in styles)
+        cases.append(
+            (
+                f"style_interpolate[{size}]",
+                _cold(lambda thm=thm, value=value: thm.style_interpolate(value)),
+            )
+        )
+
+        for generator in GENERATORS:
+            scopedefs = [
+                (name, thm.scopedef_for(name))
+                for name in scopes
+                if thm.scopedef_for(name)["generator"] == generator
+            ]
+            if not scopedefs:
+                continue
+
+            def _generate(thm=thm, scopedefs=scopedefs, generator=generator):
+                for name, scopedef in scopedefs:
+                    thm._generate_scope(name, scopedef, generator)
+
+            cases.append((f"generate_{generator}[{size}]", _cold(_generate)))
+
+        args = argparse.Namespace(scope=",".join(scopes), defer_conditions=False)
+        cases.append(
+            (
+                f"generate_scopes[{size}]",
+                _cold(lambda thm=thm, args=args: thm.generate_scopes(args)),
+            )
+        )
+    return cases
+
+
+def measure(func, repeat=5):
+    """time func
+
+    func is called enough times in each round to take at least 0.2 seconds
+
+    :returns: a dict with the fastest and median time of one call, in
+        seconds
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def run(pattern=None, repeat=5, report=print, scales=()):
+    """run the benchmarks whose names match pattern, or all of them
+
+    :returns: the results, ready to be saved as json
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, func in benchmarks(workdir, scales):
+            if pattern and not fnmatch.fnmatchcase(name, pattern):
+                continue
+            results[name] = measure(func, repeat)
+            report(f"{name:40} {format_time(results[name]['min']):>10}")
+    return {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "shell_themer": version_string(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(results, baseline, threshold):
+    """compare results to baseline
+
+    a benchmark regressed if its fastest time is more than threshold (0.1
+    is 10%) slower than in the baseline
+
+    :returns: a tuple of (lines of a report, names of the regressions)
+    """
+    lines = []
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        try:
+            before = baseline["benchmarks"][name]["min"]
+        except KeyError:
+            lines.append(f"{name:40} {'':>10} {format_time(result['min']):>10}   new")
+            continue
+        change = result["min"] / before - 1
+        flag = ""
+        if change > threshold:
+            flag = "REGRESSED"
+            regressions.append(name)
+        lines.append(
+            f"{name:40} {format_time(before):>10} {format_time(result['min']):>10}"
+            f" {change:+8.1%} {flag}"
+        )
+    return lines, regressions
+
+
+def format_time(seconds):
+    """seconds in units people can read"""
+    for unit, scale in [("s", 1), ("ms", 1e-3), ("us", 1e-6)]:
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def main(argv=None):
+    """run the benchmarks from the command line"""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="benchmark shell-themer"
+    )
+    parser.add_argument(
+        "-k", metavar="<pattern>", help="only run benchmarks matching this glob"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="rounds of timing for each benchmark"
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        action="append",
+        default=[],
+        metavar="<factor>",
+        help="also run against a synthetic theme this many times bigger, can be"
+        " given more than once",
+    )
+    parser.add_argument("--output", metavar="<path>", help="save the results as json")
+    parser.add_argument(
+        "--baseline", metavar="<path>", help="compare the results to these results"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="how much slower than the baseline is a regression (default: 0.1)",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(args.k, args.repeat, scales=args.scale)
+    if args.output:
+        path = pathlib.Path(args.output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+
+    if not args.baseline:
+        return 0
+    try:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        print(f"{args.baseline}: no baseline to compare to")
+        return 0
+    lines, regressions = compare(results, baseline, args.threshold)
+    print()
+    print(f"{'compared to ' + args.baseline:40} {'baseline':>10} {'now':>10}")
+    print("\n".join(lines))
+    if regressions:
+        print(
+            f"\n{len(regressions)} benchmarks are more than {args.threshold:.0%} slower"
+        )
+        return 1
+    return 0
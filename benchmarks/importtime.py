@@ -0,0 +1,316 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""check what 'shell-themer generate' imports against a budget
+
+Runs generate with 'python -X importtime', and fails if any top level
+module was imported which isn't in the budget. Which modules from the
+standard library import each other changes with every version of python, so
+the budget has a list of them for each version, and they are only checked on
+the versions in the budget. The budget is in import_budget.json next to this
+file.
+
+It also fails if importing shell_themer took longer than --max-ms, or than
+the time saved in the file given with --times. Times from different machines
+can't be compared, so unlike the modules they aren't checked in. Run it with
+'invoke importtime', or 'python -m benchmarks.importtime' from the root of
+the repository.
+"""
+
+import argparse
+import importlib.util
+import json
+import math
+import pathlib
+import re
+import subprocess
+import sys
+import tempfile
+
+from . import themes
+
+BUDGET_FILE = pathlib.Path(__file__).resolve().parent / "import_budget.json"
+# how much slower than the time measured by --save the budget allows
+MARGIN = 1.2
+
+LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def parse(stderr):
+    """parse the output of 'python -X importtime'
+
+    :returns: a list of (module, self_us, cumulative_us, depth) tuples, in
+        the order python printed them, which is every module after all the
+        modules it imported
+    """
+    imports = []
+    for line in stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            selftime, cumulative, indent, module = match.groups()
+            # python indents the name with one space, and two more for each
+            # level of nesting
+            depth = (len(indent) - 1) // 2
+            imports.append((module, int(selftime), int(cumulative), depth))
+    return imports
+
+
+def ours(imports, package="shell_themer"):
+    """the imports from importing package onwards, leaving out whatever
+    python and site-packages imported before our code ran
+
+    :returns: a tuple of (the time spent importing from then on in
+        microseconds, the list of imports)
+    """
+    for pos, (module, _, _, depth) in enumerate(imports):
+        if module == package:
+            start = pos
+            # the modules package imported are just before it, and nested
+            # deeper
+            while start > 0 and imports[start - 1][3] > depth:
+                start -= 1
+            # package doesn't import everything up front, so count every
+            # top level import from here on, not just package
+            total = sum(
+                cumulative
+                for _, _, cumulative, level in imports[start:]
+                if level == depth
+            )
+            return total, imports[start:]
+    raise ValueError(f"{package} was not imported")
+
+
+def _found(imports):
+    """the top level names of the imported modules
+
+    python lists failed imports too, like the copy module looking for
+    jython's 'org', so modules which can't be found are left out
+    """
+    names = {module.split(".")[0] for module, _, _, _ in imports}
+    return {name for name in names if importlib.util.find_spec(name) is not None}
+
+
+def third_party(imports):
+    """the top level names of the imported modules which aren't in the
+    standard library"""
+    return sorted(name for name in _found(imports) if not _is_stdlib(name))
+
+
+def standard_library(imports):
+    """the top level names of the imported modules from the standard library"""
+    return sorted(name for name in _found(imports) if _is_stdlib(name))
+
+
+def python_version():
+    """the version of python, which is the key for the standard library
+    modules in the budget"""
+    return f"{sys.version_info[0]}.{sys.version_info[1]}"
+
+
+def _is_stdlib(name):
+    try:
+        return name in sys.stdlib_module_names
+    except AttributeError:  # pragma: nocover
+        # before python 3.10 we have to go look for it
+        import sysconfig  # pylint: disable=import-outside-toplevel
+
+        if name in sys.builtin_module_names:
+            return True
+        spec = importlib.util.find_spec(name)
+        origin = (spec and spec.origin) or ""
+        stdlib = sysconfig.get_paths()["stdlib"]
+        return origin.startswith(stdlib) and "site-packages" not in origin
+
+
+def measure(theme_file, runs=3):
+    """run generate with theme_file under -X importtime runs times
+
+    :returns: a tuple of (the fastest cumulative time to import
+        shell_themer in microseconds, the imports from that run)
+    """
+    results = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [
+                sys.executable,
+                "-X",
+                "importtime",
+                "-m",
+                "shell_themer",
+                "-f",
+                str(theme_file),
+                "generate",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=True,
+        )
+        results.append(ours(parse(proc.stderr)))
+    return min(results, key=lambda result: result[0])
+
+
+def check(total, imports, budget):
+    """compare what we imported to the budget
+
+    :returns: a list of the ways we are over budget
+    """
+    problems = []
+    if budget.get("cumulative_ms") and total / 1000 > budget["cumulative_ms"]:
+        problems.append(
+            f"importing shell_themer took {total / 1000:.1f}ms, the budget is"
+            f" {budget['cumulative_ms']}ms"
+        )
+    extra = sorted(set(third_party(imports)) - set(budget["modules"]))
+    if extra:
+        problems.append(f"imported modules not in the budget: {', '.join(extra)}")
+    allowed = budget.get("stdlib", {}).get(python_version())
+    if allowed is not None:
+        extra = sorted(set(standard_library(imports)) - set(allowed))
+        if extra:
+            problems.append(
+                f"imported standard library modules not in the budget for python"
+                f" {python_version()}: {', '.join(extra)}"
+            )
+    return problems
+
+
+def report(total, imports, top=15):
+    """the lines of a report of the slowest imports"""
+    lines = [f"importing shell_themer took {total / 1000:.1f}ms", ""]
+    lines.append(f"{'module':50} {'self ms':>10} {'cumulative ms':>14}")
+    slowest = sorted(imports, key=lambda item: item[1], reverse=True)[:top]
+    for module, selftime, cumulative, _ in slowest:
+        lines.append(f"{module:50} {selftime / 1000:>10.1f} {cumulative / 1000:>14.1f}")
+    # and how much each package cost, counting everything it imported
+    packages = {}
+    for module, selftime, _, _ in imports:
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + selftime
+    lines.append("")
+    lines.append(f"{'package':50} {'self ms':>10}")
+    for package, selftime in sorted(
+        packages.items(), key=lambda item: item[1], reverse=True
+    )[:top]:
+        lines.append(f"{package:50} {selftime / 1000:>10.1f}")
+    return lines
+
+
+def main(argv=None):
+    """check the imports from the command line"""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.importtime",
+        description="check what shell-themer imports against a budget",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=3,
+        help="run this many times and use the fastest (default: 3)",
+    )
+    parser.add_argument(
+        "--budget",
+        metavar="<path>",
+        default=str(BUDGET_FILE),
+        help="the budget to check against",
+    )
+    parser.add_argument(
+        "--times",
+        metavar="<path>",
+        help="the file with the most milliseconds importing can take on this"
+        " machine",
+    )
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        help="the most milliseconds importing can take, instead of the time in"
+        " --times",
+    )
+    parser.add_argument(
+        "--save",
+        action="store_true",
+        help="save the modules imported now as the budget, and the time it took"
+        " in --times",
+    )
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        theme_file = pathlib.Path(workdir) / "theme.toml"
+        theme_file.write_text(themes.small(), encoding="utf-8")
+        total, imports = measure(theme_file, args.runs)
+    print("\n".join(report(total, imports)))
+
+    try:
+        with open(args.budget, encoding="utf-8") as file:
+            budget = json.load(file)
+    except FileNotFoundError:
+        budget = {"modules": []}
+    if args.save:
+        budget["modules"] = third_party(imports)
+        budget.setdefault("stdlib", {})[python_version()] = standard_library(imports)
+        with open(args.budget, "w", encoding="utf-8") as file:
+            file.write(json.dumps(budget, indent=2) + "\n")
+        print(f"\nsaved the budget in {args.budget}")
+        if args.times:
+            max_ms = args.max_ms
+            if max_ms is None:
+                max_ms = math.ceil(total / 1000 * MARGIN)
+            times = pathlib.Path(args.times)
+            times.parent.mkdir(parents=True, exist_ok=True)
+            times.write_text(
+                json.dumps({"cumulative_ms": max_ms}, indent=2) + "\n",
+                encoding="utf-8",
+            )
+            print(f"saved the time in {args.times}")
+        return 0
+
+    if args.times:
+        try:
+            with open(args.times, encoding="utf-8") as file:
+                budget["cumulative_ms"] = json.load(file)["cumulative_ms"]
+        except FileNotFoundError:
+            print(f"\n{args.times}: no time to compare to")
+    if args.max_ms is not None:
+        budget["cumulative_ms"] = args.max_ms
+
+    problems = check(total, imports, budget)
+    print()
+    if problems:
+        print("\n".join(problems))
+        return 1
+    if budget.get("cumulative_ms"):
+        print(
+            f"within the budget of {budget['cumulative_ms']}ms and"
+            f" {len(budget['modules'])} modules"
+        )
+    else:
+        print(f"within the budget of {len(budget['modules'])} modules")
+    if python_version() not in budget.get("stdlib", {}):
+        print(
+            f"the budget has no standard library modules for python {python_version()}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
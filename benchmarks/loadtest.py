@@ -0,0 +1,320 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""start lots of shells at once, and see how long shell-themer takes in each
+
+Spawns many 'shell-themer generate' processes at the same moment, like a
+terminal restoring a few dozen tabs, and reports the latency of each one,
+the cpu time they used, and the most memory any of them used. Everything
+happens in a temporary directory, with its own $THEME_DIR, cache, and
+daemon socket, so it runs offline and doesn't touch your own setup.
+
+Each strategy is a different way for shells to get their output:
+
+cli - every shell runs 'generate', the baseline
+if-stale - every shell runs 'generate --output --if-stale', like the
+    code from 'init', so only one of them does the work
+daemon - every shell runs 'generate --via-daemon' with 'serve' running
+
+Run it with 'invoke loadtest', or 'python -m benchmarks.loadtest' from the
+root of the repository. It needs os.wait4(), so it doesn't run on windows.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import tomlkit
+
+from shell_themer import daemon
+from shell_themer.history import percentile
+
+from . import themes
+
+STRATEGIES = ["cli", "if-stale", "daemon"]
+
+
+def theme_toml(name, enabled_if=0.0, enabled_if_command="true", seed=0):
+    """the toml for the theme with name from the benchmarks, or xN for a
+    synthetic theme N times bigger than the defaults
+
+    a fraction of the scopes, given by enabled_if, get enabled_if_command
+    """
+    if name in themes.THEMES:
+        toml = themes.THEMES[name]()
+    elif name.startswith("x") and name[1:].isdigit():
+        toml = themes.scaled(int(name[1:]))()
+    else:
+        raise ValueError(f"{name}: unknown theme")
+    if not enabled_if:
+        return toml
+    definition = tomlkit.parse(toml)
+    rand = random.Random(seed)
+    for scopedef in definition["scope"].values():
+        scopedef.pop("enabled_if", None)
+        if rand.random() < enabled_if:
+            scopedef["enabled_if"] = enabled_if_command
+    return tomlkit.dumps(definition)
+
+
+def environment(workdir):
+    """an environment for the shells which keeps everything in workdir"""
+    env = dict(os.environ)
+    for var in ["SHELL_THEMER_HISTORY", "SHELL_THEMER_TRACE", "THEME_FILE"]:
+        env.pop(var, None)
+    env["THEME_DIR"] = str(workdir / "themes")
+    env["SHELL_THEMER_CACHE_DIR"] = str(workdir / "cache")
+    env["SHELL_THEMER_SOCKET"] = str(workdir / "daemon.sock")
+    return env
+
+
+def command(strategy, scopes, workdir):
+    """the command each shell runs for strategy"""
+    cmd = [sys.executable, "-m", "shell_themer", "-t", "theme", "generate"]
+    cmd += ["--scope", ",".join(scopes)]
+    if strategy == "if-stale":
+        cmd += ["--output", str(workdir / "cache" / "theme.sh"), "--if-stale"]
+    elif strategy == "daemon":
+        cmd += ["--via-daemon"]
+    return cmd
+
+
+def start_daemon(env, timeout=10):
+    """start 'shell-themer serve' and wait until it is listening
+
+    :returns: the Popen object for the daemon
+    """
+    proc = subprocess.Popen(  # pylint: disable=consider-using-with
+        [sys.executable, "-m", "shell_themer", "serve"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        # checking if it's running connects without sending a request,
+        # which the daemon complains about
+        stderr=subprocess.DEVNULL,
+    )
+    sock = env["SHELL_THEMER_SOCKET"]
+    deadline = time.monotonic() + timeout
+    while not daemon.is_running(sock):
+        if proc.poll() is not None or time.monotonic() > deadline:
+            proc.kill()
+            raise RuntimeError("the daemon didn't start")
+        time.sleep(0.01)
+    return proc
+
+
+def _run_one(cmd, env, errfile, barrier):
+    """run cmd once everyone is ready to go
+
+    :returns: a dict with the latency, cpu time, peak memory, and exit code
+    """
+    with open(errfile, "wb") as err:
+        barrier.wait()
+        start = time.perf_counter()
+        proc = subprocess.Popen(  # pylint: disable=consider-using-with
+            cmd, env=env, stdout=subprocess.DEVNULL, stderr=err
+        )
+        # wait4() tells us the resources the process used, which
+        # Popen.wait() doesn't
+        _, status, usage = os.wait4(proc.pid, 0)
+        end = time.perf_counter()
+    if os.WIFEXITED(status):
+        proc.returncode = os.WEXITSTATUS(status)
+    else:
+        proc.returncode = -os.WTERMSIG(status)
+    maxrss = usage.ru_maxrss
+    if sys.platform != "darwin":
+        # linux reports kilobytes, macos reports bytes
+        maxrss *= 1024
+    return {
+        "latency": end - start,
+        "cpu": usage.ru_utime + usage.ru_stime,
+        "maxrss": maxrss,
+        "exit": proc.returncode,
+    }
+
+
+def run_round(cmd, env, shells, workdir):
+    """start shells copies of cmd at the same moment
+
+    :returns: a list of the results from each of them
+    """
+    barrier = threading.Barrier(shells)
+    results = [None] * shells
+
+    def _shell(num):
+        errfile = workdir / f"stderr{num}.txt"
+        results[num] = _run_one(cmd, env, errfile, barrier)
+        if results[num]["exit"]:
+            results[num]["stderr"] = errfile.read_text(errors="replace")
+
+    threads = [threading.Thread(target=_shell, args=(num,)) for num in range(shells)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def summarize(results):
+    """summarize the results from all the shells"""
+    latencies = [result["latency"] for result in results]
+    cpus = [result["cpu"] for result in results]
+    return {
+        "shells": len(results),
+        "failed": len([result for result in results if result["exit"]]),
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "cpu_mean": sum(cpus) / len(cpus),
+        "cpu_total": sum(cpus),
+        "maxrss": max(result["maxrss"] for result in results),
+    }
+
+
+def run(args, report=print):
+    """run the load test described by args
+
+    :returns: the summary of the results for each strategy
+    """
+    summaries = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = pathlib.Path(tmpdir)
+        (workdir / "themes").mkdir()
+        (workdir / "cache").mkdir()
+        toml = theme_toml(args.theme, args.enabled_if, args.enabled_if_command)
+        (workdir / "themes" / "theme.toml").write_text(toml, encoding="utf-8")
+        scopes = args.scope.split(",") if args.scope else None
+        scopes = scopes or themes.generated_scopes(themes.load(toml))
+        env = environment(workdir)
+
+        for strategy in args.strategy or STRATEGIES:
+            cmd = command(strategy, scopes, workdir)
+            server = start_daemon(env) if strategy == "daemon" else None
+            results = []
+            try:
+                for _ in range(args.rounds):
+                    # every round starts from nothing, except for the
+                    # themes the daemon has already loaded
+                    try:
+                        (workdir / "cache" / "theme.sh").unlink()
+                    except FileNotFoundError:
+                        pass
+                    results += run_round(cmd, env, args.shells, workdir)
+            finally:
+                if server:
+                    server.terminate()
+                    server.wait()
+            summaries[strategy] = summarize(results)
+            report(_line(strategy, summaries[strategy]))
+            failures = [result for result in results if result["exit"]]
+            if failures:
+                report(f"    {failures[0]['stderr'].strip()}")
+    return summaries
+
+
+def _line(strategy, summary):
+    """a line of the report for a strategy"""
+    times = " ".join(
+        f"{summary[key] * 1000:>8.1f}" for key in ["p50", "p90", "p99", "max"]
+    )
+    return (
+        f"{strategy:10} {summary['shells']:>6} {summary['failed']:>6} {times}"
+        f" {summary['cpu_mean'] * 1000:>8.1f} {summary['maxrss'] / 1048576:>8.1f}"
+    )
+
+
+def main(argv=None):
+    """run the load test from the command line"""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.loadtest",
+        description="start lots of shells at once, and time shell-themer in each",
+    )
+    parser.add_argument(
+        "-n",
+        "--shells",
+        type=int,
+        default=32,
+        help="how many shells to start at once (default: 32)",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=3,
+        help="how many times to start them all (default: 3)",
+    )
+    parser.add_argument(
+        "--theme",
+        default="dracula",
+        help="small, dracula, huge, or xN for a synthetic theme N times bigger"
+        " than the defaults (default: dracula)",
+    )
+    parser.add_argument(
+        "-s", "--scope", help="the scopes to generate (default: all of them)"
+    )
+    parser.add_argument(
+        "--enabled-if",
+        type=float,
+        default=0.0,
+        metavar="<fraction>",
+        help="the fraction of scopes which get an enabled_if command (default: 0)",
+    )
+    parser.add_argument(
+        "--enabled-if-command",
+        default="true",
+        metavar="<command>",
+        help="the enabled_if command for those scopes (default: true)",
+    )
+    parser.add_argument(
+        "--strategy",
+        action="append",
+        choices=STRATEGIES,
+        help="how the shells get their output, can be given more than once"
+        " (default: all of them)",
+    )
+    parser.add_argument("--output", metavar="<path>", help="save the results as json")
+    args = parser.parse_args(argv)
+    if args.shells < 1 or args.rounds < 1:
+        parser.error("--shells and --rounds must be at least 1")
+
+    print(
+        f"{'strategy':10} {'shells':>6} {'failed':>6} {'p50 ms':>8} {'p90 ms':>8}"
+        f" {'p99 ms':>8} {'max ms':>8} {'cpu ms':>8} {'rss MB':>8}"
+    )
+    summaries = run(args)
+    if args.output:
+        path = pathlib.Path(args.output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(summaries, indent=2) + "\n", encoding="utf-8")
+    return 1 if any(summary["failed"] for summary in summaries.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""measure how much memory shell-themer allocates with tracemalloc
+
+For loading a theme, processing it, and each generator, against each of the
+themes the timing benchmarks use, we report the peak memory allocated while
+it ran, and how much of that is still allocated afterwards, grouped by the
+package which allocated it. The results are compared against
+memory_baseline.json next to this file. Unlike timings, allocations are
+the same on every machine with the same versions of python and our
+dependencies, so the baseline is checked in.
+
+Run them with 'invoke memory', or 'python -m benchmarks.memory' from the
+root of the repository.
+"""
+
+import argparse
+import fnmatch
+import gc
+import json
+import pathlib
+import sys
+import tempfile
+import tracemalloc
+
+from . import bench, themes
+
+BASELINE_FILE = pathlib.Path(__file__).resolve().parent / "memory_baseline.json"
+
+# differences smaller than this are noise, like a dict resizing
+SLACK = 4096
+
+
+def benchmarks(workdir, scales=()):
+    """all the memory benchmarks
+
+    workdir is a directory we can write theme files into
+    scales - also run against synthetic themes this many times bigger than
+        the defaults
+
+    :returns: a list of (name, function) tuples, whatever the function
+        returns is kept alive until its memory has been measured
+    """
+    # pylint: disable=protected-access, too-many-locals
+    cases = []
+    sizes = dict(themes.THEMES)
+    for factor in scales:
+        sizes[f"x{factor}"] = themes.scaled(factor)
+    for size, make_theme in sizes.items():
+        toml = make_theme()
+        thm = themes.load(toml)
+        scopes = themes.generated_scopes(thm)
+        theme_file = pathlib.Path(workdir) / f"{size}.toml"
+        theme_file.write_text(toml, encoding="utf-8")
+
+        def _loads(toml=toml):
+            return themes.load(toml)
+
+        def _load_from_args(theme_file=theme_file):
+            loaded = themes.load("")
+            loaded.load_from_args(argparse.Namespace(file=theme_file, theme=None))
+            return loaded
+
+        cases.append((f"loads[{size}]", _loads))
+        cases.append((f"load_from_args[{size}]", _load_from_args))
+        cases.append(
+            (f"process_definition[{size}]", lambda thm=thm: thm._process_definition())
+        )
+        for generator in bench.GENERATORS:
+            scopedefs = [
+                (name, thm.scopedef_for(name))
+                for name in scopes
+                if thm.scopedef_for(name)["generator"] == generator
+            ]
+            if not scopedefs:
+                continue
+
+            def _generate(thm=thm, scopedefs=scopedefs, generator=generator):
+                return [
+                    thm._generate_scope(name, scopedef, generator)
+                    for name, scopedef in scopedefs
+                ]
+
+            cases.append((f"generate_{generator}[{size}]", _generate))
+    return cases
+
+
+# the top level package of each module we have imported, by file name
+_PACKAGES = {}
+
+
+def package_of(filename):
+    """the top level package of the module in filename, or the file name
+    if it isn't in any package we have imported"""
+    if filename not in _PACKAGES:
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, "__file__", None)
+            if path:
+                _PACKAGES[path] = name.split(".")[0]
+    try:
+        return _PACKAGES[filename]
+    except KeyError:
+        return pathlib.Path(filename).name
+
+
+def measure(func):
+    """measure the memory func allocates
+
+    :returns: a dict with the peak bytes allocated while func ran, the
+        bytes still allocated after it returned, and the bytes still
+        allocated by each package
+    """
+    # so the styles and colors func parses are counted, like they are in a
+    # new shell, instead of being found in rich's caches
+    themes.clear_caches()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func()
+        gc.collect()
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    # leave out what tracemalloc and the benchmarks themselves allocated
+    snapshot = snapshot.filter_traces(
+        [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]
+    )
+    retained = 0
+    packages = {}
+    for stat in snapshot.statistics("filename"):
+        package = package_of(stat.traceback[0].filename)
+        packages[package] = packages.get(package, 0) + stat.size
+        retained += stat.size
+    packages = dict(sorted(packages.items(), key=lambda item: item[1], reverse=True))
+    return {"peak": peak, "retained": retained, "packages": packages}
+
+
+def run(pattern=None, report=print, scales=()):
+    """run the benchmarks whose names match pattern, or all of them
+
+    :returns: the results, ready to be saved as json
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, func in benchmarks(workdir, scales):
+            if pattern and not fnmatch.fnmatchcase(name, pattern):
+                continue
+            results[name] = measure(func)
+            top = ", ".join(
+                f"{package} {format_bytes(size)}"
+                for package, size in list(results[name]["packages"].items())[:3]
+            )
+            report(
+                f"{name:40} {format_bytes(results[name]['peak']):>10}"
+                f" {format_bytes(results[name]['retained']):>10}   {top}"
+            )
+    return {
+        # only what decides how much memory is allocated, the baseline is
+        # checked in so it mustn't change with every commit or machine
+        "meta": {"python": python_version()},
+        "benchmarks": results,
+    }
+
+
+def python_version():
+    """the version of python, leaving out the patch level"""
+    return f"{sys.version_info[0]}.{sys.version_info[1]}"
+
+
+def compare(results, baseline, threshold):
+    """compare results to baseline
+
+    a benchmark regressed if its peak or retained memory is more than
+    threshold (0.1 is 10%) bigger than in the baseline
+
+    :returns: a tuple of (lines of a report, names of the regressions)
+    """
+    lines = []
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        try:
+            before = baseline["benchmarks"][name]
+        except KeyError:
+            lines.append(f"{name:40} new")
+            continue
+        flag = ""
+        for key in ["peak", "retained"]:
+            limit = max(before[key] * (1 + threshold), before[key] + SLACK)
+            if result[key] > limit:
+                flag = "REGRESSED"
+        if flag:
+            regressions.append(name)
+        lines.append(
+            f"{name:40}"
+            f" {format_bytes(before['peak']):>10} {format_bytes(result['peak']):>10}"
+            f" {format_bytes(before['retained']):>10}"
+            f" {format_bytes(result['retained']):>10} {flag}"
+        )
+    return lines, regressions
+
+
+def format_bytes(size):
+    """bytes in units people can read"""
+    for unit, scale in [("MB", 1024 * 1024), ("KB", 1024)]:
+        if size >= scale:
+            return f"{size / scale:.1f}{unit}"
+    return f"{size}B"
+
+
+def main(argv=None):
+    """run the memory benchmarks from the command line"""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.memory",
+        description="measure the memory shell-themer allocates",
+    )
+    parser.add_argument(
+        "-k", metavar="<pattern>", help="only run benchmarks matching this glob"
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        action="append",
+        default=[],
+        metavar="<factor>",
+        help="also run against a synthetic theme this many times bigger, can be"
+        " given more than once",
+    )
+    parser.add_argument(
+        "--baseline",
+        metavar="<path>",
+        default=str(BASELINE_FILE),
+        help="compare the results to these results",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="how much bigger than the baseline is a regression (default: 0.1)",
+    )
+    parser.add_argument(
+        "--save",
+        action="store_true",
+        help="save the results as the baseline, with -k only replacing the"
+        " benchmarks which ran",
+    )
+    args = parser.parse_args(argv)
+
+    print(f"{'':40} {'peak':>10} {'retained':>10}   biggest packages retained")
+    results = run(args.k, scales=args.scale)
+    if args.save:
+        path = pathlib.Path(args.baseline)
+        if args.k and path.exists():
+            # keep the baseline for the benchmarks we didn't run
+            saved = json.loads(path.read_text(encoding="utf-8"))
+            saved["meta"] = results["meta"]
+            saved["benchmarks"].update(results["benchmarks"])
+            results = saved
+        path.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"\nsaved the results in {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        print(f"{args.baseline}: no baseline to compare to")
+        return 0
+    lines, regressions = compare(results, baseline, args.threshold)
+    print()
+    if baseline["meta"]["python"] != results["meta"]["python"]:
+        print(
+            f"the baseline is from python {baseline['meta']['python']}, which"
+            " allocates memory differently, so the comparison is rough"
+        )
+    print(
+        f"{'compared to baseline':40} {'peak':>10} {'now':>10} {'retained':>10}"
+        f" {'now':>10}"
+    )
+    print("\n".join(lines))
+    if regressions:
+        print(
+            f"\n{len(regressions)} benchmarks use more than {args.threshold:.0%}"
+            " more memory"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""the themes the benchmarks run against
+
+small - a couple of styles and scopes, the least work we could be asked to do
+dracula - the dracula theme which ships with shell-themer, a realistic theme
+huge - many times bigger than anyone would write by hand, like the themes
+    people generate with scripts
+x10 - a synthetic theme ten times bigger than the defaults in
+    shell_themer.synthetic, with every kind of scope
+
+run with --scale to add synthetic themes of other sizes
+"""
+
+import pathlib
+
+import rich.color
+import rich.style
+import tomlkit
+
+from shell_themer import Themer, synthetic
+
+REPO_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+SMALL = """
+[styles]
+text = "#f8f8f2 on #282a36"
+comment = "#6272a4"
+green = "#50fa7b"
+
+[scope.env]
+generator = "environment_variables"
+environment.export.THEME_COMMENT = "{style:comment}"
+
+[scope.fzf]
+generator = "fzf"
+environment_variable = "FZF_DEFAULT_OPTS"
+style.text = "text"
+style.prompt = "green"
+
+[scope.ls]
+generator = "ls_colors"
+style.directory = "green"
+style.symlink = "comment"
+
+[scope.exa]
+generator = "exa_colors"
+style.directory = "green"
+style.file = "text"
+
+[scope.iterm]
+generator = "iterm"
+style.foreground = "green"
+
+[scope.shell]
+generator = "shell"
+command.comment = "echo {style:comment}"
+"""
+
+
+def small():
+    """the toml for the small theme"""
+    return SMALL
+
+
+def dracula():
+    """the toml for the dracula theme"""
+    return (REPO_DIR / "themes" / "dracula.toml").read_text(encoding="utf-8")
+
+
+def huge(copies=50, styles=2000, variables=300):
+    """the toml for the huge theme
+
+    it has every scope from dracula and the small theme which has a generator
+    copied many times, and lots of extra styles and variables
+    """
+    definition = tomlkit.parse(dracula())
+    for name, scopedef in tomlkit.parse(small())["scope"].items():
+        definition["scope"][f"small_{name}"] = scopedef
+    for num in range(variables):
+        definition["variables"][f"var{num}"] = f"#{num * 4099 % 0xFFFFFF:06x}"
+    for num in range(styles):
+        # half of them use a variable, so loading has to interpolate them
+        if num % 2:
+            definition["styles"][f"style{num}"] = f"{{var:var{num % variables}}}"
+        else:
+            definition["styles"][f"style{num}"] = f"#{num * 257 % 0xFFFFFF:06x} bold"
+    scopes = definition["scope"]
+    originals = [
+        (name, scopes[name]) for name in list(scopes) if "generator" in scopes[name]
+    ]
+    for num in range(copies):
+        for name, scopedef in originals:
+            scopes[f"{name}{num}"] = scopedef
+    return tomlkit.dumps(definition)
+
+
+def scaled(factor):
+    """a function which makes the toml for a synthetic theme factor times
+    bigger than the defaults"""
+    return lambda: synthetic.scaled(factor)
+
+
+THEMES = {"small": small, "dracula": dracula, "huge": huge, "x10": scaled(10)}
+
+
+def generated_scopes(thm):
+    """the scopes in the loaded theme which have a generator, so we can
+    generate them all without errors"""
+    return [
+        name
+        for name, scopedef in thm.definition["scope"].items()
+        if "generator" in scopedef
+    ]
+
+
+# rich caches the styles and colors it parses, and in the new process each
+# shell starts, these are empty
+RICH_CACHES = [
+    rich.style.Style.normalize,
+    rich.style.Style.parse,
+    rich.color.Color.parse,
+    rich.color.Color.get_ansi_codes,
+    rich.color.Color.downgrade,
+]
+
+
+def clear_caches():
+    """empty rich's caches, so we parse styles and colors like a new shell
+    does, instead of finding them in the cache"""
+    for cached in RICH_CACHES:
+        cached.cache_clear()
+
+
+def load(toml):
+    """a Themer with toml loaded"""
+    thm = Themer(prog="shell-themer")
+    thm.loads(toml)
+    return thm
@@ -23,4 +23,21 @@
 #
 """command line tool for maintaining and switching color schemes"""
 
-from .themer import Themer, ThemeError
+# imported first, so it can time how long it takes to import everything else
+from . import profiler
+
+# typing.TYPE_CHECKING, without the time it takes to import typing
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from .themer import Themer, ThemeError
+
+
+def __getattr__(name):
+    # importing Themer imports rich and tomlkit, which 'generate --via-daemon'
+    # doesn't need when the daemon answers, so wait until someone asks for it
+    if name in ["Themer", "ThemeError"]:
+        from . import themer  # pylint: disable=import-outside-toplevel
+
+        globals()[name] = getattr(themer, name)
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
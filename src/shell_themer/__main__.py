@@ -23,17 +23,67 @@
 #
 """
 Entry point for 'shell-themer' command line program.
+
+Every shell runs 'shell-themer generate --via-daemon' when it starts, and
+when the daemon is running, it does all the work. Starting python is most of
+what's left, so we ask the daemon before importing Themer, which imports
+rich, tomlkit, and everything else. Anything the daemon can't answer,
+including its errors, goes to Themer.main().
 """
 
+import os
 import sys
 
-from shell_themer import Themer
+from shell_themer import cmdline
+
+
+def _via_daemon(argv):
+    """ask the daemon for the output if argv is 'generate --via-daemon' and
+    nothing more than the daemon can do
+
+    :returns: the output, or None if Themer has to do it
+    """
+    # pylint: disable=no-member, too-many-return-statements
+    # pylint: disable=import-outside-toplevel
+    args = cmdline.fast_parse(argv)
+    if not args or args.command != "generate" or not args.via_daemon:
+        return None
+    # these all need Themer
+    if args.output or args.split_dir or args.stdin_batch or args.profile:
+        return None
+    if os.environ.get("SHELL_THEMER_TRACE"):
+        return None
+    if os.environ.get("SHELL_THEMER_HISTORY", "") not in ["", "0"]:
+        return None
+    # imported here, so plain generate doesn't pay for socketserver
+    from shell_themer import daemon
+
+    theme = daemon.theme_path(args)
+    if not theme:
+        return None
+    response = daemon.generate(daemon.socket_path(), theme, args)
+    if not response or "output" not in response:
+        return None
+    return response["output"]
+
+
+def main(argv=None):
+    """Entry point from the command line"""
+    if argv is None:
+        argv = sys.argv[1:]
+    output = _via_daemon(argv)
+    if output is not None:
+        print(output, end="")
+        return 0
+    from shell_themer import Themer  # pylint: disable=import-outside-toplevel
+
+    return Themer.main(argv)
 
 
 def doit():
     """made this so we can test it"""
     if __name__ == "__main__":
-        sys.exit(Themer.main())
+        sys.exit(main())
 
 
 doit()
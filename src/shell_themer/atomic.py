@@ -0,0 +1,80 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""write files so that readers never see partially written contents"""
+
+import hashlib
+import os
+import pathlib
+import tempfile
+
+# there is no way to get the umask without setting it, so we do it once
+# when we are imported instead of every time we write a file
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+
+def write_atomic(path, content):
+    """Replace the contents of path with content, atomically
+
+    content is written to a temporary file in the same directory as path,
+    which is then renamed over path. Anyone reading path sees either the
+    old contents or the new contents, never a partially written file.
+
+    If path already has exactly this content it is not touched at all, which
+    keeps its modification time the same for anyone watching it.
+
+    Creates the parent directory if it doesn't exist.
+
+    :returns: True if the file was written, False if it was unchanged
+    """
+    path = pathlib.Path(path)
+    data = content.encode("utf-8")
+    try:
+        with open(path, "rb") as file:
+            existing = hashlib.sha256(file.read()).digest()
+        if existing == hashlib.sha256(data).digest():
+            return False
+    except FileNotFoundError:
+        pass
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmpname = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp() creates files only we can read, make it look
+        # like any other file we would have created
+        os.chmod(tmpname, 0o666 & ~_UMASK)
+        os.replace(tmpname, path)
+    except BaseException:
+        try:
+            os.unlink(tmpname)
+        except FileNotFoundError:  # pragma: nocover
+            pass
+        raise
+    return True
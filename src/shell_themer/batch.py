@@ -0,0 +1,109 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""generate output for a stream of theme documents, like those read by
+'generate --stdin-batch'"""
+
+import collections
+import concurrent.futures
+import json
+
+
+def read_documents(stream):
+    """read theme documents from a binary stream
+
+    each document is either a line of json containing an object with the
+    toml in 'toml' and an optional 'id', or a line containing the length of
+    the toml in bytes, followed by exactly that many bytes of toml. Blank
+    lines between documents are ignored, and both kinds of documents can be
+    mixed in the same stream.
+
+    :returns: a generator of (id, toml) tuples, id is None for documents
+        which didn't have one
+    :raises: ValueError if the stream is malformed
+    """
+    count = 0
+    while True:
+        line = stream.readline()
+        if not line:
+            return
+        line = line.strip()
+        if not line:
+            continue
+        count += 1
+        if line.startswith(b"{"):
+            try:
+                record = json.loads(line)
+                toml = record["toml"]
+                if not isinstance(toml, str):
+                    raise TypeError
+            except (ValueError, KeyError, TypeError) as exc:
+                raise ValueError(
+                    f"document {count}: json documents must be an object with a"
+                    " 'toml' string"
+                ) from exc
+            yield record.get("id"), toml
+        elif line.isdigit():
+            length = int(line)
+            data = stream.read(length)
+            if len(data) != length:
+                raise ValueError(
+                    f"document {count}: expected {length} bytes but got {len(data)}"
+                )
+            try:
+                yield None, data.decode("utf-8")
+            except UnicodeDecodeError as exc:
+                raise ValueError(f"document {count}: toml is not utf-8") from exc
+        else:
+            raise ValueError(
+                f"document {count}: expected a json object or a length in bytes"
+            )
+
+
+def run(documents, render, jobs):
+    """render documents in a pool of threads
+
+    render is called with (index, id, toml) for each document, and should
+    return the record for that document. Results come back in the same
+    order as the documents, as soon as each one is ready, and we only read
+    ahead a few documents more than we have threads, so any number of
+    documents can stream through without using more memory.
+
+    :returns: a generator of the records returned by render
+    :raises: ValueError if documents does, after the records for the
+        documents before the malformed one
+    """
+    pending = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        try:
+            for index, (doc_id, toml) in enumerate(documents):
+                pending.append(executor.submit(render, index, doc_id, toml))
+                if len(pending) >= jobs * 2:
+                    yield pending.popleft().result()
+        except ValueError:
+            # so the records before a malformed document still come out
+            while pending:
+                yield pending.popleft().result()
+            raise
+        while pending:
+            yield pending.popleft().result()
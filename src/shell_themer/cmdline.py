@@ -0,0 +1,144 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""a fast parser for the most common command lines
+
+Building the full argparse parser, with rich help formatting and all the
+subcommands, takes longer than generating most themes. Every shell runs
+'shell-themer generate' when it starts, so we recognize the command lines
+that shells run with this small parser, and only build the full parser for
+help, errors, or options this parser doesn't know about.
+
+This module must not import anything outside the standard library.
+"""
+
+import argparse
+
+# the defaults for every option, which must match Themer.argparser()
+GLOBAL_DEFAULTS = {
+    "help": False,
+    "version": False,
+    "nocolor": False,
+    "color": None,
+    "theme": None,
+    "file": None,
+    "profile": False,
+}
+GENERATE_DEFAULTS = {
+    "scope": None,
+    "comment": False,
+    "defer_conditions": False,
+    "output": None,
+    "format": "shell",
+    "split_dir": None,
+    "if_stale": False,
+    "via_daemon": False,
+    "stdin_batch": False,
+    "jobs": None,
+}
+
+GLOBAL_VALUES = {
+    "-t": "theme",
+    "--theme": "theme",
+    "-f": "file",
+    "--file": "file",
+}
+GLOBAL_FLAGS = {
+    "--profile": "profile",
+}
+GENERATE_VALUES = {
+    "-s": "scope",
+    "--scope": "scope",
+    "-o": "output",
+    "--output": "output",
+    "--format": "format",
+    "--split-dir": "split_dir",
+}
+GENERATE_FLAGS = {
+    "-c": "comment",
+    "--comment": "comment",
+    "--defer-conditions": "defer_conditions",
+    "--if-stale": "if_stale",
+    "--via-daemon": "via_daemon",
+}
+FORMATS = ("shell", "json")
+
+
+def fast_parse(argv):
+    """parse argv if it's one of the common command lines
+
+    :returns: an argparse.Namespace identical to the one the full parser
+        would return, or None if the full parser has to do it
+    """
+    # pylint: disable=too-many-return-statements, too-many-branches
+    values = dict(GLOBAL_DEFAULTS)
+    pos = 0
+    while pos < len(argv) and (argv[pos] in GLOBAL_VALUES or argv[pos] in GLOBAL_FLAGS):
+        if argv[pos] in GLOBAL_FLAGS:
+            values[GLOBAL_FLAGS[argv[pos]]] = True
+            pos += 1
+            continue
+        dest = GLOBAL_VALUES[argv[pos]]
+        # --theme and --file are mutually exclusive, so let argparse
+        # complain if there is more than one of them
+        if values["theme"] is not None or values["file"] is not None:
+            return None
+        if pos + 1 >= len(argv) or argv[pos + 1].startswith("-"):
+            return None
+        values[dest] = argv[pos + 1]
+        pos += 2
+
+    if pos >= len(argv):
+        return None
+    command = argv[pos]
+    rest = argv[pos + 1 :]
+    values["command"] = command
+    if command == "list":
+        if rest:
+            return None
+    elif command == "generate":
+        values.update(GENERATE_DEFAULTS)
+        seen = set()
+        pos = 0
+        while pos < len(rest):
+            arg = rest[pos]
+            if arg in GENERATE_FLAGS:
+                values[GENERATE_FLAGS[arg]] = True
+                pos += 1
+            elif arg in GENERATE_VALUES:
+                dest = GENERATE_VALUES[arg]
+                # repeated options are rare, leave them to argparse
+                if dest in seen:
+                    return None
+                seen.add(dest)
+                if pos + 1 >= len(rest) or rest[pos + 1].startswith("-"):
+                    return None
+                values[dest] = rest[pos + 1]
+                pos += 2
+            else:
+                return None
+        if values["format"] not in FORMATS:
+            return None
+    else:
+        return None
+    return argparse.Namespace(**values)
@@ -0,0 +1,275 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""shell code for 'shell-themer completion', which completes command lines
+in bash and zsh
+
+none of the shell code runs python. Theme names come from a glob of
+$THEME_DIR, and scope names from the scope index in the cache directory.
+"""
+
+import argparse
+
+
+def parser_spec(parser):
+    """figure out everything the completion code needs to know from parser,
+    the argument parser for shell-themer, so they never get out of sync
+
+    :returns: a dict with these keys:
+
+        options - the options which can come before the command
+        commands - a dict of command name to a tuple of (options,
+            choices for the positional argument)
+        values - the options which take a value
+        files - the options whose value is a file or directory
+        choices - a dict of option to the choices for its value
+    """
+    # pylint: disable=protected-access
+    spec = {"options": [], "commands": {}, "values": [], "files": [], "choices": {}}
+
+    def _scan(parser, options, positional):
+        for action in parser._actions:
+            if isinstance(action, argparse._SubParsersAction):
+                for name, subparser in action.choices.items():
+                    spec["commands"][name] = ([], [])
+                    _scan(subparser, *spec["commands"][name])
+            elif not action.option_strings:
+                positional.extend(action.choices or [])
+            else:
+                options.extend(action.option_strings)
+                if action.nargs == 0:
+                    continue
+                spec["values"].extend(action.option_strings)
+                for option in action.option_strings:
+                    if action.choices:
+                        spec["choices"][option] = list(action.choices)
+                    elif action.metavar in ("<path>", "<dir>"):
+                        spec["files"].append(option)
+
+    _scan(parser, spec["options"], [])
+    # some commands share options
+    spec["values"] = list(dict.fromkeys(spec["values"]))
+    return spec
+
+
+def _scan_command_line(spec, words, first, current):
+    """shell code which finds the command and the theme file on the
+    command line, which works in both bash and zsh
+
+    words is the name of the array of words on the command line, first
+    is the index of the word after our name, and current is the index of
+    the word being completed
+    """
+    return [
+        f'    local theme_file="$THEME_FILE" command="" word i={first}',
+        f"    for (( ; i < {current}; i++ )); do",
+        f'        word="${{{words}[i]}}"',
+        '        case "$word" in',
+        f'            -t|--theme) theme_file="${{THEME_DIR%/}}/${{{words}[i+1]}}" ;;',
+        f'            -f|--file) theme_file="${{{words}[i+1]}}" ;;',
+        "        esac",
+        '        case "$word" in',
+        # skip the values of options, so they don't look like commands
+        f"            {'|'.join(spec['values'])}) (( i++ )) ;;",
+        "            -*) ;;",
+        '            *) [[ -z "$command" ]] && command="$word" ;;',
+        "        esac",
+        "    done",
+    ]
+
+
+def bash(spec, index_dir):
+    """the lines of shell code for bash completion"""
+    lines = [
+        "# shell-themer completion for bash",
+        "_shell_themer_words() {",
+        '    local cur="$1" word',
+        "    shift",
+        '    for word in "$@"; do',
+        '        [[ "$word" == "$cur"* ]] && COMPREPLY+=("$word")',
+        "    done",
+        "    return 0",
+        "}",
+        "_shell_themer_themes() {",
+        "    local -a files",
+        '    [[ -n "$THEME_DIR" ]] || return 0',
+        # the glob does the prefix matching, and the expansions strip
+        # the directory and extension from every file at once
+        '    files=("${THEME_DIR%/}/$1"*.toml)',
+        '    [[ -e "${files[0]}" ]] || return 0',
+        '    files=("${files[@]##*/}")',
+        '    COMPREPLY+=("${files[@]%.toml}")',
+        "}",
+        "_shell_themer_scopes() {",
+        '    local cur="$1" key="${2##*/}" prefix="" scope',
+        '    key="${key%.toml}"',
+        f'    [[ -n "$key" && -f {index_dir}/"$key" ]] || return 0',
+        # complete the last of a comma separated list of scopes
+        '    if [[ "$cur" == *,* ]]; then',
+        '        prefix="${cur%,*},"',
+        '        cur="${cur##*,}"',
+        "    fi",
+        "    while IFS= read -r scope; do",
+        '        [[ "$scope" == "$cur"* ]] && COMPREPLY+=("$prefix$scope")',
+        f'    done <{index_dir}/"$key"',
+        "    return 0",
+        "}",
+        "_shell_themer_complete() {",
+        '    local cur="${COMP_WORDS[COMP_CWORD]}" prev="${COMP_WORDS[COMP_CWORD-1]}"',
+        "    COMPREPLY=()",
+    ]
+    lines.extend(_scan_command_line(spec, "COMP_WORDS", 1, "COMP_CWORD"))
+    lines.extend(
+        [
+            '    case "$prev" in',
+            '        -t|--theme) _shell_themer_themes "$cur"; return 0 ;;',
+            '        -s|--scope) _shell_themer_scopes "$cur" "$theme_file"; return 0 ;;',
+        ]
+    )
+    for option, choices in spec["choices"].items():
+        words = " ".join(choices)
+        lines.append(
+            f'        {option}) _shell_themer_words "$cur" {words}; return 0 ;;'
+        )
+    lines.extend(
+        [
+            # readline completes file names when we don't have anything
+            f"        {'|'.join(spec['values'])}) return 0 ;;",
+            "    esac",
+            '    if [[ -z "$command" ]]; then',
+            '        if [[ "$cur" == -* ]]; then',
+            f"            _shell_themer_words \"$cur\" {' '.join(spec['options'])}",
+            "        else",
+            f"            _shell_themer_words \"$cur\" {' '.join(spec['commands'])}",
+            "        fi",
+            "        return 0",
+            "    fi",
+            '    if [[ "$cur" == -* ]]; then',
+            '        case "$command" in',
+        ]
+    )
+    for command, (options, _) in spec["commands"].items():
+        lines.append(
+            f"            {command}) _shell_themer_words \"$cur\" {' '.join(options)} ;;"
+        )
+    lines.extend(
+        [
+            "        esac",
+            "        return 0",
+            "    fi",
+            '    case "$command" in',
+            '        switch) _shell_themer_themes "$cur" ;;',
+        ]
+    )
+    for command, (_, choices) in spec["commands"].items():
+        if choices:
+            lines.append(
+                f"        {command}) _shell_themer_words \"$cur\" {' '.join(choices)} ;;"
+            )
+    lines.extend(
+        [
+            "    esac",
+            "    return 0",
+            "}",
+            "complete -o default -F _shell_themer_complete shell-themer",
+        ]
+    )
+    return lines
+
+
+def zsh(spec, index_dir):
+    """the lines of shell code for zsh completion"""
+    lines = [
+        "# shell-themer completion for zsh",
+        "_shell_themer_themes() {",
+        "    local -a themes",
+        '    [[ -n "$THEME_DIR" ]] || return 1',
+        '    themes=("${THEME_DIR%/}"/*.toml(N:t:r))',
+        "    compadd -a themes",
+        "}",
+        "_shell_themer_scopes() {",
+        '    local key="${1##*/}" scope',
+        "    local -a scopes",
+        '    key="${key%.toml}"',
+        f'    [[ -n "$key" && -f {index_dir}/"$key" ]] || return 1',
+        "    while IFS= read -r scope; do",
+        '        scopes+=("$scope")',
+        f'    done <{index_dir}/"$key"',
+        # complete the last of a comma separated list of scopes
+        "    compset -P '*,'",
+        "    compadd -a scopes",
+        "}",
+        "_shell_themer() {",
+        '    local cur="${words[CURRENT]}" prev="${words[CURRENT-1]}"',
+    ]
+    lines.extend(_scan_command_line(spec, "words", 2, "CURRENT"))
+    lines.extend(
+        [
+            '    case "$prev" in',
+            "        -t|--theme) _shell_themer_themes; return ;;",
+            '        -s|--scope) _shell_themer_scopes "$theme_file"; return ;;',
+        ]
+    )
+    for option, choices in spec["choices"].items():
+        lines.append(f"        {option}) compadd -- {' '.join(choices)}; return ;;")
+    lines.extend(
+        [
+            f"        {'|'.join(spec['files'])}) _files; return ;;",
+            f"        {'|'.join(spec['values'])}) return 1 ;;",
+            "    esac",
+            '    if [[ -z "$command" ]]; then',
+            '        if [[ "$cur" == -* ]]; then',
+            f"            compadd -- {' '.join(spec['options'])}",
+            "        else",
+            f"            compadd -- {' '.join(spec['commands'])}",
+            "        fi",
+            "        return",
+            "    fi",
+            '    if [[ "$cur" == -* ]]; then',
+            '        case "$command" in',
+        ]
+    )
+    for command, (options, _) in spec["commands"].items():
+        lines.append(f"            {command}) compadd -- {' '.join(options)} ;;")
+    lines.extend(
+        [
+            "        esac",
+            "        return",
+            "    fi",
+            '    case "$command" in',
+            "        switch) _shell_themer_themes ;;",
+        ]
+    )
+    for command, (_, choices) in spec["commands"].items():
+        if choices:
+            lines.append(f"        {command}) compadd -- {' '.join(choices)} ;;")
+    lines.extend(
+        [
+            "    esac",
+            "}",
+            # compdef comes from compinit, which most people already load
+            "(( $+functions[compdef] )) || { autoload -Uz compinit && compinit; }",
+            "compdef _shell_themer shell-themer",
+        ]
+    )
+    return lines
@@ -0,0 +1,305 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""a daemon which keeps themes loaded in memory, and a client to talk to it
+
+Starting python and loading a theme is most of the time it takes to run
+'shell-themer generate'. 'shell-themer serve' starts a daemon listening on a
+unix domain socket, which keeps recently used themes loaded and generates
+output for them on request. 'shell-themer generate --via-daemon' sends its
+request to the daemon, and generates the output itself if the daemon isn't
+running.
+
+The protocol is one line of json from the client, answered by one line of
+json from the daemon. The client sends its environment and directory, which
+enabled_if commands run in, and evals the output it gets back, so both ends
+refuse to use a socket in a directory which anyone else owns or can get
+into.
+
+This module only uses the standard library, so the client is cheap to import.
+"""
+
+import argparse
+import collections
+import contextlib
+import errno
+import json
+import os
+import pathlib
+import socket
+import socketserver
+import tempfile
+import threading
+from stat import S_ISDIR
+
+
+def socket_path():
+    """Get the path to the daemon's socket
+
+    Resolution order:
+    1. $SHELL_THEMER_SOCKET environment variable
+    2. $XDG_RUNTIME_DIR/shell-themer/daemon.sock
+    3. shell-themer-<uid>/daemon.sock in the temporary directory
+    """
+    try:
+        return pathlib.Path(os.environ["SHELL_THEMER_SOCKET"])
+    except KeyError:
+        pass
+    try:
+        base = pathlib.Path(os.environ["XDG_RUNTIME_DIR"]) / "shell-themer"
+    except KeyError:
+        base = pathlib.Path(tempfile.gettempdir()) / f"shell-themer-{os.getuid()}"
+    return base / "daemon.sock"
+
+
+def is_private(directory):
+    """check that directory is ours, and nobody else can get into it
+
+    if it isn't, someone else could have put a socket there before we did,
+    like in a shared temporary directory
+    """
+    try:
+        info = os.lstat(directory)
+    except OSError:
+        return False
+    return (
+        S_ISDIR(info.st_mode)
+        and info.st_uid == os.getuid()
+        and not info.st_mode & 0o077
+    )
+
+
+def theme_path(args):
+    """the absolute path to the theme file for args
+
+    resolved like Themer.theme_file_from_args(), but without importing it
+
+    :returns: the path, or None if there isn't one
+    """
+    if args.file:
+        return os.path.abspath(args.file)
+    if args.theme:
+        theme_dir = os.environ.get("THEME_DIR")
+        if not theme_dir:
+            return None
+        for fname in [args.theme, f"{args.theme}.toml"]:
+            path = os.path.join(theme_dir, fname)
+            if os.path.isfile(path):
+                return os.path.abspath(path)
+        return None
+    fname = os.environ.get("THEME_FILE")
+    return os.path.abspath(fname) if fname else None
+
+
+def generate(path, theme, args):
+    """ask the daemon listening on path to generate the output for theme
+
+    :returns: the response from the daemon, or None if we couldn't talk to it
+    """
+    payload = {
+        "theme_file": theme,
+        "scope": args.scope,
+        "comment": args.comment,
+        "defer_conditions": args.defer_conditions,
+        "format": args.format,
+        # so enabled_if runs in our environment and directory, not the
+        # daemon's
+        "env": dict(os.environ),
+        "cwd": os.getcwd(),
+    }
+    return request(path, payload)
+
+
+def request(path, payload, timeout=5.0):
+    """send a request to the daemon listening on path
+
+    :returns: the response from the daemon, or None if we couldn't talk to it
+    """
+    if not is_private(pathlib.Path(path).parent):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(path))
+            sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as file:
+                return json.loads(file.readline())
+    except (OSError, ValueError):
+        # no daemon, a dead daemon, a stuck daemon, or garbage from the
+        # daemon all mean the same thing: do it yourself
+        return None
+
+
+def is_running(path):
+    """check if there is a daemon listening on path"""
+    if not is_private(pathlib.Path(path).parent):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(path))
+        return True
+    except OSError:
+        return False
+
+
+class ThemeCache:
+    """keep the most recently used themes loaded
+
+    themes are reloaded when the modification time or size of their file
+    changes, and the least recently used theme is dropped when there are
+    more than max_themes loaded
+
+    a Themer is only used by one thread at a time. When every loaded Themer
+    for a theme is in use, another one is loaded, and up to max_idle of
+    them are kept for the next requests
+    """
+
+    def __init__(self, factory, max_themes, max_idle=4):
+        """factory is a callable which returns a new Themer object"""
+        self.factory = factory
+        self.max_themes = max_themes
+        self.max_idle = max_idle
+        self.hits = 0
+        self.misses = 0
+        # theme file -> (signature, list of loaded Themers not in use)
+        self._themes = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._themes)
+
+    def __contains__(self, theme_file):
+        return theme_file in self._themes
+
+    @contextlib.contextmanager
+    def use(self, theme_file):
+        """a loaded Themer for theme_file, which no other thread uses until
+        we are done with it"""
+        stat = os.stat(theme_file)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        thm = None
+        with self._lock:
+            entry = self._themes.get(theme_file)
+            if entry and entry[0] == signature and entry[1]:
+                thm = entry[1].pop()
+                self.hits += 1
+            else:
+                self.misses += 1
+        if thm is None:
+            # load outside the lock so other themes can be served while we
+            # do this
+            thm = self.factory()
+            thm.load(theme_file)
+        try:
+            yield thm
+        finally:
+            self._put(theme_file, signature, thm)
+
+    def _put(self, theme_file, signature, thm):
+        """keep thm for the next request for theme_file, unless we already
+        have enough of them, or it has changed since thm was loaded"""
+        with self._lock:
+            entry = self._themes.get(theme_file)
+            if entry is None or entry[0] != signature:
+                # if the file changed since we loaded it, the next request
+                # sees a different signature and loads it again
+                entry = (signature, [])
+                self._themes[theme_file] = entry
+            if len(entry[1]) < self.max_idle:
+                entry[1].append(thm)
+            self._themes.move_to_end(theme_file)
+            while len(self._themes) > self.max_themes:
+                self._themes.popitem(last=False)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """handle one request from a client"""
+
+    def handle(self):
+        try:
+            payload = json.loads(self.rfile.readline())
+            response = self.server.generate(payload)
+        except ValueError:
+            response = {"error": "invalid request"}
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class ThemerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """a unix domain socket server which generates output for themes
+
+    each client connection is handled in its own thread
+    """
+
+    daemon_threads = True
+    # lots of shells start at the same time when you open a bunch of
+    # terminal windows or tmux panes
+    request_queue_size = 128
+
+    def __init__(self, path, factory, max_themes=16):
+        """listen on the unix domain socket at path
+
+        factory is a callable which returns a new Themer object
+
+        :raises: PermissionError if anyone else owns or can get into the
+            directory the socket is in
+        """
+        self.path = pathlib.Path(path)
+        self.cache = ThemeCache(factory, max_themes)
+        # only we should be able to talk to our daemon
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not is_private(self.path.parent):
+            raise PermissionError(
+                errno.EPERM, "directory is not private", str(self.path.parent)
+            )
+        try:
+            # a socket left behind by a daemon that didn't exit cleanly
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        super().__init__(str(self.path), _RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def generate(self, payload):
+        """generate the output for a request from a client"""
+        args = argparse.Namespace(
+            scope=payload.get("scope"),
+            comment=payload.get("comment", False),
+            defer_conditions=payload.get("defer_conditions", False),
+            format=payload.get("format", "shell"),
+        )
+        try:
+            with self.cache.use(payload["theme_file"]) as thm:
+                results = thm.generate_scopes(
+                    args, env=payload.get("env"), cwd=payload.get("cwd")
+                )
+                return {"output": thm.render_results(results, args)}
+        except Exception as err:  # pylint: disable=broad-except
+            # whatever went wrong, the client needs to hear about it, and
+            # we need to keep running for the next client
+            return {"error": str(err)}
@@ -0,0 +1,139 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""a log of how long each 'generate' took, for the 'stats' command
+
+Every record is a line of json appended to the log. Lots of shells can
+append to the log at once, and because each record is written with a single
+write to a file opened for appending, the lines never get mixed up. When the
+log gets too big the oldest records are thrown away.
+"""
+
+import json
+import math
+import os
+
+from . import lock
+from .atomic import write_atomic
+
+# how big the log can get before we throw away the oldest records
+MAX_BYTES = 256 * 1024
+# how long to wait for another process which is trimming the log
+LOCK_TIMEOUT = 1
+
+
+def append(path, record, max_bytes=MAX_BYTES):
+    """append a record to the log at path, and trim the log if it has
+    grown bigger than max_bytes
+
+    creates the log and the directory it's in if they don't exist
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(line)
+        size = file.tell()
+    if size > max_bytes:
+        trim(path, max_bytes)
+
+
+def trim(path, max_bytes=MAX_BYTES):
+    """throw away the oldest records in the log at path, keeping about half
+    of max_bytes of the newest ones, so we don't have to trim it again for
+    a while"""
+    with lock.exclusive(f"{path}.lock", LOCK_TIMEOUT):
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return
+        # someone else trimmed it while we waited for the lock
+        if len(data) <= max_bytes:
+            return
+        keep = data[-(max_bytes // 2) :]
+        # start at the beginning of a record
+        keep = keep[keep.find(b"\n") + 1 :]
+        write_atomic(path, keep.decode("utf-8", errors="replace"))
+
+
+def read(path):
+    """read the records from the log at path
+
+    lines which aren't valid json, which could happen if the log was being
+    trimmed while we were writing to it, are ignored
+
+    :returns: a list of records, oldest first
+    """
+    records = []
+    try:
+        with open(path, encoding="utf-8", errors="replace") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict):
+                    records.append(record)
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def percentile(values, pct):
+    """the pct percentile of values using the nearest rank method, or None
+    if there aren't any values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(records):
+    """summarize the latency of successful generate runs in records
+
+    :returns: a tuple of two dicts, the first has the wall time of every run
+        for each theme, the second has the time it took to generate each
+        scope, keyed by (theme, scope)
+    """
+    themes = {}
+    scopes = {}
+    for record in records:
+        if record.get("exit"):
+            continue
+        theme = str(record.get("theme"))
+        try:
+            seconds = float(record["seconds"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        themes.setdefault(theme, []).append(seconds)
+        record_scopes = record.get("scopes")
+        if not isinstance(record_scopes, dict):
+            continue
+        for scope, seconds in record_scopes.items():
+            try:
+                seconds = float(seconds)
+            except (TypeError, ValueError):
+                continue
+            scopes.setdefault((theme, scope), []).append(seconds)
+    return themes, scopes
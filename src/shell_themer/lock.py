@@ -0,0 +1,76 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""cross process locking, so only one process does expensive work at a time"""
+
+import contextlib
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: nocover
+    # no fcntl on windows, so we don't lock at all
+    fcntl = None
+
+
+@contextlib.contextmanager
+def exclusive(path, timeout):
+    """hold an exclusive lock on path while in the context
+
+    Waits up to timeout seconds for any other process holding the lock to
+    release it. Yields True if we got the lock, or False if we gave up
+    waiting, in which case the caller should go ahead without it.
+
+    The lock file is created if it doesn't exist, and is left behind when
+    the lock is released. The lock is released by the operating system if
+    the process holding it dies.
+    """
+    if not fcntl:  # pragma: nocover
+        yield False
+        return
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = time.monotonic() + timeout
+        delay = 0.001
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                locked = True
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    locked = False
+                    break
+                time.sleep(delay)
+                # start fast, because most of the time the work being done
+                # by whoever has the lock is quick
+                delay = min(delay * 2, 0.05)
+        try:
+            yield locked
+        finally:
+            if locked:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
@@ -0,0 +1,151 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""run fzf for 'shell-themer pick', and pre-render the theme previews for it
+in a pool of processes
+
+the previews are stored as ansi text in the cache directory, so the fzf
+preview window only has to cat them
+"""
+
+import concurrent.futures
+import contextlib
+import hashlib
+import os
+import shlex
+import sys
+
+from .atomic import write_atomic
+from .version import version_string
+
+
+def content_key(theme_file):
+    """a hash of the contents of theme_file, which changes whenever the theme
+    or the version of shell-themer which renders it does"""
+    digest = hashlib.sha256(version_string().encode("utf-8") + b"\0")
+    with open(theme_file, "rb") as file:
+        digest.update(file.read())
+    return digest.hexdigest()
+
+
+def choices(themes, preview_dir, width):
+    """what fzf chooses from, one line for each of themes, a list of theme
+    files, with the name to show, the content key, and the theme file
+
+    themes which can't be read are left out
+
+    :returns: a tuple of (the lines for fzf, the content keys of the themes,
+        and the (theme_file, width, path) jobs to render the previews which
+        aren't in preview_dir yet)
+    """
+    lines = []
+    keys = set()
+    jobs = []
+    for theme in themes:
+        try:
+            key = content_key(theme)
+        except OSError:
+            continue
+        keys.add(key)
+        lines.append(f"{theme.stem}\t{key}\t{theme}\n")
+        path = preview_dir / f"{key}.{width}.ansi"
+        if not path.exists():
+            jobs.append((theme, width, path))
+    return "".join(lines), keys, jobs
+
+
+def fzf_command(fzf, preview_dir, width):
+    """the command line to run fzf with a preview window width columns wide,
+    which shows the previews in preview_dir"""
+    themer = f"{shlex.quote(sys.executable)} -m shell_themer"
+    previews = shlex.quote(str(preview_dir))
+    # if the preview isn't there yet, or the window is a different width
+    # than we guessed, render it now
+    preview_cmd = (
+        f"cat {previews}/{{2}}.$FZF_PREVIEW_COLUMNS.ansi 2>/dev/null"
+        f" || {themer} -f {{3}} preview --width $FZF_PREVIEW_COLUMNS --cache"
+    )
+    return [
+        fzf,
+        "--ansi",
+        "--delimiter=\t",
+        "--with-nth=1",
+        f"--preview={preview_cmd}",
+        f"--preview-window=right:{width}:noborder",
+    ]
+
+
+def prune(preview_dir, keys):
+    """remove the previews of themes which have changed or are gone, keys
+    are the content keys of the themes we still have"""
+    try:
+        entries = os.scandir(preview_dir)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            # leave temporary files from write_atomic() alone
+            if entry.name.startswith("."):
+                continue
+            if entry.name.split(".", 1)[0] not in keys:
+                with contextlib.suppress(OSError):
+                    os.unlink(entry.path)
+
+
+def render(factory, theme_file, width, path):
+    """render the preview of theme_file at width into path
+
+    factory creates a Themer, we can't import it without importing
+    ourselves in a circle
+
+    :returns: path, or None if the theme couldn't be rendered
+    """
+    try:
+        thm = factory()
+        thm.load(theme_file)
+        write_atomic(path, thm.render_preview(width))
+    except Exception:  # pylint: disable=broad-except
+        # a broken theme shows its error in the preview window instead,
+        # when fzf runs 'shell-themer preview' for it
+        return None
+    return path
+
+
+def start(factory, jobs):
+    """render each of jobs, a list of (theme_file, width, path) tuples, in a
+    pool of background processes, in order
+
+    :returns: the executor and the futures, pass them to stop()
+    """
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=min(len(jobs), os.cpu_count() or 1) or 1
+    )
+    futures = [executor.submit(render, factory, *job) for job in jobs]
+    return executor, futures
+
+
+def stop(executor, futures):
+    """stop rendering, without waiting for renders which haven't started"""
+    for future in futures:
+        future.cancel()
+    executor.shutdown(wait=True)
@@ -0,0 +1,257 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""time the phases of a run, for the --profile option and $SHELL_THEMER_TRACE
+
+This module is imported before anything else in the package, so it can
+tell how long it took to import everything else. It must not import
+anything outside the standard library.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+IMPORT_START = time.perf_counter()
+
+# the widest a label can be in the report
+WIDTH = 60
+
+
+class Profiler:
+    """record how long each phase of a run takes
+
+    phases can be nested, and the report shows them indented under the
+    phase they ran in. Phases can run in more than one thread at once, each
+    thread keeps track of its own nesting.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        # each row is [depth, label, seconds, calls]
+        self.rows = []
+        # the rows for each phase name, with their details
+        self._phases = {}
+        # facts about the run, like whether the output was fresh
+        self.notes = {}
+        self._local = threading.local()
+
+    @property
+    def _depth(self):
+        return getattr(self._local, "depth", 0)
+
+    @_depth.setter
+    def _depth(self, value):
+        self._local.depth = value
+
+    @contextlib.contextmanager
+    def phase(self, name, detail=None):
+        """time everything in the context as a row of the report
+
+        detail is shown after the name, like the name of a scope
+        """
+        label = f"{name} {detail}" if detail is not None else name
+        row = [self._depth, label, 0.0, 1]
+        self.rows.append(row)
+        self._phases.setdefault(name, []).append((detail, row))
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            row[2] = time.perf_counter() - start
+            self._depth -= 1
+
+    def add(self, name, start, end):
+        """add a row for something which has already been timed
+
+        start and end are from time.perf_counter()
+        """
+        self.rows.append([self._depth, name, end - start, 1])
+
+    def note(self, key, value):
+        """remember a fact about the run"""
+        self.notes[key] = value
+
+    def phases(self, name):
+        """the phases with name, and how long each of them took
+
+        :returns: a list of (detail, seconds) tuples, in the order the phases
+            started
+        """
+        return [(detail, row[2]) for detail, row in self._phases.get(name, [])]
+
+    def wrap(self, name, func):
+        """wrap func so that the time spent in all the calls to it adds up
+        to a single row of the report, in the phase it is first called in"""
+        row = None
+
+        def _timed(*args, **kwargs):
+            nonlocal row
+            if row is None:
+                row = [self._depth, name, 0.0, 0]
+                self.rows.append(row)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                row[2] += time.perf_counter() - start
+                row[3] += 1
+
+        return _timed
+
+    def report(self):
+        """the lines of the report"""
+        lines = [f"{'phase':<{WIDTH}} {'calls':>6} {'ms':>10}"]
+        for depth, label, seconds, calls in self.rows:
+            label = "  " * depth + label
+            if len(label) > WIDTH:
+                label = label[: WIDTH - 3] + "..."
+            lines.append(f"{label:<{WIDTH}} {calls:>6} {seconds * 1000:>10.2f}")
+        return lines
+
+
+class Tracer(Profiler):
+    """a profiler which also records every phase as a chrome trace event
+
+    the trace can be opened in https://ui.perfetto.dev or chrome://tracing,
+    and each thread gets its own track. Unlike the report, every call to a
+    wrapped function is recorded separately.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name, detail=None):
+        start = time.perf_counter()
+        try:
+            with super().phase(name, detail):
+                yield
+        finally:
+            self._event(name, detail, start, time.perf_counter())
+
+    def add(self, name, start, end):
+        super().add(name, start, end)
+        self._event(name, None, start, end)
+
+    def wrap(self, name, func):
+        timed = super().wrap(name, func)
+
+        def _traced(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return timed(*args, **kwargs)
+            finally:
+                self._event(name, None, start, time.perf_counter())
+
+        return _traced
+
+    def _event(self, name, detail, start, end):
+        """record a complete event, times are from time.perf_counter()"""
+        event = {
+            "name": f"{name} {detail}" if detail is not None else name,
+            "cat": name,
+            "ph": "X",
+            # trace events are in microseconds
+            "ts": (start - IMPORT_START) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": self._thread_id(),
+        }
+        if detail is not None:
+            event["args"] = {"detail": str(detail)}
+        self.events.append(event)
+
+    def _thread_id(self):
+        """a small number for the current thread, which is the track its
+        events are shown on"""
+        ident = threading.get_ident()
+        with self._lock:
+            try:
+                return self._threads[ident]
+            except KeyError:
+                tid = len(self._threads) + 1
+                self._threads[ident] = tid
+        if ident == threading.main_thread().ident:
+            thread_name = "main"
+        else:
+            thread_name = f"worker {tid - 1}"
+        self.events.append(self._metadata("thread_name", thread_name, tid))
+        return tid
+
+    @staticmethod
+    def _metadata(name, value, tid=0):
+        return {
+            "name": name,
+            "ph": "M",
+            "pid": os.getpid(),
+            "tid": tid,
+            "args": {"name": value},
+        }
+
+    def trace(self):
+        """the trace as a dict in chrome trace event format, ready to be
+        saved as json"""
+        events = [self._metadata("process_name", "shell-themer")]
+        events.extend(self.events)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path):
+        """save the trace as json in path"""
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.trace(), file)
+
+
+class NullProfiler:
+    """a profiler which does nothing, as cheaply as possible"""
+
+    enabled = False
+    _context = contextlib.nullcontext()
+
+    def phase(self, _name, _detail=None):
+        """do nothing"""
+        return self._context
+
+    def add(self, _name, _start, _end):
+        """do nothing"""
+
+    def note(self, _key, _value):
+        """do nothing"""
+
+    def wrap(self, _name, func):
+        """don't wrap func"""
+        return func
+
+    def report(self):
+        """there is nothing to report"""
+        return []
+
+
+NULL = NullProfiler()
@@ -0,0 +1,91 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""compact swatch panels for comparing many themes with 'preview'
+
+themes are loaded by load(), which runs in worker processes and returns
+only plain data, and the panels are put together by panel() in the main
+process
+"""
+
+import rich.box
+import rich.panel
+import rich.style
+import rich.text
+
+# how wide each panel is, including the border
+PANEL_WIDTH = 26
+
+
+def load(factory, theme_file):
+    """load theme_file and boil it down to what a swatch panel needs
+
+    factory creates a Themer, we can't import it without importing
+    ourselves in a circle
+
+    :returns: a dict with the name of the theme, the text style, and a list
+        of (name, style) tuples for the rest of the styles. The styles are
+        strings so they can come back from another process. If the theme
+        couldn't be loaded, the dict has an error instead.
+    """
+    data = {"name": theme_file.stem, "text": None, "styles": [], "error": None}
+    try:
+        thm = factory()
+        thm.load(theme_file)
+    except Exception as err:  # pylint: disable=broad-except
+        # one broken theme shouldn't stop us from showing the rest
+        data["error"] = str(err)
+        return data
+    for name, style in thm.styles.items():
+        if name == "text":
+            data["text"] = str(style)
+        elif name != "background":
+            data["styles"].append((name, str(style)))
+    return data
+
+
+def panel(data):
+    """a small panel showing a block of color for each style in a theme"""
+    if data["error"]:
+        body = rich.text.Text(data["error"], style="red")
+        return rich.panel.Panel(
+            body, title=data["name"], box=rich.box.ROUNDED, width=PANEL_WIDTH
+        )
+    body = rich.text.Text()
+    for _, styledef in data["styles"]:
+        style = rich.style.Style.parse(styledef)
+        # the background color if there is one, because that's usually what
+        # makes a style stand out, otherwise the foreground color
+        color = style.bgcolor or style.color
+        if color:
+            body.append("██", style=rich.style.Style(color=color))
+        else:
+            body.append("··", style=style)
+        body.append(" ")
+    return rich.panel.Panel(
+        body,
+        title=data["name"],
+        box=rich.box.ROUNDED,
+        width=PANEL_WIDTH,
+        style=data["text"] or "default",
+    )
@@ -0,0 +1,317 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""generate made up themes of any size
+
+these are for testing and benchmarking how shell-themer behaves with
+themes many times bigger than anyone would write by hand. The same
+arguments and seed always produce exactly the same theme.
+
+    >>> toml = theme(variables=2000, styles=2000, scopes=100)
+    >>> toml = scaled(100)
+
+every generated theme can be loaded and every scope in it generated
+without errors.
+"""
+
+import json
+import random
+import re
+
+from .themer import Themer
+
+GENERATORS = [
+    "environment_variables",
+    "fzf",
+    "ls_colors",
+    "exa_colors",
+    "iterm",
+    "shell",
+]
+
+# the sizes of a theme when scale is 1, a little bigger than dracula
+DEFAULTS = {
+    "variables": 20,
+    "styles": 20,
+    "scopes": 1,
+    "enabled_if": 1,
+    "fzf_options": 4,
+    "filesets": 3,
+}
+
+# named colors, so not every color is a hex color
+COLORS = ["red", "green", "blue", "yellow", "magenta", "cyan", "white", "default"]
+ATTRIBUTES = ["", " bold", " italic", " underline", " dim", " reverse"]
+FZF_STYLES = [
+    "text",
+    "current_line",
+    "preview",
+    "hl",
+    "hl+",
+    "info",
+    "border",
+    "prompt",
+    "pointer",
+    "marker",
+    "spinner",
+    "header",
+]
+# these are quick to run, so generating a theme with lots of them
+# doesn't take forever
+ENABLED_IF = ["true", "false", '[ -n "{var:var0}" ]']
+EXTENSIONS = ["txt", "md", "conf", "jpg", "png", "mp4", "py", "toml", "json", "sh"]
+
+
+def theme(
+    *,
+    variables=DEFAULTS["variables"],
+    chain=4,
+    styles=DEFAULTS["styles"],
+    scopes=DEFAULTS["scopes"],
+    enabled_if=DEFAULTS["enabled_if"],
+    fzf_options=DEFAULTS["fzf_options"],
+    filesets=DEFAULTS["filesets"],
+    globs=3,
+    seed=0,
+):
+    """the toml for a made up theme
+
+    variables - how many variables to define
+    chain - variables are defined in chains this long, the first variable
+        in a chain is a color, and each of the others references the one
+        before it, so the last one takes chain - 1 lookups to interpolate
+    styles - how many styles to define, most of which use variables
+    scopes - how many scopes to create for each generator
+    enabled_if - how many scopes have an enabled_if command
+    fzf_options - how many command line options in each fzf scope
+    filesets - how many filesets in each ls_colors and exa_colors scope
+    globs - how many globs in each fileset
+    seed - for the random number generator
+    """
+    # pylint: disable=too-many-arguments
+    rand = random.Random(seed)
+    definition = {"name": f"synthetic-{seed}", "version": "1.0.0"}
+    definition["variables"] = _variables(rand, variables, chain)
+    variable_names = list(definition["variables"])
+    definition["styles"] = _styles(rand, styles, variable_names)
+    definition["scope"] = _scopes(
+        rand,
+        scopes,
+        list(definition["styles"]),
+        variable_names,
+        fzf_options=fzf_options,
+        filesets=filesets,
+        globs=globs,
+    )
+
+    # spread the enabled_if commands across all the scopes
+    names = list(definition["scope"])
+    for name in rand.sample(names, min(enabled_if, len(names))):
+        definition["scope"][name]["enabled_if"] = rand.choice(ENABLED_IF)
+
+    return "\n".join(_toml(definition, []))
+
+
+def scaled(factor, seed=0):
+    """the toml for a made up theme factor times bigger than the defaults"""
+    sizes = {key: value * factor for key, value in DEFAULTS.items()}
+    return theme(seed=seed, **sizes)
+
+
+def _variables(rand, count, chain):
+    """count variables, in chains chain long"""
+    names = [f"var{num}" for num in range(count)]
+    variables = {}
+    for num, name in enumerate(names):
+        if num % max(chain, 1):
+            variables[name] = f"{{var:{names[num - 1]}}}"
+        else:
+            variables[name] = _color(rand)
+    return variables
+
+
+def _styles(rand, count, variable_names):
+    """count styles, starting with the ones the preview uses"""
+    names = ["text", "background", "foreground"]
+    names += [f"style{num}" for num in range(max(count - 3, 0))]
+    return {name: _style(rand, variable_names) for name in names[:count]}
+
+
+def _scopes(rand, count, style_names, variable_names, *, fzf_options, filesets, globs):
+    """count scopes for each generator"""
+    # pylint: disable=too-many-arguments
+    scopes = {}
+    for num in range(count):
+        for generator in GENERATORS:
+            scopedef = {"generator": generator}
+            _SCOPES[generator](rand, scopedef, num, style_names, variable_names)
+            if generator == "fzf":
+                _fzf_options(rand, scopedef, fzf_options, variable_names)
+            elif generator in ["ls_colors", "exa_colors"]:
+                _filesets(rand, scopedef, filesets, globs, style_names)
+            scopes[f"{generator}{num}"] = scopedef
+    return scopes
+
+
+def _toml(table, path):
+    """the lines of toml for a table and all the tables in it
+
+    tomlkit takes minutes to write the biggest themes, and we know
+    exactly what's in ours, so we do it ourselves
+    """
+    lines = []
+    if path:
+        lines.append(f"\n[{'.'.join(_key(key) for key in path)}]")
+    subtables = []
+    for key, value in table.items():
+        if isinstance(value, dict):
+            subtables.append(key)
+        else:
+            # toml strings and arrays of strings are the same as json
+            lines.append(f"{_key(key)} = {json.dumps(value)}")
+    for key in subtables:
+        lines.extend(_toml(table[key], path + [key]))
+    return lines
+
+
+def _key(key):
+    """quote a key if it can't be a bare key"""
+    if re.fullmatch(r"[A-Za-z0-9_-]+", key):
+        return key
+    return json.dumps(key)
+
+
+def _color(rand, named=False):
+    """a random color, either a name or a hex code
+
+    {style:name} needs a hex color to turn into text, so only colors
+    which never get near one of those should be named
+    """
+    if named and rand.random() < 0.25:
+        return rand.choice(COLORS)
+    return f"#{rand.randrange(0x1000000):06x}"
+
+
+def _style(rand, variable_names):
+    """a random style definition, which usually uses variables"""
+    if variable_names and rand.random() < 0.75:
+        foreground = f"{{var:{rand.choice(variable_names)}}}"
+    else:
+        foreground = _color(rand)
+    style = foreground + rand.choice(ATTRIBUTES)
+    if rand.random() < 0.25:
+        style += f" on {_color(rand, named=True)}"
+    return style
+
+
+def _style_of(rand, style_names):
+    """a style for a scope, either the name of a style or a definition"""
+    if style_names and rand.random() < 0.75:
+        return rand.choice(style_names)
+    return _color(rand, named=True) + rand.choice(ATTRIBUTES)
+
+
+def _reference(rand, style_names, variable_names):
+    """a string which uses a style or a variable"""
+    if style_names and rand.random() < 0.5:
+        return f"{{style:{rand.choice(style_names)}}}"
+    if variable_names:
+        return f"{{var:{rand.choice(variable_names)}}}"
+    return _color(rand)
+
+
+def _environment_variables(rand, scopedef, num, style_names, variable_names):
+    scopedef["environment"] = {
+        "unset": [f"THEME_UNSET{num}"],
+        "export": {
+            f"THEME_{num}_{var}": _reference(rand, style_names, variable_names)
+            for var in range(4)
+        },
+    }
+
+
+def _fzf(rand, scopedef, num, style_names, _):
+    scopedef["environment_variable"] = f"FZF_OPTS{num}"
+    scopedef["colorbase"] = rand.choice(["dark", "light", "bw"])
+    scopedef["style"] = {name: _style_of(rand, style_names) for name in FZF_STYLES}
+
+
+def _fzf_options(rand, scopedef, count, variable_names):
+    scopedef["opt"] = {}
+    for option in range(count):
+        if option % 2:
+            value = True
+        elif variable_names and rand.random() < 0.5:
+            value = f"{{var:{rand.choice(variable_names)}}}"
+        else:
+            value = f"value{option}"
+        scopedef["opt"][f"--option{option}"] = value
+
+
+def _ls_colors(rand, scopedef, num, style_names, _):
+    scopedef["environment_variable"] = f"LS_COLORS{num}"
+    scopedef["clear_builtin"] = rand.random() < 0.5
+    scopedef["style"] = {
+        name: _style_of(rand, style_names) for name in Themer.LS_COLORS_BASE_MAP
+    }
+
+
+def _exa_colors(rand, scopedef, num, style_names, _):
+    scopedef["environment_variable"] = f"EXA_COLORS{num}"
+    scopedef["clear_builtin"] = rand.random() < 0.5
+    scopedef["style"] = {
+        name: _style_of(rand, style_names) for name in Themer.EXA_COLORS_BASE_MAP
+    }
+
+
+def _filesets(rand, scopedef, count, globs, style_names):
+    scopedef["fileset"] = {}
+    for fileset in range(count):
+        scopedef["fileset"][f"fileset{fileset}"] = {
+            "globs": [f"*{glob}.{rand.choice(EXTENSIONS)}" for glob in range(globs)],
+            "style": _style_of(rand, style_names),
+        }
+
+
+def _iterm(rand, scopedef, _, style_names, __):
+    scopedef["style"] = {
+        "foreground": _style_of(rand, style_names),
+        "background": _style_of(rand, style_names),
+    }
+
+
+def _shell(rand, scopedef, num, style_names, variable_names):
+    scopedef["command"] = {
+        f"command{command}": f"echo {num} {_reference(rand, style_names, variable_names)}"
+        for command in range(2)
+    }
+
+
+_SCOPES = {
+    "environment_variables": _environment_variables,
+    "fzf": _fzf,
+    "ls_colors": _ls_colors,
+    "exa_colors": _exa_colors,
+    "iterm": _iterm,
+    "shell": _shell,
+}
@@ -24,12 +24,21 @@
 """command line tool for maintaining and switching color schemes"""
 
 import argparse
+import contextlib
+import fnmatch
 import functools
+import hashlib
+import io
+import json
 import os
 import pathlib
 import re
+import shlex
+import shutil
 import subprocess
 import sys
+import threading
+import time
 
 
 import rich.box
@@ -37,10 +46,14 @@ import rich.color
 import rich.console
 import rich.errors
 import rich.layout
+import rich.panel
 import rich.style
+import rich.table
 from rich_argparse import RichHelpFormatter
 import tomlkit
 
+from . import cmdline, completion, history, lock, profiler
+from .atomic import write_atomic
 from .version import version_string
 
 
@@ -59,6 +72,7 @@ class Themer:
     @classmethod
     def argparser(cls):
         """Build the argument parser"""
+        # pylint: disable=too-many-locals, too-many-statements
 
         RichHelpFormatter.usage_markup = True
         RichHelpFormatter.group_name_formatter = str.lower
@@ -106,6 +120,9 @@ class Themer:
         file_help = "specify a file containing a theme"
         tgroup.add_argument("-f", "--file", metavar="<path>", help=file_help)
 
+        profile_help = "show how long each phase of the run took on standard error"
+        parser.add_argument("--profile", action="store_true", help=profile_help)
+
         # the commands
         subparsers = parser.add_subparsers(
             dest="command",
@@ -122,40 +139,243 @@ class Themer:
             "generate",
             help=generate_help,
         )
-        scope_help = "only generate the given scope"
-        generate_parser.add_argument("-s", "--scope", help=scope_help)
-        comment_help = "add comments to the generated output"
+        cls._add_output_arguments(generate_parser)
+        if_stale_help = (
+            "only generate --output if it is older than the theme file, and"
+            " wait for any other process already generating it"
+        )
         generate_parser.add_argument(
-            "-c", "--comment", action="store_true", help=comment_help
+            "--if-stale", action="store_true", help=if_stale_help
+        )
+        via_daemon_help = (
+            "ask the daemon started by 'serve' to generate the output, or"
+            " generate it here if the daemon isn't running"
+        )
+        generate_parser.add_argument(
+            "--via-daemon", action="store_true", help=via_daemon_help
+        )
+        stdin_batch_help = (
+            "read a stream of theme documents from stdin, each either a line"
+            " of json with the toml in 'toml', or a line with the length of"
+            " the toml in bytes followed by the toml, and output a line of"
+            " json for each one"
+        )
+        generate_parser.add_argument(
+            "--stdin-batch", action="store_true", help=stdin_batch_help
+        )
+        jobs_help = (
+            "the number of documents to generate at once with --stdin-batch"
+            " (default: the number of cpus)"
+        )
+        generate_parser.add_argument("--jobs", type=int, metavar="<n>", help=jobs_help)
+
+        watch_help = (
+            "watch the theme file and $THEME_DIR for changes, and generate"
+            " the output every time they change"
+        )
+        watch_parser = subparsers.add_parser("watch", help=watch_help)
+        cls._add_output_arguments(watch_parser)
+        debounce_help = (
+            "wait until the theme has stopped changing for this many seconds"
+            " before generating the output (default: 0.2)"
+        )
+        watch_parser.add_argument(
+            "--debounce",
+            metavar="<seconds>",
+            type=float,
+            default=0.2,
+            help=debounce_help,
+        )
+        poll_help = (
+            "check file modification times instead of waiting for the"
+            " operating system to tell us about changes"
+        )
+        watch_parser.add_argument("--poll", action="store_true", help=poll_help)
+
+        switch_help = (
+            "switch all your shells to a theme, the next time they show a prompt"
+        )
+        switch_parser = subparsers.add_parser("switch", help=switch_help)
+        name_help = "the name of the theme in $THEME_DIR, or use -t or -f"
+        switch_parser.add_argument("name", nargs="?", metavar="<name>", help=name_help)
+
+        init_help = "generate shell code to activate a theme when your shell starts"
+        init_parser = subparsers.add_parser("init", help=init_help)
+        shell_help = "the shell to generate initialization code for"
+        init_parser.add_argument("shell", choices=["bash", "zsh"], help=shell_help)
+
+        completion_help = "generate shell code for tab completion"
+        completion_parser = subparsers.add_parser("completion", help=completion_help)
+        completion_shell_help = "the shell to generate completion code for"
+        completion_parser.add_argument(
+            "shell", choices=["bash", "zsh"], help=completion_shell_help
+        )
+
+        serve_help = (
+            "run a daemon which keeps themes in memory to quickly generate"
+            " output for 'generate --via-daemon'"
         )
+        serve_parser = subparsers.add_parser("serve", help=serve_help)
+        socket_help = (
+            "the unix domain socket to listen on"
+            " (default: $XDG_RUNTIME_DIR/shell-themer/daemon.sock)"
+        )
+        serve_parser.add_argument("--socket", metavar="<path>", help=socket_help)
+        max_themes_help = "the most themes to keep loaded in memory (default: 16)"
+        serve_parser.add_argument(
+            "--max-themes",
+            metavar="<n>",
+            type=int,
+            default=16,
+            help=max_themes_help,
+        )
+
+        stats_help = (
+            "show how long generate took, from the history kept when"
+            " $SHELL_THEMER_HISTORY is set"
+        )
+        subparsers.add_parser("stats", help=stats_help)
 
         list_help = "list all themes in $THEMES_DIR"
         subparsers.add_parser("list", help=list_help)
 
         preview_help = "show a preview of the styles in a theme"
-        subparsers.add_parser("preview", help=preview_help)
+        preview_parser = subparsers.add_parser("preview", help=preview_help)
+        width_help = "the width of the preview (default: the terminal width)"
+        preview_parser.add_argument("--width", type=int, metavar="<n>", help=width_help)
+        cache_help = (
+            "render the preview as ansi text, using and updating the cache"
+            " of previews rendered by 'pick'"
+        )
+        preview_parser.add_argument("--cache", action="store_true", help=cache_help)
+        all_help = (
+            "show a compact preview of every theme in $THEME_DIR, you can also"
+            " compare a few themes with -t name1,name2"
+        )
+        preview_parser.add_argument("--all", action="store_true", help=all_help)
+        page_help = (
+            "only show the given page of styles and scopes, each page fits in"
+            " the terminal"
+        )
+        preview_parser.add_argument(
+            "--page", type=cls._page_number, metavar="<n>", help=page_help
+        )
+        filter_help = (
+            "only show styles and scopes whose names contain <pattern>, or"
+            " match it if it has shell wildcards"
+        )
+        preview_parser.add_argument("--filter", metavar="<pattern>", help=filter_help)
+        pager_help = "show the preview a page at a time in $PAGER"
+        preview_parser.add_argument("--pager", action="store_true", help=pager_help)
+
+        pick_help = (
+            "choose a theme from $THEME_DIR with fzf, and switch all your"
+            " shells to it"
+        )
+        subparsers.add_parser("pick", help=pick_help)
 
         help_help = "display this usage message"
         subparsers.add_parser("help", help=help_help)
 
         return parser
 
+    @staticmethod
+    def _page_number(value):
+        """convert the value of --page to an int, pages count from 1"""
+        try:
+            number = int(value)
+        except ValueError:
+            number = 0
+        if number < 1:
+            raise argparse.ArgumentTypeError(
+                f"{value}: must be a whole number of 1 or more"
+            )
+        return number
+
+    @classmethod
+    def _add_output_arguments(cls, parser):
+        """add the arguments which control what gets generated and where it
+        goes to a subcommand parser"""
+        scope_help = "only generate the given scope"
+        parser.add_argument("-s", "--scope", help=scope_help)
+        comment_help = "add comments to the generated output"
+        parser.add_argument("-c", "--comment", action="store_true", help=comment_help)
+        defer_help = (
+            "check enabled_if in the generated shell code when it runs,"
+            " instead of when the code is generated"
+        )
+        parser.add_argument("--defer-conditions", action="store_true", help=defer_help)
+        output_help = (
+            "write the generated code to a file instead of standard output,"
+            " without touching the file if its contents haven't changed"
+        )
+        parser.add_argument("-o", "--output", metavar="<path>", help=output_help)
+        format_help = "output format, either shell code or json (default: shell)"
+        parser.add_argument(
+            "--format",
+            choices=["shell", "json"],
+            default="shell",
+            help=format_help,
+        )
+        split_help = (
+            "write the generated code for each scope to a separate file in"
+            " the given directory, along with a manifest.json"
+        )
+        parser.add_argument("--split-dir", metavar="<dir>", help=split_help)
+
     @classmethod
     def main(cls, argv=None):
         """Entry point from the command line
 
         parse arguments and call dispatch() for processing
         """
-
-        parser = cls.argparser()
-        try:
-            args = parser.parse_args(argv)
-        except SystemExit as exc:
-            return exc.code
+        start = time.perf_counter()
+        if argv is None:
+            argv = sys.argv[1:]
+        # the command lines shells run when they start are parsed without
+        # building the full parser
+        args = cmdline.fast_parse(argv)
+        if args:
+            prog = os.path.basename(sys.argv[0])
+        else:
+            parser = cls.argparser()
+            try:
+                args = parser.parse_args(argv)
+            except SystemExit as exc:
+                return exc.code
+            prog = parser.prog
 
         # create an instance of ourselves
-        thm = cls(parser.prog)
-        return thm.dispatch(args)
+        thm = cls(prog)
+        trace_file = os.environ.get("SHELL_THEMER_TRACE")
+        keep_history = (
+            args.command == "generate"
+            and not args.stdin_batch
+            and os.environ.get("SHELL_THEMER_HISTORY", "") not in ["", "0"]
+        )
+        if not args.profile and not trace_file and not keep_history:
+            return thm.dispatch(args)
+
+        prof = profiler.Tracer() if trace_file else profiler.Profiler()
+        prof.add("import", profiler.IMPORT_START, start)
+        prof.add("parse arguments", start, time.perf_counter())
+        thm.profiler = prof
+        with prof.phase(args.command or "dispatch"):
+            exit_code = thm.dispatch(args)
+        end = time.perf_counter()
+        prof.add("total", profiler.IMPORT_START, end)
+        if keep_history:
+            thm.record_history(args, prof, end - profiler.IMPORT_START, exit_code)
+        if args.profile:
+            print("\n".join(prof.report()), file=sys.stderr)
+        if trace_file:
+            try:
+                prof.write(trace_file)
+            except OSError as err:
+                # the output has already been generated, so this isn't
+                # worth failing over
+                print(f"{prog}: {trace_file}: {err.strerror}", file=sys.stderr)
+        return exit_code
 
     #
     # initialization and properties
@@ -187,6 +407,8 @@ class Themer:
         self.theme_file = None
         self.definition = {}
         self.styles = {}
+        # main() replaces this with a real one for --profile
+        self.profiler = profiler.NULL
 
         self.loads()
 
@@ -201,12 +423,34 @@ class Themer:
             raise ThemeError(f"{self.prog}: {tdir}: no such directory")
         return tdir
 
+    @property
+    def cache_dir(self):
+        """Get the directory where generated output is cached
+
+        Resolution order:
+        1. $SHELL_THEMER_CACHE_DIR environment variable
+        2. $XDG_CACHE_HOME/shell-themer
+        3. ~/.cache/shell-themer
+
+        The directory may not exist yet, it's up to the caller to create it.
+        """
+        try:
+            return pathlib.Path(os.environ["SHELL_THEMER_CACHE_DIR"])
+        except KeyError:
+            pass
+        try:
+            base = pathlib.Path(os.environ["XDG_CACHE_HOME"])
+        except KeyError:
+            base = pathlib.Path.home() / ".cache"
+        return base / "shell-themer"
+
     #
     # methods to process command line arguments and dispatch them
     # to the appropriate methods for execution
     #
     def dispatch(self, args):
         """process and execute all the arguments and options"""
+        # pylint: disable=too-many-branches
         # set the color output options
         self.set_output_colors(args)
 
@@ -225,8 +469,22 @@ class Themer:
                 exit_code = self.dispatch_list(args)
             elif args.command == "preview":
                 exit_code = self.dispatch_preview(args)
+            elif args.command == "pick":
+                exit_code = self.dispatch_pick(args)
             elif args.command == "generate":
                 exit_code = self.dispatch_generate(args)
+            elif args.command == "init":
+                exit_code = self.dispatch_init(args)
+            elif args.command == "serve":
+                exit_code = self.dispatch_serve(args)
+            elif args.command == "watch":
+                exit_code = self.dispatch_watch(args)
+            elif args.command == "switch":
+                exit_code = self.dispatch_switch(args)
+            elif args.command == "completion":
+                exit_code = self.dispatch_completion(args)
+            elif args.command == "stats":
+                exit_code = self.dispatch_stats(args)
             else:
                 print(f"{self.prog}: {args.command}: unknown command", file=sys.stderr)
                 exit_code = self.EXIT_USAGE
@@ -308,16 +566,35 @@ class Themer:
     def load_from_args(self, args):
         """Load a theme from the command line args
 
-        Resolution order:
-        1. --file from the command line
-        2. --theme from the command line
-        3. $THEME_FILE environment variable
+        See theme_file_from_args() for how the theme file is found.
 
         This either loads the theme or raises an exception.
         It doesn't return anything
 
         :raises: an exception if we can't find a theme file
 
+        """
+        with self.profiler.phase("find theme file"):
+            fname = self.theme_file_from_args(args)
+        self.load(fname)
+
+    def load(self, fname):
+        """Load a theme from a file"""
+        with self.profiler.phase("parse toml", fname):
+            with open(fname, "rb") as file:
+                self.definition = tomlkit.load(file)
+        self.theme_file = fname
+        self._process_definition()
+
+    def theme_file_from_args(self, args):
+        """Find the theme file specified by the command line args
+
+        Resolution order:
+        1. --file from the command line
+        2. --theme from the command line
+        3. $THEME_FILE environment variable
+
+        :raises: an exception if we can't find a theme file
         """
         fname = None
         if args.file:
@@ -335,11 +612,7 @@ class Themer:
                 pass
         if not fname:
             raise ThemeError(f"{self.prog}: no theme or theme file specified")
-
-        with open(fname, "rb") as file:
-            self.definition = tomlkit.load(file)
-        self.theme_file = fname
-        self._process_definition()
+        return fname
 
     def loads(self, tomlstring=None):
         """Load a theme from a given string"""
@@ -349,22 +622,31 @@ class Themer:
             # tomlkit can't parse None, so if we got it as the default
             # or if the caller pased None intentionally...
             toparse = ""
-        self.definition = tomlkit.loads(toparse)
+        with self.profiler.phase("parse toml"):
+            self.definition = tomlkit.loads(toparse)
+        self.theme_file = None
         self._process_definition()
 
     def _process_definition(self):
         """process a newly loaded definition, including variables and styles"""
 
+        # wrapped so that --profile can add up the time spent in each of
+        # them, without slowing anything down when it isn't used
+        interpolate = self.profiler.wrap(
+            "interpolate variables", self.variable_interpolate
+        )
+        parse = self.profiler.wrap("parse styles", rich.style.Style.parse)
         # process the styles
         self.styles = {}
-        try:
-            for key, styledef in self.definition["styles"].items():
-                # interpolate variables
-                interpdef = self.variable_interpolate(styledef)
-                # and parse the style definition
-                self.styles[key] = rich.style.Style.parse(interpdef)
-        except KeyError:
-            pass
+        with self.profiler.phase("process definition"):
+            try:
+                for key, styledef in self.definition["styles"].items():
+                    # interpolate variables
+                    interpdef = interpolate(styledef)
+                    # and parse the style definition
+                    self.styles[key] = parse(interpdef)
+            except KeyError:
+                pass
 
     #
     # style and variable related methods
@@ -555,7 +837,7 @@ class Themer:
             pass
         return scopedef
 
-    def is_enabled(self, scope):
+    def is_enabled(self, scope, env=None, cwd=None):
         """Determine if the scope is enabled
         The default is that the scope is enabled
 
@@ -567,6 +849,9 @@ class Themer:
             enabled_if = "{shell cmd}" returns a non-zero exit code
 
         if 'enabled = false' is present, then enabled_if is not checked
+
+        env is the environment to run enabled_if in, and cwd the directory,
+        if they are None those of this process are used
         """
         scopedef = self.scopedef_for(scope)
         try:
@@ -578,24 +863,43 @@ class Themer:
             # no enabled command, but we need to still keep checking
             pass
 
-        try:
-            enabled_if = scopedef["enabled_if"]
-            if not enabled_if:
-                # no command, by rule we say it's enabled
-                return True
-        except KeyError:
+        enabled_if = self.enabled_if_for(scope)
+        if not enabled_if:
             # no enabled_if command, so we must be enabled
             return True
 
-        enabled_if = self.variable_interpolate(enabled_if)
-        enabled_if = self.style_interpolate(enabled_if)
-        proc = subprocess.run(enabled_if, shell=True, check=False, capture_output=True)
+        with self.profiler.phase("enabled_if", enabled_if):
+            proc = subprocess.run(
+                enabled_if,
+                shell=True,
+                check=False,
+                capture_output=True,
+                env=env,
+                cwd=cwd,
+            )
         if proc.returncode != 0:
             # the shell command returned a non-zero exit code
             # and this scope should therefore be disabled
             return False
         return True
 
+    def enabled_if_for(self, scope):
+        """Return the enabled_if shell command for the scope, with all
+        variables and styles interpolated
+
+        Returns None if the scope doesn't have an enabled_if command. This
+        doesn't look at 'enabled', see is_enabled() for how they interact.
+        """
+        scopedef = self.scopedef_for(scope)
+        try:
+            enabled_if = scopedef["enabled_if"]
+        except KeyError:
+            return None
+        if not enabled_if:
+            return None
+        enabled_if = self.variable_interpolate(enabled_if)
+        return self.style_interpolate(enabled_if)
+
     def _assert_bool(self, value, generator, scope, key):
         if not isinstance(value, bool):
             if generator:
@@ -619,6 +923,8 @@ class Themer:
         themes = []
         for theme in themeglob:
             themes.append(theme.stem)
+            # keep the scopes for shell completion up to date
+            self._refresh_scope_index(theme)
         themes.sort()
         for theme in themes:
             print(theme)
@@ -626,19 +932,183 @@ class Themer:
 
     def dispatch_preview(self, args):
         """Display a preview of the styles in a theme"""
+        if args.all or (args.theme and "," in args.theme):
+            return self._preview_many(args)
+        if args.cache:
+            theme_file = self.theme_file_from_args(args)
+            width = args.width or self.console.width
+            path = self.preview_cache_file(theme_file, width)
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    preview = file.read()
+            except FileNotFoundError:
+                self.load(theme_file)
+                preview = self.render_preview(width)
+                write_atomic(path, preview)
+            sys.stdout.write(preview)
+            return self.EXIT_SUCCESS
+
         self.load_from_args(args)
+        if args.width:
+            self.console.width = args.width
+        if args.pager:
+            return self._preview_pager(args)
+        if args.page is not None:
+            page_size = self.preview_page_size(self.console.height)
+            pages = self.preview_pages(page_size, args.filter)
+            for number, page in enumerate(pages, 1):
+                if number == args.page:
+                    self.console.print(page)
+                    return self.EXIT_SUCCESS
+            raise ThemeError(f"{self.prog}: page {args.page}: no such page")
+        self.console.print(self.preview_renderable(*self.preview_names(args.filter)))
+        return self.EXIT_SUCCESS
+
+    def _preview_pager(self, args):
+        """show the preview of the currently loaded theme in $PAGER
+
+        pages are rendered as the pager reads them, so if they quit after
+        the first page, we never render the rest
+        """
+        pager = shlex.split(os.environ.get("PAGER") or "less")
+        env = dict(os.environ)
+        # less needs -R to show colors
+        env.setdefault("LESS", "R")
+        try:
+            proc = subprocess.Popen(  # pylint: disable=consider-using-with
+                pager, stdin=subprocess.PIPE, text=True, encoding="utf-8", env=env
+            )
+        except FileNotFoundError as exc:
+            raise ThemeError(f"{self.prog}: {pager[0]}: pager not found") from exc
+        # rich deals with a broken pipe by exiting, so we render each page
+        # to a string and write it to the pager ourselves
+        buffer = io.StringIO()
+        console = rich.console.Console(
+            file=buffer,
+            width=self.console.width,
+            force_terminal=self.console.is_terminal,
+            soft_wrap=True,
+            markup=False,
+            emoji=False,
+            highlight=False,
+        )
+        page_size = self.preview_page_size(self.console.height)
+        try:
+            for page in self.preview_pages(page_size, args.filter):
+                console.print(page)
+                proc.stdin.write(buffer.getvalue())
+                # a full pipe blocks us until the pager wants more
+                proc.stdin.flush()
+                buffer.seek(0)
+                buffer.truncate()
+        except BrokenPipeError:
+            # they quit the pager before the last page
+            pass
+        finally:
+            with contextlib.suppress(BrokenPipeError):
+                proc.stdin.close()
+            proc.wait()
+        return self.EXIT_SUCCESS
+
+    def _preview_many(self, args):
+        """display a grid of swatch panels for many themes
+
+        the themes are loaded in a pool of processes, and each row of panels
+        is printed as soon as the themes in it are loaded, instead of
+        waiting for all of them
+        """
+        # pylint: disable=import-outside-toplevel
+        # only previews need these, so generate doesn't pay to import them
+        import concurrent.futures
+
+        from . import swatches
+
+        if args.all:
+            theme_files = sorted(self.theme_dir.glob("*.toml"))
+            if not theme_files:
+                raise ThemeError(f"{self.prog}: no themes in $THEME_DIR")
+        else:
+            theme_files = []
+            for name in args.theme.split(","):
+                themeargs = argparse.Namespace(file=None, theme=name)
+                theme_files.append(self.theme_file_from_args(themeargs))
+        if args.width:
+            self.console.width = args.width
+        columns = max(self.console.width // swatches.PANEL_WIDTH, 1)
+
+        load = functools.partial(
+            swatches.load, functools.partial(type(self), self.prog)
+        )
+        workers = min(len(theme_files), os.cpu_count() or 1)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            row = []
+            # map() gives us the themes in order, each one as soon as it and
+            # the ones before it are loaded
+            for data in executor.map(load, theme_files, chunksize=4):
+                row.append(swatches.panel(data))
+                if len(row) == columns:
+                    self._print_swatch_row(row)
+                    row = []
+            if row:
+                self._print_swatch_row(row)
+        return self.EXIT_SUCCESS
 
-        mystyles = self.styles.copy()
+    def _print_swatch_row(self, panels):
+        """print a row of swatch panels side by side"""
+        grid = rich.table.Table.grid()
+        for _ in panels:
+            grid.add_column()
+        grid.add_row(*panels)
+        self.console.print(grid)
+
+    def render_preview(self, width):
+        """render the preview of the currently loaded theme as ansi text"""
+        buffer = io.StringIO()
+        console = rich.console.Console(
+            file=buffer,
+            width=width,
+            force_terminal=True,
+            color_system="truecolor",
+            no_color=False,
+            soft_wrap=True,
+            markup=False,
+            emoji=False,
+            highlight=False,
+        )
+        console.print(self.preview_renderable())
+        return buffer.getvalue()
+
+    PREVIEW_CACHE = "previews"
+
+    def preview_cache_file(self, theme_file, width):
+        """the file in the cache for the preview of theme_file at width
+
+        the name comes from the contents of the theme file, so when the
+        theme changes we don't use the old preview
+        """
+        from . import picker  # pylint: disable=import-outside-toplevel
+
+        key = picker.content_key(theme_file)
+        return self.cache_dir / self.PREVIEW_CACHE / f"{key}.{width}.ansi"
+
+    def preview_renderable(self, styles=None, scopes=None, subtitle=None):
+        """a rich renderable showing the styles and scopes in the currently
+        loaded theme
+
+        styles and scopes are lists of the names of the styles and scopes to
+        include, by default all of them are. Only the rows which are included
+        get laid out, so showing a few rows of a huge theme is quick.
+        """
+        if styles is None or scopes is None:
+            all_styles, all_scopes = self.preview_names()
+            styles = all_styles if styles is None else styles
+            scopes = all_scopes if scopes is None else scopes
         try:
-            text_style = mystyles["text"]
+            text_style = self.styles["text"]
         except KeyError:
             # if they didn't specify a text style, tell Rich to just use
             # whatever the default is for the terminal
             text_style = "default"
-        try:
-            del mystyles["background"]
-        except KeyError:
-            pass
 
         outer_table = rich.table.Table(
             box=rich.box.SIMPLE_HEAD, expand=True, show_header=False
@@ -663,24 +1133,20 @@ class Themer:
             box=rich.box.SIMPLE_HEAD, expand=True, show_edge=False, pad_edge=False
         )
         styles_table.add_column("Styles")
-        for name, style in mystyles.items():
-            styles_table.add_row(name, style=style)
+        for name in styles:
+            styles_table.add_row(name, style=self.styles[name])
 
         scopes_table = rich.table.Table(
             box=rich.box.SIMPLE_HEAD, show_edge=False, pad_edge=False
         )
         scopes_table.add_column("Scope", ratio=0.4)
         scopes_table.add_column("Generator", ratio=0.6)
-        try:
-            for name, scopedef in self.definition["scope"].items():
-                try:
-                    generator = scopedef["generator"]
-                except KeyError:
-                    generator = ""
-                scopes_table.add_row(name, generator)
-        except KeyError:  # pragma: nocover
-            # no scopes defined in the theme
-            pass
+        for name in scopes:
+            try:
+                generator = self.scopedef_for(name)["generator"]
+            except KeyError:
+                generator = ""
+            scopes_table.add_row(name, generator)
 
         lower_table = rich.table.Table(box=None, expand=True, show_header=False)
         lower_table.add_column(ratio=0.45)
@@ -692,17 +1158,280 @@ class Themer:
 
         # the text style here makes the whole panel print with the foreground
         # and background colors from the style
-        self.console.print(rich.panel.Panel(outer_table, style=text_style))
-        return self.EXIT_SUCCESS
+        return rich.panel.Panel(outer_table, style=text_style, subtitle=subtitle)
+
+    def preview_names(self, pattern=None):
+        """the names of the styles and scopes which preview shows
+
+        if pattern has shell wildcards in it, only names which match it are
+        included, otherwise only names which contain it
+
+        :returns: a tuple of (style names, scope names)
+        """
+        styles = [name for name in self.styles if name != "background"]
+        try:
+            scopes = list(self.definition["scope"].keys())
+        except KeyError:
+            scopes = []
+        if pattern:
+            if any(char in pattern for char in "*?["):
+
+                def _match(name):
+                    return fnmatch.fnmatchcase(name, pattern)
+
+            else:
+
+                def _match(name):
+                    return pattern in name
+
+            styles = [name for name in styles if _match(name)]
+            scopes = [name for name in scopes if _match(name)]
+        return styles, scopes
+
+    def preview_pages(self, page_size, pattern=None):
+        """split the preview into pages
+
+        :returns: a generator of renderables, one for each page, which only
+            lay out their own rows when they are rendered
+        """
+        styles, scopes = self.preview_names(pattern)
+        rows = max(len(styles), len(scopes))
+        pages = max((rows + page_size - 1) // page_size, 1)
+        for page in range(pages):
+            start = page * page_size
+            yield self.preview_renderable(
+                styles[start : start + page_size],
+                scopes[start : start + page_size],
+                subtitle=f"page {page + 1} of {pages}",
+            )
+
+    def preview_page_size(self, height):
+        """how many rows of styles and scopes fit in a preview height lines
+        tall"""
+        # find out how many lines everything but the rows takes
+        overhead = len(
+            self.console.render_lines(
+                self.preview_renderable([], [], subtitle="page"), pad=False
+            )
+        )
+        return max(height - overhead, 1)
+
+    def dispatch_pick(self, _):
+        """choose a theme with fzf, and switch to it
+
+        the preview window shows the preview of each theme, rendered ahead
+        of time by a pool of background processes into the preview cache,
+        so moving between themes only has to cat a file
+        """
+        from . import picker  # pylint: disable=import-outside-toplevel
+
+        fzf = shutil.which("fzf")
+        if not fzf:
+            raise ThemeError(f"{self.prog}: fzf: command not found")
+        themes = sorted(self.theme_dir.glob("*.toml"))
+        if not themes:
+            raise ThemeError(f"{self.prog}: no themes in $THEME_DIR")
+
+        # fzf gives the preview window half the terminal, and without a
+        # border that's exactly the width it tells the preview command
+        width = max(shutil.get_terminal_size().columns // 2, 20)
+        preview_dir = self.cache_dir / self.PREVIEW_CACHE
+        lines, keys, jobs = picker.choices(themes, preview_dir, width)
+        picker.prune(preview_dir, keys)
+        fzf_cmd = picker.fzf_command(fzf, preview_dir, width)
+        factory = functools.partial(type(self), self.prog)
+        executor, futures = picker.start(factory, jobs) if jobs else (None, None)
+        try:
+            proc = subprocess.run(
+                fzf_cmd,
+                input=lines,
+                stdout=subprocess.PIPE,
+                text=True,
+                check=False,
+            )
+        finally:
+            if executor:
+                picker.stop(executor, futures)
+        if proc.returncode != 0 or not proc.stdout:
+            # they didn't pick anything
+            return self.EXIT_SUCCESS
+        name = proc.stdout.split("\t", 1)[0]
+        switchargs = argparse.Namespace(name=name, theme=None, file=None)
+        return self.dispatch_switch(switchargs)
+
+    # how many seconds to wait for another process which is generating the
+    # same output before giving up and generating it ourselves
+    LOCK_TIMEOUT = 5.0
 
     def dispatch_generate(self, args):
         """render the output for given scope(s), or all scopes if none specified
 
         output is suitable for bash eval $()
         """
-        # pylint: disable=too-many-branches
-        self.load_from_args(args)
+        if args.stdin_batch:
+            return self._generate_batch(args)
+        if not args.output and not args.split_dir:
+            print(self._generate_output(args), end="")
+            return self.EXIT_SUCCESS
+
+        # when you open a bunch of terminals at once, they all try and
+        # generate the same output at the same time. Only one of them gets
+        # the lock and does the work, and the rest wait for it, and then with
+        # --if-stale see that the output is fresh and use it.
+        if args.output:
+            lockdir = pathlib.Path(args.output).parent
+            lockfile = lockdir / f".{pathlib.Path(args.output).name}.lock"
+        else:
+            lockdir = pathlib.Path(args.split_dir)
+            lockfile = lockdir / ".lock"
+        lockdir.mkdir(parents=True, exist_ok=True)
+        # if we time out waiting for the lock we go ahead without it, which
+        # is safe because all the files are written atomically
+        with contextlib.ExitStack() as stack:
+            with self.profiler.phase("lock"):
+                stack.enter_context(lock.exclusive(lockfile, self.LOCK_TIMEOUT))
+            if args.if_stale:
+                fresh = self._output_is_fresh(args)
+                self.profiler.note("fresh", fresh)
+                if fresh:
+                    return self.EXIT_SUCCESS
+            output = self._generate_output(args)
+            if args.output:
+                with self.profiler.phase("write output"):
+                    # other shells could be reading this file right now
+                    if not write_atomic(args.output, output) and args.if_stale:
+                        # the contents are the same, but we need the file to
+                        # be newer than the theme file so we know it isn't
+                        # stale
+                        os.utime(args.output)
+        return self.EXIT_SUCCESS
+
+    def _generate_output(self, args):
+        """generate the output for args, either in this process or via the
+        daemon, writing the split directory if requested
+
+        :returns: the rendered output
+        """
+        output = None
+        if args.via_daemon and not args.split_dir:
+            with self.profiler.phase("daemon"):
+                output = self._generate_via_daemon(args)
+            self.profiler.note("daemon", output is not None)
+        if output is None:
+            self.load_from_args(args)
+            results = self.generate_scopes(args)
+            with self.profiler.phase("render"):
+                if args.split_dir:
+                    self._write_split_dir(args.split_dir, results)
+                output = self.render_results(results, args)
+        return output
+
+    def _generate_batch(self, args):
+        """generate the output for every theme document on stdin
+
+        each document gets a line of json on stdout with it's position in
+        the stream in 'index', it's 'id', and either the 'output' or an
+        'error'. Every thread in the pool reuses one Themer for all the
+        documents it generates.
+
+        :returns: EXIT_ERROR if any of the documents had an error
+        """
+        # batch imports concurrent.futures, which plain generate doesn't need
+        from . import batch  # pylint: disable=import-outside-toplevel
+
+        if args.output or args.split_dir or args.if_stale or args.via_daemon:
+            raise ThemeError(
+                f"{self.prog}: --stdin-batch can't be combined with --output,"
+                " --split-dir, --if-stale, or --via-daemon"
+            )
+        jobs = args.jobs
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        if jobs < 1:
+            raise ThemeError(f"{self.prog}: --jobs must be at least 1")
+        local = threading.local()
+
+        def _render(index, doc_id, toml):
+            # pylint: disable=protected-access
+            record = {"index": index, "id": doc_id}
+            try:
+                if not hasattr(local, "thm"):
+                    local.thm = type(self)(self.prog)
+                    # so --profile and $SHELL_THEMER_TRACE see every thread
+                    local.thm.profiler = self.profiler
+                thm = local.thm
+                with self.profiler.phase("document", index):
+                    thm.loads(toml)
+                    results = thm.generate_scopes(args)
+                if args.format == "json":
+                    record["output"] = thm._json_document(results)
+                else:
+                    # there's nowhere to put fragments for lazy scopes, so
+                    # they are included like any other scope
+                    record["output"] = thm._join_results(results, args.comment)
+            except Exception as err:  # pylint: disable=broad-except
+                # one bad document shouldn't stop the rest of them
+                record["error"] = str(err)
+            return record
+
+        exit_code = self.EXIT_SUCCESS
+        documents = batch.read_documents(sys.stdin.buffer)
+        try:
+            for record in batch.run(documents, _render, jobs):
+                if "error" in record:
+                    exit_code = self.EXIT_ERROR
+                sys.stdout.write(json.dumps(record) + "\n")
+                sys.stdout.flush()
+        except ValueError as err:
+            raise ThemeError(f"{self.prog}: stdin: {err}") from err
+        return exit_code
+
+    def _output_is_fresh(self, args):
+        """check if the output file is newer than the theme file"""
+        if not args.output:
+            return False
+        try:
+            output_mtime = os.stat(args.output).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        theme_mtime = os.stat(self.theme_file_from_args(args)).st_mtime_ns
+        return output_mtime >= theme_mtime
 
+    def generate(self, args):
+        """generate the shell code for the currently loaded theme
+
+        uses the scope, comment, and defer_conditions attributes of args
+
+        :returns: the generated shell code as a string
+        """
+        results = self.generate_scopes(args)
+        lazy_dir = self.write_lazy_fragments(results, args)
+        return self._join_results(results, args.comment, lazy_dir)
+
+    def generate_scopes(self, args, env=None, cwd=None):
+        """generate the shell code for each scope in the currently loaded theme
+
+        uses the scope and defer_conditions attributes of args
+
+        env is the environment to run enabled_if commands in, and cwd the
+        directory, if they are None those of this process are used
+
+        :returns: a list of dicts, one for each scope, in the order they were
+            generated. Each dict has these keys:
+
+            scope - the name of the scope
+            generator - the name of the generator for the scope
+            enabled - whether the scope is enabled
+            enabled_if - the enabled_if command, if it was deferred to the
+                shell, otherwise None
+            trigger - the command which activates the scope, if the scope
+                has 'activation = "lazy"', otherwise None
+            actions - the GeneratorOutput from the generator, which is
+                empty if the scope isn't enabled
+            output - the generated shell code, which is empty if the scope
+                isn't enabled
+        """
+        results = []
         if args.scope:
             to_generate = args.scope.split(",")
         else:
@@ -714,47 +1443,679 @@ class Themer:
                 pass
 
         for scope in to_generate:
-            # checking here in case they supplied a scope on the command line that
-            # doesn't exist
-            if self.has_scope(scope):
+            with self.profiler.phase("scope", scope):
+                # checking here in case they supplied a scope on the command line that
+                # doesn't exist
+                if not self.has_scope(scope):
+                    raise ThemeError(f"{self.prog}: {scope}: no such scope")
                 scopedef = self.scopedef_for(scope)
                 # find the generator for this scope
                 try:
                     generator = scopedef["generator"]
                 except KeyError as exc:
-                    errmsg = f"{self.prog}: scope '{scope}' does not have a generator defined"
+                    errmsg = (
+                        f"{self.prog}: scope '{scope}' does not have a"
+                        " generator defined"
+                    )
                     raise ThemeError(errmsg) from exc
+                result = {
+                    "scope": scope,
+                    "generator": str(generator),
+                    "enabled": False,
+                    "enabled_if": None,
+                    "trigger": self._trigger_for(scope, scopedef),
+                    "actions": GeneratorOutput(),
+                    "output": "",
+                }
+                results.append(result)
+                # when deferring conditions, enabled_if gets checked by the
+                # shell when it runs the generated code. 'enabled' is
+                # authoritative, so if it's present is_enabled() decides
+                # without running anything
+                condition = None
+                if args.defer_conditions and "enabled" not in scopedef:
+                    condition = self.enabled_if_for(scope)
                 # check if the scope is disabled
-                if not self.is_enabled(scope):
-                    if args.comment:
-                        print(f"# [scope.{scope}] skipped because it is not enabled")
+                if not condition and not self.is_enabled(scope, env, cwd):
                     continue
-                # scope is enabled, so print the comment
-                if args.comment:
-                    print(f"# [scope.{scope}]")
-
-                if generator == "environment_variables":
-                    self._generate_environment(scope, scopedef)
-                elif generator == "fzf":
-                    self._generate_fzf(scope, scopedef)
-                elif generator == "ls_colors":
-                    self._generate_ls_colors(scope, scopedef)
-                elif generator == "exa_colors":
-                    self._generate_exa_colors(scope, scopedef)
-                elif generator == "iterm":
-                    self._generate_iterm(scope, scopedef)
-                elif generator == "shell":
-                    self._generate_shell(scope, scopedef)
+                result["enabled"] = True
+
+                with self.profiler.phase("generator", generator):
+                    result["actions"] = self._generate_scope(scope, scopedef, generator)
+                output = result["actions"].shell()
+                if condition and output:
+                    # the newline lets the condition end with a comment, and
+                    # the braces let us silence the output of the entire
+                    # condition, just like is_enabled() does
+                    result["enabled_if"] = condition
+                    output = (
+                        f"if {{ {condition}\n}} >/dev/null 2>&1; then\n{output}fi\n"
+                    )
+                result["output"] = output
+        return results
+
+    def render_results(self, results, args):
+        """render the results from generate_scopes() in the format and with
+        the comments requested in args, writing the fragments for lazy
+        scopes if the format needs them"""
+        if args.format == "json":
+            return self._json_results(results)
+        lazy_dir = self.write_lazy_fragments(results, args)
+        return self._join_results(results, args.comment, lazy_dir)
+
+    LAZY_TRIGGER_RE = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9_.+-]*$")
+
+    def _trigger_for(self, scope, scopedef):
+        """the command which activates a lazy scope, or None if the scope
+        is activated when the shell starts
+
+        :raises: ThemeError if activation or trigger are invalid
+        """
+        try:
+            activation = scopedef["activation"]
+        except KeyError:
+            activation = "eager"
+        if activation == "eager":
+            return None
+        if activation != "lazy":
+            raise ThemeError(
+                f"{self.prog}: scope '{scope}' has unknown activation '{activation}'"
+            )
+        try:
+            trigger = str(scopedef["trigger"])
+        except KeyError:
+            trigger = scope
+        # the trigger becomes the name of a shell function
+        if not self.LAZY_TRIGGER_RE.match(trigger):
+            raise ThemeError(
+                f"{self.prog}: scope '{scope}' has an invalid trigger '{trigger}'"
+            )
+        return trigger
+
+    def _lazy_dir(self, args):
+        """the directory the fragments for lazy scopes are written to
+
+        that's the split directory if there is one, otherwise a directory
+        in the cache named after the absolute path of the theme file, or
+        for a theme loaded from a string, after a digest of the theme
+        """
+        split_dir = getattr(args, "split_dir", None)
+        if split_dir:
+            return pathlib.Path(os.path.abspath(split_dir))
+        if self.theme_file:
+            key = os.path.abspath(self.theme_file).replace("/", "%")
+        else:
+            toml = tomlkit.dumps(self.definition).encode("utf-8")
+            key = "string-" + hashlib.sha256(toml).hexdigest()[:16]
+        return self.cache_dir / "lazy" / key
+
+    def write_lazy_fragments(self, results, args):
+        """write the shell code for each enabled lazy scope to it's own file,
+        where the wrapper function for the trigger can source it
+
+        files whose contents haven't changed are left alone
+
+        :returns: the directory the fragments are in, or None if they
+            couldn't be written, in which case the lazy scopes have to be
+            included in the output like any other scope
+        """
+        lazy_dir = self._lazy_dir(args)
+        if getattr(args, "split_dir", None):
+            # _write_split_dir() already put them there
+            return lazy_dir
+        try:
+            for result in results:
+                if result["trigger"] and result["output"]:
+                    fname = self._split_file_name(result["scope"])
+                    write_atomic(lazy_dir / fname, result["output"])
+        except OSError:
+            # the cache is a nicety, it's not worth failing over
+            return None
+        return lazy_dir
+
+    def _generate_via_daemon(self, args):
+        """ask the daemon started by 'shell-themer serve' to generate the output
+
+        :returns: the output, or None if the daemon isn't running
+        :raises: ThemeError if the daemon had an error generating the output
+        """
+        # daemon imports socketserver, which only the daemon and its clients need
+        from . import daemon  # pylint: disable=import-outside-toplevel
+
+        theme_file = os.path.abspath(self.theme_file_from_args(args))
+        response = daemon.generate(daemon.socket_path(), theme_file, args)
+        if response is None:
+            return None
+        if response.get("error"):
+            raise ThemeError(response["error"])
+        return response["output"]
+
+    def dispatch_serve(self, args):
+        """run a daemon which keeps themes loaded in memory, and generates
+        output for 'shell-themer generate --via-daemon'"""
+        from . import daemon  # pylint: disable=import-outside-toplevel
+
+        path = pathlib.Path(args.socket) if args.socket else daemon.socket_path()
+        if daemon.is_running(path):
+            raise ThemeError(f"{self.prog}: {path}: daemon is already running")
+        factory = functools.partial(type(self), self.prog)
+        try:
+            server = daemon.ThemerServer(path, factory, max_themes=args.max_themes)
+        except PermissionError as err:
+            raise ThemeError(f"{self.prog}: {err.filename}: {err.strerror}") from err
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return self.EXIT_SUCCESS
+
+    def _join_results(self, results, comment, lazy_dir=None):
+        """combine the results from generate_scopes() into a single string of
+        shell code, optionally with comments
+
+        lazy scopes are replaced by a wrapper function for their trigger,
+        which sources the fragments in lazy_dir the first time it runs. If
+        lazy_dir is None, lazy scopes are included like any other scope.
+        """
+        # all the lazy scopes with the same trigger share one wrapper
+        fragments = {}
+        if lazy_dir:
+            for result in results:
+                if result["trigger"] and result["output"]:
+                    fname = self._split_file_name(result["scope"])
+                    fragments.setdefault(result["trigger"], []).append(
+                        pathlib.Path(lazy_dir) / fname
+                    )
+
+        output = []
+        for result in results:
+            trigger = result["trigger"] if lazy_dir else None
+            if comment:
+                if not result["enabled"]:
+                    output.append(
+                        f"# [scope.{result['scope']}] skipped because it is not enabled\n"
+                    )
+                elif trigger:
+                    output.append(
+                        f"# [scope.{result['scope']}] activated by running {trigger}\n"
+                    )
                 else:
-                    raise ThemeError(f"{self.prog}: {generator}: unknown generator")
-            else:
-                raise ThemeError(f"{self.prog}: {scope}: no such scope")
+                    output.append(f"# [scope.{result['scope']}]\n")
+            if not trigger:
+                output.append(result["output"])
+            elif trigger in fragments:
+                output.append(self._lazy_wrapper(trigger, fragments.pop(trigger)))
+        return "".join(output)
+
+    @staticmethod
+    def _lazy_wrapper(trigger, fragments):
+        """a shell function which replaces itself with the real command
+        after sourcing fragments"""
+        lines = [f"{trigger}() {{\n", f"    unset -f {trigger}\n"]
+        for fragment in fragments:
+            lines.append(f"    builtin source {shlex.quote(str(fragment))}\n")
+        lines.append(f'    command {trigger} "$@"\n')
+        lines.append("}\n")
+        return "".join(lines)
+
+    def _json_results(self, results):
+        """render the results from generate_scopes() as a json document"""
+        return json.dumps(self._json_document(results), indent=2) + "\n"
+
+    def _json_document(self, results):
+        """the results from generate_scopes() as a dict ready for json"""
+        scopes = []
+        for result in results:
+            entry = {
+                "scope": result["scope"],
+                "generator": result["generator"],
+                "enabled": result["enabled"],
+                "enabled_if": result["enabled_if"],
+                "trigger": result["trigger"],
+            }
+            entry.update(result["actions"].as_dict())
+            scopes.append(entry)
+        theme_file = str(self.theme_file) if self.theme_file else None
+        return {"theme_file": theme_file, "scopes": scopes}
+
+    SPLIT_MANIFEST = "manifest.json"
+
+    def _write_split_dir(self, split_dir, results):
+        """write each enabled scope to it's own file in split_dir, and a
+        manifest describing all the scopes
+
+        files whose contents haven't changed are left alone, so their
+        modification times stay the same
+        """
+        split_dir = pathlib.Path(split_dir)
+        manifest_path = split_dir / self.SPLIT_MANIFEST
+        # find the files we wrote last time, so we can remove the ones
+        # for scopes that are gone or disabled
+        stale = set()
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as file:
+                for entry in json.load(file)["scopes"]:
+                    if entry["file"]:
+                        stale.add(entry["file"])
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            pass
+
+        entries = []
+        for result in results:
+            entry = {
+                "scope": result["scope"],
+                "generator": result["generator"],
+                "enabled": result["enabled"],
+                "enabled_if": result["enabled_if"],
+                "trigger": result["trigger"],
+                "file": None,
+            }
+            if result["enabled"]:
+                entry["file"] = self._split_file_name(result["scope"])
+                write_atomic(split_dir / entry["file"], result["output"])
+                stale.discard(entry["file"])
+            entries.append(entry)
+
+        for fname in stale:
+            # only remove plain file names, never something that escapes
+            # the directory
+            if fname == pathlib.Path(fname).name:
+                try:
+                    (split_dir / fname).unlink()
+                except FileNotFoundError:
+                    pass
+
+        theme_file = str(self.theme_file) if self.theme_file else None
+        manifest = {"theme_file": theme_file, "scopes": entries}
+        write_atomic(manifest_path, json.dumps(manifest, indent=2) + "\n")
+
+    @staticmethod
+    def _split_file_name(scope):
+        """the name of the file in the split directory for a scope"""
+        # scope names could have slashes in them, which we can't put in a
+        # file name
+        return scope.replace("/", "%") + ".sh"
+
+    def _generate_scope(self, scope, scopedef, generator):
+        """run the generator for a scope
+
+        :returns: a GeneratorOutput object with everything the generator did
+        """
+        out = GeneratorOutput()
+        if generator == "environment_variables":
+            self._generate_environment(scope, scopedef, out)
+        elif generator == "fzf":
+            self._generate_fzf(scope, scopedef, out)
+        elif generator == "ls_colors":
+            self._generate_ls_colors(scope, scopedef, out)
+        elif generator == "exa_colors":
+            self._generate_exa_colors(scope, scopedef, out)
+        elif generator == "iterm":
+            self._generate_iterm(scope, scopedef, out)
+        elif generator == "shell":
+            self._generate_shell(scope, scopedef, out)
+        else:
+            raise ThemeError(f"{self.prog}: {generator}: unknown generator")
+        return out
+
+    def dispatch_watch(self, args):
+        """generate the output every time the theme file changes
+
+        the output goes where it would for 'generate', except that if
+        neither --output nor --split-dir are given, it goes to the file
+        the shell code from 'init' uses, so shells started while we are
+        running never have to generate it themselves
+        """
+        # pylint: disable=import-outside-toplevel
+        # watcher imports ctypes, which nothing else needs
+        from . import watcher
+
+        args.via_daemon = False
+        args.stdin_batch = False
+        # skips generating when the change didn't affect our theme, and
+        # makes sure the output is newer than the theme file even when the
+        # contents didn't change, so the shell code from init trusts it
+        args.if_stale = True
+        # the theme file as given, which is what the shell code from init
+        # uses to name the cached output
+        theme_file = self.theme_file_from_args(args)
+        if not args.output and not args.split_dir:
+            args.output = self.init_output_file(theme_file)
+
+        dirs = {pathlib.Path(os.path.abspath(theme_file)).parent}
+        theme_dir = None
+        with contextlib.suppress(ThemeError):
+            theme_dir = self.theme_dir.resolve()
+            dirs.add(theme_dir)
+
+        def _is_relevant(path):
+            if path == pathlib.Path(os.path.abspath(theme_file)):
+                return True
+            # themes in $THEME_DIR can change which file --theme refers to
+            return path.parent == theme_dir and path.suffix == ".toml"
+
+        def _generate(_=None):
+            try:
+                self.dispatch_generate(args)
+            except (ThemeError, tomlkit.exceptions.TOMLKitError, OSError) as err:
+                # keep watching, they are probably in the middle of editing
+                self.error_console.print(f"{self.prog}: {err}")
+
+        _generate()
+        watch = watcher.watcher_for(dirs, poll=args.poll)
+        try:
+            watcher.watch(watch, _is_relevant, _generate, debounce=args.debounce)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watch.close()
+        return self.EXIT_SUCCESS
+
+    def init_output_file(self, theme_file):
+        """the file the shell code from init caches the generated output in
+
+        this has to match the file name the shell code comes up with, which
+        makes relative paths absolute the same way, so theme files with the
+        same name in different directories don't share a file
+        """
+        theme_file = os.path.join(os.getcwd(), theme_file)
+        return self.cache_dir / (theme_file.replace("/", "%") + ".sh")
+
+    def dispatch_init(self, args):
+        """print shell code which activates a theme when the shell starts
+
+        the shell code keeps the generated output in a file in the cache
+        directory, and only runs shell-themer to regenerate that file when the
+        theme file is newer than it. Most of the time the cost of starting a
+        shell is one stat() and one source, without starting python at all.
+
+        if a theme has been chosen with 'shell-themer switch', that theme
+        is used instead. The shell code also installs a hook which runs before
+        every prompt, and activates the new theme whenever someone switches.
+
+        usage in .bashrc:
+
+            shell-themer init bash > ~/.shell-themer.bash
+            source ~/.shell-themer.bash
+
+        """
+        if args.file or args.theme:
+            # they told us which theme to use, so we bake that into the
+            # generated code
+            theme_file = os.path.abspath(self.theme_file_from_args(args))
+            self._refresh_scope_index(theme_file)
+            theme_file = shlex.quote(theme_file)
+        else:
+            # figure it out when the shell code runs
+            theme_file = '"$THEME_FILE"'
+        cache_dir = shlex.quote(str(self.cache_dir))
+        state = shlex.quote(str(self.cache_dir / self.SWITCH_STATE))
+        current = shlex.quote(str(self.cache_dir / self.SWITCH_OUTPUT))
+        # run ourselves with the same python that is running right now, so
+        # the generated code works even if we aren't on the $PATH
+        themer = f"{shlex.quote(sys.executable)} -m shell_themer"
+
+        lines = [
+            f"# shell-themer initialization for {args.shell}",
+            "_shell_themer_activate() {",
+            "    local generation switched",
+            # a theme chosen by 'shell-themer switch' wins
+            f"    if [[ -f {state} ]]; then",
+            f"        read -r generation switched <{state}",
+            f'        if [[ "$switched" -nt {current} ]]; then',
+            # the theme has been edited since it was switched to
+            f'            {themer} -f "$switched" switch || return 1',
+            f"            read -r generation switched <{state}",
+            "        fi",
+            "        _shell_themer_generation=$generation",
+            '        export THEME_FILE="$switched"',
+            f"        source {current}",
+            "        return",
+            "    fi",
+            f"    local theme_file={theme_file}",
+            '    if [[ -z "$theme_file" ]]; then',
+            # not self.prog, which is whatever we were run as, like
+            # __main__.py, and isn't quoted for the shell
+            "        echo 'shell-themer: no theme or theme file specified' >&2",
+            "        return 1",
+            "    fi",
+            '    [[ "$theme_file" == /* ]] || theme_file="$PWD/$theme_file"',
+            f"    local cache_dir={cache_dir}",
+            # turn the path of the theme file into a file name, without
+            # forking any external commands. This has to match
+            # init_output_file()
+            '    local output="$cache_dir/${theme_file//\\//%}.sh"',
+            '    if [[ ! -f "$output" || "$theme_file" -nt "$output" ]]; then',
+            # --output writes to a temporary file and then renames it into
+            # place, so other shells starting at the same time never source
+            # a partially written file. --if-stale makes sure only one of
+            # those shells does the work.
+            f'        {themer} -f "$theme_file" generate --output "$output"'
+            " --if-stale || return 1",
+            "    fi",
+            '    source "$output"',
+            "}",
+            # this runs before every prompt, so it only uses shell builtins:
+            # one open() and read() of the state file, and no forks
+            "_shell_themer_prompt() {",
+            "    local generation switched",
+            f"    [[ -f {state} ]] || return 0",
+            f"    read -r generation switched <{state}",
+            '    if [[ "$generation" != "$_shell_themer_generation" ]]; then',
+            "        _shell_themer_generation=$generation",
+            '        export THEME_FILE="$switched"',
+            f"        source {current}",
+            "    fi",
+            "}",
+        ]
+        if args.shell == "zsh":
+            lines.extend(
+                [
+                    "autoload -Uz add-zsh-hook",
+                    "add-zsh-hook precmd _shell_themer_prompt",
+                ]
+            )
+        else:
+            lines.extend(
+                [
+                    'if [[ "${PROMPT_COMMAND[*]}" != *_shell_themer_prompt* ]]; then',
+                    '    PROMPT_COMMAND="_shell_themer_prompt${PROMPT_COMMAND:+;$PROMPT_COMMAND}"',
+                    "fi",
+                ]
+            )
+        lines.append("_shell_themer_activate")
+        print("\n".join(lines))
+        return self.EXIT_SUCCESS
+
+    SWITCH_STATE = "state"
+    SWITCH_OUTPUT = "current.sh"
+
+    def switch_state(self):
+        """the generation number and theme file from the last switch
+
+        :returns: a tuple of (generation, theme_file), which is (0, None) if
+            no one has ever switched
+        """
+        try:
+            with open(self.cache_dir / self.SWITCH_STATE, encoding="utf-8") as file:
+                generation, theme_file = file.readline().rstrip("\n").split(" ", 1)
+            return int(generation), theme_file
+        except (FileNotFoundError, ValueError):
+            return 0, None
+
+    def dispatch_switch(self, args):
+        """switch every shell which ran the code from 'init' to a new theme
+
+        generates the theme into a file in the cache directory, and bumps the
+        generation number in the state file, which the prompt hook from init
+        watches
+        """
+        if args.name:
+            args.theme = args.name
+            args.file = None
+        theme_file = os.path.abspath(self.theme_file_from_args(args))
+        self.load(theme_file)
+        self.write_scope_index(theme_file, self.definition)
+        genargs = argparse.Namespace(
+            scope=None, comment=False, defer_conditions=False, format="shell"
+        )
+        results = self.generate_scopes(genargs)
+        # this also writes the fragments the wrappers for lazy scopes source
+        output = self.render_results(results, genargs)
+
+        cache_dir = self.cache_dir
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        with lock.exclusive(
+            cache_dir / f".{self.SWITCH_STATE}.lock", self.LOCK_TIMEOUT
+        ):
+            generation, _ = self.switch_state()
+            # the output has to be there before the shells find out about it
+            write_atomic(cache_dir / self.SWITCH_OUTPUT, output)
+            write_atomic(
+                cache_dir / self.SWITCH_STATE, f"{generation + 1} {theme_file}\n"
+            )
+        return self.EXIT_SUCCESS
+
+    SCOPE_INDEX = "scopes"
+
+    HISTORY_FILE = "history.jsonl"
+
+    def record_history(self, args, prof, seconds, exit_code):
+        """append a record of a generate run to the history in the cache
+        directory, for the 'stats' command
+
+        prof is the profiler which timed the run, and seconds is how long the
+        whole run took. The history is only for information, so if we can't
+        write it we don't complain.
+        """
+        try:
+            theme = os.path.abspath(self.theme_file_from_args(args))
+        except ThemeError:
+            theme = None
+        record = {
+            "time": round(time.time(), 3),
+            "exit": exit_code,
+            "theme": theme,
+            "seconds": round(seconds, 6),
+            "scopes": {
+                scope: round(elapsed, 6) for scope, elapsed in prof.phases("scope")
+            },
+            "subprocesses": len(prof.phases("enabled_if")),
+        }
+        # whether the output was fresh or came from the daemon
+        record.update(prof.notes)
+        try:
+            history.append(self.cache_dir / self.HISTORY_FILE, record)
+        except OSError:
+            pass
+
+    def dispatch_stats(self, _):
+        """show the latency of generate runs from the history"""
+        records = history.read(self.cache_dir / self.HISTORY_FILE)
+        themes, scopes = history.summarize(records)
+        if not themes:
+            raise ThemeError(
+                f"{self.prog}: no history, set $SHELL_THEMER_HISTORY=1 to keep"
+                " a history of generate runs"
+            )
+        table = rich.table.Table(box=rich.box.SIMPLE_HEAD)
+        table.add_column("theme")
+        table.add_column("scope")
+        table.add_column("runs", justify="right")
+        for pct in [50, 95, 99]:
+            table.add_column(f"p{pct} ms", justify="right")
+
+        def _row(theme, scope, values):
+            cells = [theme, scope, str(len(values))]
+            for pct in [50, 95, 99]:
+                cells.append(f"{history.percentile(values, pct) * 1000:.1f}")
+            table.add_row(*cells)
+
+        for theme in sorted(themes):
+            _row(theme, "", themes[theme])
+            for key in sorted(key for key in scopes if key[0] == theme):
+                _row("", key[1], scopes[key])
+        self.console.print(table)
+        return self.EXIT_SUCCESS
+
+    def scope_index_file(self, theme_file):
+        """the file listing the scopes in a theme, which the shell code from
+        'completion' reads
+
+        it's named after the theme file without the .toml, which is easy
+        for the shell to figure out from -t or -f
+        """
+        name = pathlib.Path(theme_file).name
+        if name.endswith(".toml"):
+            name = name[: -len(".toml")]
+        return self.cache_dir / self.SCOPE_INDEX / name
+
+    def write_scope_index(self, theme_file, definition):
+        """write the names of the scopes in definition to the scope index for
+        theme_file, leaving the file alone if they haven't changed"""
+        try:
+            scopes = definition["scope"].keys()
+        except KeyError:
+            scopes = []
+        # completion is a nicety, it's not worth failing over
+        with contextlib.suppress(OSError):
+            write_atomic(
+                self.scope_index_file(theme_file),
+                "".join(f"{scope}\n" for scope in scopes),
+            )
+
+    def _refresh_scope_index(self, theme_file):
+        """rewrite the scope index for theme_file if it's older than the
+        theme file"""
+        try:
+            index_mtime = os.stat(self.scope_index_file(theme_file)).st_mtime_ns
+        except FileNotFoundError:
+            index_mtime = None
+        try:
+            if (
+                index_mtime is not None
+                and index_mtime >= os.stat(theme_file).st_mtime_ns
+            ):
+                return
+            with open(theme_file, "rb") as file:
+                definition = tomlkit.load(file)
+        except (OSError, tomlkit.exceptions.TOMLKitError):
+            # broken themes don't get completed
+            return
+        self.write_scope_index(theme_file, definition)
+
+    def dispatch_completion(self, args):
+        """print shell code which completes shell-themer command lines
+
+        none of it runs python. Theme names come from a glob of $THEME_DIR,
+        and scope names from the scope index in the cache directory, which
+        'list', 'init', 'switch', and this command keep up to date.
+
+        usage in .bashrc:
+
+            source <(shell-themer completion bash)
+
+        """
+        # the shell code only reads the scope index, so make sure it's there
+        # for the themes we can find
+        with contextlib.suppress(ThemeError):
+            for theme in self.theme_dir.glob("*.toml"):
+                self._refresh_scope_index(theme)
+        spec = completion.parser_spec(self.argparser())
+        index_dir = shlex.quote(str(self.cache_dir / self.SCOPE_INDEX))
+        if args.shell == "zsh":
+            lines = completion.zsh(spec, index_dir)
+        else:
+            lines = completion.bash(spec, index_dir)
+        print("\n".join(lines))
         return self.EXIT_SUCCESS
 
     #
     # environment generator
     #
-    def _generate_environment(self, _, scopedef):
+    def _generate_environment(self, _, scopedef, out):
         """Render environment variables from a set of attributes and styles"""
         # render the variables to unset
         try:
@@ -765,7 +2126,7 @@ class Themer:
                 # each letter in the string
                 unsets = [unsets]
             for unset in unsets:
-                print(f"unset {unset}")
+                out.unset(unset)
         except KeyError:
             pass
         # render the variables to export
@@ -774,18 +2135,35 @@ class Themer:
             for var, value in exports.items():
                 value = self.variable_interpolate(value)
                 value = self.style_interpolate(value)
-                print(f'export {var}="{value}"')
+                out.export(var, value)
         except KeyError:
             pass
 
     #
     # fzf generator and helpers
     #
-    def _generate_fzf(self, scope, scopedef):
+    def _generate_fzf(self, scope, scopedef, out):
         """render attribs into a shell statement to set an environment variable"""
-        optstr = ""
+        optstr = self._fzf_options(scopedef)
+        colorstr = self._fzf_colors(scopedef)
 
-        # process all the command line options
+        # figure out which environment variable to put it in
+        try:
+            varname = scopedef["environment_variable"]
+            varname = self.variable_interpolate(varname)
+            out.export(varname, f"{optstr}{colorstr}")
+        except KeyError as exc:
+            raise ThemeError(
+                (
+                    f"{self.prog}: fzf generator requires 'environment_variable'"
+                    f" key to process scope '{scope}'"
+                )
+            ) from exc
+
+    def _fzf_options(self, scopedef):
+        """the command line options from the opt table of scopedef, as a
+        string with a leading space"""
+        optstr = ""
         try:
             opts = scopedef["opt"]
         except KeyError:
@@ -797,10 +2175,12 @@ class Themer:
                 optstr += f" {key}='{interp_value}'"
             elif isinstance(value, bool) and value:
                 optstr += f" {key}"
+        return optstr
 
-        # process all the styles
+    def _fzf_colors(self, scopedef):
+        """the --color option for the styles in scopedef, with a leading
+        space, or an empty string if there aren't any"""
         colors = []
-        # then add them back
         for name, style in self.styles_from(scopedef).items():
             colors.append(self._fzf_from_style(name, style))
         # turn off all the colors, and add our color strings
@@ -809,22 +2189,8 @@ class Themer:
         except KeyError:
             colorbase = ""
         if colorbase or colors:
-            colorstr = f" --color='{colorbase}{','.join(colors)}'"
-        else:
-            colorstr = ""
-
-        # figure out which environment variable to put it in
-        try:
-            varname = scopedef["environment_variable"]
-            varname = self.variable_interpolate(varname)
-            print(f'export {varname}="{optstr}{colorstr}"')
-        except KeyError as exc:
-            raise ThemeError(
-                (
-                    f"{self.prog}: fzf generator requires 'environment_variable'"
-                    f" key to process scope '{scope}'"
-                )
-            ) from exc
+            return f" --color='{colorbase}{','.join(colors)}'"
+        return ""
 
     def _fzf_from_style(self, name, style):
         """turn a rich.style into a valid fzf color"""
@@ -929,7 +2295,7 @@ class Themer:
         LS_COLORS_MAP[friendly] = actual
         LS_COLORS_MAP[actual] = actual
 
-    def _generate_ls_colors(self, scope, scopedef):
+    def _generate_ls_colors(self, scope, scopedef, out):
         "Render a LS_COLORS variable suitable for GNU ls"
         outlist = []
         havecodes = []
@@ -975,7 +2341,7 @@ class Themer:
         # when we are switching a theme, there may be contents in the
         # environment variable already, and we need to tromp over them
         # we chose to set the variable to empty instead of unsetting it
-        print(f'''export {varname}="{':'.join(outlist)}"''')
+        out.export(varname, ":".join(outlist))
 
     def _ls_colors_from_style(self, name, style, mapp, scope):
         """create an entry suitable for LS_COLORS from a style
@@ -1090,7 +2456,7 @@ class Themer:
         EXA_COLORS_MAP[friendly] = actual
         EXA_COLORS_MAP[actual] = actual
 
-    def _generate_exa_colors(self, scope, scopedef):
+    def _generate_exa_colors(self, scope, scopedef, out):
         "Render a EXA_COLORS variable suitable for exa"
         outlist = []
         # process the styles
@@ -1127,12 +2493,12 @@ class Themer:
         # when we are switching a theme, there may be contents in the
         # environment variable already, and we need to tromp over them
         # we chose to set the variable to empty instead of unsetting it
-        print(f'''export {varname}="{':'.join(outlist)}"''')
+        out.export(varname, ":".join(outlist))
 
     #
     # iterm generator and helpers
     #
-    def _generate_iterm(self, _, scopedef):
+    def _generate_iterm(self, _, scopedef, out):
         """send the special escape sequences to make the iterm2
         terminal emulator for macos change its foreground and backgroud
         color
@@ -1140,37 +2506,98 @@ class Themer:
         echo "\033]1337;SetColors=bg=331111\007"
         """
         styles = self.styles_from(scopedef)
-        self._iterm_render_style(styles, "foreground", "fg")
-        self._iterm_render_style(styles, "background", "bg")
+        self._iterm_render_style(styles, "foreground", "fg", out)
+        self._iterm_render_style(styles, "background", "bg", out)
 
-    def _iterm_render_style(self, styles, style_name, iterm_key):
-        """print an iterm escape sequence to change the color palette"""
+    def _iterm_render_style(self, styles, style_name, iterm_key, out):
+        """add an iterm escape sequence to change the color palette"""
         try:
             style = styles[style_name]
         except KeyError:
             return
         if style:
             clr = style.color.get_truecolor()
-            # gotta use raw strings here so the \033 and \007 don't get
-            # interpreted by python
-            out = r'builtin echo -e "\e]1337;'
-            out += f"SetColors={iterm_key}={clr.hex.replace('#','')}"
-            out += r'\a"'
-            print(out)
+            out.escape(f"\x1b]1337;SetColors={iterm_key}={clr.hex.replace('#','')}\x07")
 
     #
     # shell command generator
     #
-    def _generate_shell(self, _, scopedef):
+    def _generate_shell(self, _, scopedef, out):
         try:
             cmds = scopedef["command"]
             for _, cmd in cmds.items():
                 cmd = self.variable_interpolate(cmd)
                 cmd = self.style_interpolate(cmd)
-                print(cmd)
+                out.command(cmd)
         except KeyError:
             pass
 
 
+class GeneratorOutput:
+    """the changes a generator wants to make to the shell environment
+
+    generators record what they want to happen here instead of printing shell
+    code, so the same generator code path can produce shell code or data
+    """
+
+    def __init__(self):
+        # a list of (kind, args) tuples, in the order the generator added them
+        self.actions = []
+
+    def __bool__(self):
+        return bool(self.actions)
+
+    def unset(self, var):
+        """unset an environment variable"""
+        self.actions.append(("unset", (var,)))
+
+    def export(self, var, value):
+        """export an environment variable with the given value"""
+        self.actions.append(("export", (var, value)))
+
+    def command(self, cmd):
+        """run a shell command"""
+        self.actions.append(("command", (cmd,)))
+
+    def escape(self, sequence):
+        """send an escape sequence to the terminal"""
+        self.actions.append(("escape", (sequence,)))
+
+    def shell(self):
+        """render all the actions as shell code"""
+        lines = []
+        for kind, args in self.actions:
+            if kind == "unset":
+                lines.append(f"unset {args[0]}\n")
+            elif kind == "export":
+                lines.append(f'export {args[0]}="{args[1]}"\n')
+            elif kind == "command":
+                lines.append(f"{args[0]}\n")
+            elif kind == "escape":
+                # let echo turn these back into control characters so that
+                # the generated code is printable
+                seq = args[0].replace("\x1b", r"\e").replace("\x07", r"\a")
+                lines.append(f'builtin echo -e "{seq}"\n')
+        return "".join(lines)
+
+    def as_dict(self):
+        """render all the actions as a dictionary, suitable for json"""
+        data = {
+            "environment": {"export": {}, "unset": []},
+            "commands": [],
+            "escapes": [],
+        }
+        for kind, args in self.actions:
+            if kind == "unset":
+                data["environment"]["unset"].append(args[0])
+            elif kind == "export":
+                data["environment"]["export"][args[0]] = args[1]
+            elif kind == "command":
+                data["commands"].append(args[0])
+            elif kind == "escape":
+                data["escapes"].append(args[0])
+        return data
+
+
 class ThemeError(Exception):
     """Exception for theme processing errors"""
@@ -0,0 +1,203 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+"""watch directories for changes to files
+
+Uses inotify on linux, via ctypes so we don't need any extra packages, and
+falls back to checking the modification times of files everywhere else.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import pathlib
+import select
+import struct
+import time
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# editors save files in lots of different ways: writing in place, writing a
+# new file and renaming it over the old one, or deleting and recreating
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+
+# struct inotify_event { int wd; uint32_t mask, cookie, len; char name[]; }
+_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """watch directories using the linux inotify api"""
+
+    def __init__(self, dirs):
+        """raises OSError if inotify isn't available"""
+        libname = ctypes.util.find_library("c")
+        try:
+            libc = ctypes.CDLL(libname, use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+        except (OSError, AttributeError) as exc:
+            raise OSError("inotify is not available") from exc
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.dirs = {}
+        for tdir in dirs:
+            wd = self._add_watch(self.fd, os.fsencode(tdir), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                self.close()
+                raise OSError(errno, os.strerror(errno), str(tdir))
+            self.dirs[wd] = pathlib.Path(tdir)
+
+    def close(self):
+        """stop watching"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def wait(self, timeout=None):
+        """wait up to timeout seconds for files to change
+
+        :returns: a set of the paths which changed, which is empty if
+            nothing changed before the timeout
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        try:
+            buf = os.read(self.fd, 65536)
+        except BlockingIOError:  # pragma: nocover
+            return changed
+        offset = 0
+        while offset + _EVENT.size <= len(buf):
+            wd, _, _, length = _EVENT.unpack_from(buf, offset)
+            offset += _EVENT.size
+            name = buf[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if wd in self.dirs and name:
+                changed.add(self.dirs[wd] / os.fsdecode(name))
+        return changed
+
+
+class PollingWatcher:
+    """watch directories by checking the modification times of their files"""
+
+    def __init__(self, dirs, interval=1.0):
+        self.dirs = [pathlib.Path(tdir) for tdir in dirs]
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def close(self):
+        """stop watching"""
+
+    def _scan(self):
+        snapshot = {}
+        for tdir in self.dirs:
+            try:
+                with os.scandir(tdir) as entries:
+                    for entry in entries:
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        snapshot[tdir / entry.name] = (
+                            stat.st_mtime_ns,
+                            stat.st_size,
+                            stat.st_ino,
+                        )
+            except FileNotFoundError:
+                pass
+        return snapshot
+
+    def wait(self, timeout=None):
+        """wait up to timeout seconds for files to change
+
+        :returns: a set of the paths which changed, which is empty if
+            nothing changed before the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = {
+                path
+                for path in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+            if changed:
+                return changed
+            if deadline is None:
+                delay = self.interval
+            else:
+                delay = min(self.interval, deadline - time.monotonic())
+                if delay <= 0:
+                    return set()
+            time.sleep(delay)
+
+
+def watcher_for(dirs, poll=False):
+    """create the best available watcher for the given directories"""
+    if not poll:
+        try:
+            return InotifyWatcher(dirs)
+        except OSError:
+            pass
+    return PollingWatcher(dirs)
+
+
+def watch(watcher, is_relevant, callback, debounce=0.2, stop=None):
+    """call callback whenever relevant files change
+
+    is_relevant is called with each changed path, and returns True if we
+    should care about it.
+
+    Editors often touch a file several times when they save it, so we wait
+    until nothing has changed for debounce seconds and then call callback
+    only once for the whole burst of changes.
+
+    Runs until the stop event is set, or forever if stop is None.
+    """
+    while not (stop and stop.is_set()):
+        # wake up every so often to check if we've been asked to stop
+        changed = {path for path in watcher.wait(0.5) if is_relevant(path)}
+        if not changed:
+            continue
+        while True:
+            more = watcher.wait(debounce)
+            if not more:
+                break
+            changed |= {path for path in more if is_relevant(path)}
+        callback(changed)
@@ -63,7 +63,7 @@ namespace_clean.add_task(pytest_clean, "pytest")
 @invoke.task
 def pylint(context):
     "Check code quality using pylint"
-    context.run("pylint src tests", echo=True)
+    context.run("pylint src tests benchmarks", echo=True)
 
 
 namespace.add_task(pylint)
@@ -73,7 +73,7 @@ namespace_check.add_task(pylint)
 @invoke.task
 def black_check(context):
     """Check if code is properly formatted using black"""
-    context.run("black --check *.py tests src", echo=True)
+    context.run("black --check *.py tests src benchmarks", echo=True)
 
 
 namespace.add_task(black_check)
@@ -83,12 +83,112 @@ namespace_check.add_task(black_check)
 @invoke.task
 def black(context):
     """Format code using black"""
-    context.run("black *.py tests src", echo=True)
+    context.run("black *.py tests src benchmarks", echo=True)
 
 
 namespace.add_task(black)
 
 
+#####
+#
+# benchmarks
+#
+#####
+BENCHDIR = ".benchmarks"
+
+
+@invoke.task(
+    help={
+        "k": "only run benchmarks whose names match this glob",
+        "threshold": "how much slower than the baseline is a regression",
+        "save": "save the results as the new baseline",
+    }
+)
+def benchmark(context, k=None, threshold=0.1, save=False):
+    "Run the benchmarks and compare them to the saved baseline"
+    latest = os.path.join(BENCHDIR, "latest.json")
+    baseline = os.path.join(BENCHDIR, "baseline.json")
+    cmd = f"python -m benchmarks --output {latest} --baseline {baseline}"
+    cmd += f" --threshold {threshold}"
+    if k:
+        cmd += f" -k '{k}'"
+    # when saving a new baseline, it doesn't matter if we are slower than
+    # the old one
+    context.run(cmd, echo=True, pty=True, warn=save)
+    if save:
+        shutil.copyfile(latest, baseline)
+        print(f"Saved {latest} as {baseline}")
+
+
+namespace.add_task(benchmark)
+
+
+@invoke.task(
+    help={
+        "max_ms": "the most milliseconds importing can take, instead of the time"
+        " saved on this machine",
+        "save": "save the modules imported now as the budget, and the time it took"
+        " on this machine",
+    }
+)
+def importtime(context, max_ms=None, save=False):
+    "Check the time it takes to import shell_themer, and what it imports"
+    times = os.path.join(BENCHDIR, "import_time.json")
+    cmd = f"python -m benchmarks.importtime --times {times}"
+    if max_ms:
+        cmd += f" --max-ms {max_ms}"
+    if save:
+        cmd += " --save"
+    context.run(cmd, echo=True, pty=True)
+
+
+namespace.add_task(importtime)
+
+
+@invoke.task(
+    help={
+        "k": "only run benchmarks whose names match this glob",
+        "save": "save the results in the baseline, only replacing the ones which ran",
+    }
+)
+def memory(context, k=None, save=False):
+    "Measure memory used by loading and generating, and compare it to the baseline"
+    cmd = "python -m benchmarks.memory"
+    if k:
+        cmd += f" -k '{k}'"
+    if save:
+        cmd += " --save"
+    context.run(cmd, echo=True, pty=True)
+
+
+namespace.add_task(memory)
+
+
+@invoke.task(
+    help={
+        "shells": "how many shells to start at once",
+        "theme": "small, dracula, huge, or xN for a synthetic theme",
+    }
+)
+def loadtest(context, shells=32, theme="dracula"):
+    "Start lots of shells at once and report the latency of shell-themer in each"
+    cmd = f"python -m benchmarks.loadtest --shells {shells} --theme {theme}"
+    context.run(cmd, echo=True, pty=True)
+
+
+namespace.add_task(loadtest)
+
+
+@invoke.task
+def benchmark_clean(context):
+    "Remove benchmark results, including the baseline"
+    # pylint: disable=unused-argument
+    rmrf(BENCHDIR)
+
+
+namespace_clean.add_task(benchmark_clean, "benchmark")
+
+
 #####
 #
 # build and distribute
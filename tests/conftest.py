@@ -26,7 +26,8 @@
 
 import pytest
 
-from shell_themer import Themer
+from shell_themer import Themer, synthetic
+from shell_themer.cmdline import fast_parse
 
 
 @pytest.fixture
@@ -61,7 +62,12 @@ def thm_cmdline(thm, mocker):
         try:
             args = thm.argparser().parse_args(argv)
         except SystemExit as err:
+            # the fast parser has to leave errors to argparse
+            assert fast_parse(argv) is None
             return err.code
+        # and if it parses a command line, it must get the same answer
+        fast_args = fast_parse(argv)
+        assert fast_args is None or fast_args == args
         if toml:
             thm.loads(toml)
         # monkeypatch load_from_args() because that won't work so well
@@ -69,3 +75,23 @@ def thm_cmdline(thm, mocker):
         return thm.dispatch(args)
 
     return _executor
+
+
+@pytest.fixture
+def synthetic_theme():
+    # a function which returns the toml for a made up theme, with the
+    # same arguments as synthetic.theme(). Use scale=N for one N times
+    # bigger than the defaults, any other arguments override the scaled
+    # sizes. The seed is fixed, so every run of the tests gets the same
+    # theme
+    #
+    # def test_generate_big(thm, synthetic_theme):
+    #     thm.loads(synthetic_theme(scale=10))
+    #     ...
+
+    def _make(scale=1, **kwargs):
+        sizes = {key: value * scale for key, value in synthetic.DEFAULTS.items()}
+        sizes.update(kwargs)
+        return synthetic.theme(**sizes)
+
+    return _make
@@ -0,0 +1,74 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+import os
+
+import pytest
+
+from shell_themer.atomic import write_atomic
+
+
+def test_write_atomic(tmp_path):
+    path = tmp_path / "subdir" / "output.sh"
+    assert write_atomic(path, "export FOO=bar\n")
+    assert path.read_text() == "export FOO=bar\n"
+    # no temporary files left behind
+    assert os.listdir(path.parent) == ["output.sh"]
+
+
+def test_write_atomic_unchanged(tmp_path):
+    path = tmp_path / "output.sh"
+    path.write_text("export FOO=bar\n")
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    assert not write_atomic(path, "export FOO=bar\n")
+    assert path.stat().st_mtime_ns == 1_000_000_000
+
+
+def test_write_atomic_changed(tmp_path):
+    path = tmp_path / "output.sh"
+    path.write_text("export FOO=bar\n")
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    assert write_atomic(path, "export FOO=baz\n")
+    assert path.read_text() == "export FOO=baz\n"
+    assert path.stat().st_mtime_ns != 1_000_000_000
+
+
+def test_write_atomic_replaces_not_overwrites(tmp_path):
+    # anyone who already has the old file open keeps reading the old contents
+    path = tmp_path / "output.sh"
+    path.write_text("old contents\n")
+    with open(path, encoding="utf-8") as file:
+        write_atomic(path, "new contents\n")
+        assert file.read() == "old contents\n"
+    assert path.read_text() == "new contents\n"
+
+
+def test_write_atomic_error_cleans_up(tmp_path, mocker):
+    path = tmp_path / "output.sh"
+    mocker.patch("os.replace", side_effect=OSError("no way"))
+    with pytest.raises(OSError):
+        write_atomic(path, "contents\n")
+    assert not os.listdir(tmp_path)
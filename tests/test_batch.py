@@ -0,0 +1,182 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+
+import io
+import json
+import random
+import time
+
+import pytest
+
+from shell_themer import Themer, batch
+
+
+def _stdin(monkeypatch, data):
+    monkeypatch.setattr("sys.stdin", io.TextIOWrapper(io.BytesIO(data)))
+
+
+def _records(out):
+    return [json.loads(line) for line in out.splitlines()]
+
+
+def _theme(value):
+    return f"""
+[scope.env]
+generator = "environment_variables"
+environment.export.VALUE = "{value}"
+"""
+
+
+def _length_prefixed(toml):
+    data = toml.encode("utf-8")
+    return str(len(data)).encode("ascii") + b"\n" + data
+
+
+def test_batch_ndjson(thm, capsys, monkeypatch):
+    lines = [json.dumps({"id": f"theme{num}", "toml": _theme(num)}) for num in range(3)]
+    _stdin(monkeypatch, ("\n".join(lines) + "\n").encode("utf-8"))
+    exit_code = thm.dispatch(thm.argparser().parse_args(["generate", "--stdin-batch"]))
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert not err
+    assert _records(out) == [
+        {"index": num, "id": f"theme{num}", "output": f'export VALUE="{num}"\n'}
+        for num in range(3)
+    ]
+
+
+def test_batch_length_prefixed(thm, capsys, monkeypatch):
+    # length prefixed documents can have newlines, and can be mixed with json
+    data = (
+        _length_prefixed(_theme("one"))
+        + b"\n"
+        + json.dumps({"toml": _theme("two")}).encode("utf-8")
+        + b"\n"
+        + _length_prefixed(_theme("thrée"))
+    )
+    _stdin(monkeypatch, data)
+    exit_code = thm.dispatch(thm.argparser().parse_args(["generate", "--stdin-batch"]))
+    out, _ = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    records = _records(out)
+    assert [record["id"] for record in records] == [None, None, None]
+    assert [record["output"] for record in records] == [
+        'export VALUE="one"\n',
+        'export VALUE="two"\n',
+        'export VALUE="thrée"\n',
+    ]
+
+
+def test_batch_order_and_errors(thm, capsys, monkeypatch):
+    docs = []
+    for num in range(50):
+        toml = _theme(num) if num != 7 else "[scope.env]\ngenerator = 'bogus'\n"
+        docs.append(_length_prefixed(toml))
+    _stdin(monkeypatch, b"".join(docs))
+    args = thm.argparser().parse_args(["generate", "--stdin-batch", "--jobs", "4"])
+    exit_code = thm.dispatch(args)
+    out, _ = capsys.readouterr()
+    assert exit_code == Themer.EXIT_ERROR
+    records = _records(out)
+    assert [record["index"] for record in records] == list(range(50))
+    assert "unknown generator" in records[7]["error"]
+    assert records[8]["output"] == 'export VALUE="8"\n'
+
+
+@pytest.mark.parametrize("jobs", ["0", "-2"])
+def test_batch_jobs_at_least_one(thm, capsys, monkeypatch, jobs):
+    _stdin(monkeypatch, _length_prefixed(_theme("jobs")))
+    args = thm.argparser().parse_args(["generate", "--stdin-batch", "--jobs", jobs])
+    exit_code = thm.dispatch(args)
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_ERROR
+    assert "--jobs must be at least 1" in err
+
+
+def test_batch_json_format(thm, capsys, monkeypatch):
+    _stdin(monkeypatch, _length_prefixed(_theme("json")))
+    args = thm.argparser().parse_args(["generate", "--stdin-batch", "--format", "json"])
+    exit_code = thm.dispatch(args)
+    out, _ = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    (record,) = _records(out)
+    assert record["output"]["scopes"][0]["environment"]["export"] == {"VALUE": "json"}
+
+
+def test_batch_lazy_inline(thm, capsys, monkeypatch):
+    toml = _theme("lazy") + 'activation = "lazy"\n'
+    _stdin(monkeypatch, _length_prefixed(toml))
+    thm.dispatch(thm.argparser().parse_args(["generate", "--stdin-batch"]))
+    out, _ = capsys.readouterr()
+    (record,) = _records(out)
+    assert record["output"] == 'export VALUE="lazy"\n'
+
+
+def test_batch_malformed(thm, capsys, monkeypatch):
+    data = _length_prefixed(_theme("ok")) + b"\nnot a document\n"
+    _stdin(monkeypatch, data)
+    exit_code = thm.dispatch(thm.argparser().parse_args(["generate", "--stdin-batch"]))
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_ERROR
+    # the documents before the malformed one still get generated
+    assert len(_records(out)) == 1
+    assert "document 2" in err
+
+
+@pytest.mark.parametrize("option", ["--output out.sh", "--split-dir out", "--if-stale"])
+def test_batch_incompatible(thm, capsys, option):
+    args = thm.argparser().parse_args(["generate", "--stdin-batch", *option.split()])
+    exit_code = thm.dispatch(args)
+    _, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_ERROR
+    assert "--stdin-batch" in err
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        (b'{"id": 1}\n', "'toml' string"),
+        (b'{"toml": 5}\n', "'toml' string"),
+        (b"{nope\n", "'toml' string"),
+        (b"10\nshort", "expected 10 bytes but got 5"),
+        (b"2\n\xff\xfe", "not utf-8"),
+        (b"toml = 1\n", "expected a json object or a length"),
+    ],
+)
+def test_read_documents_malformed(data, message):
+    with pytest.raises(ValueError, match=message):
+        list(batch.read_documents(io.BytesIO(data)))
+
+
+def test_run_keeps_order():
+    def _render(index, doc_id, toml):
+        time.sleep(random.random() / 100)
+        return (index, doc_id, toml)
+
+    documents = [(num, str(num)) for num in range(40)]
+    results = list(batch.run(iter(documents), _render, 8))
+    assert results == [(num, num, str(num)) for num in range(40)]
@@ -0,0 +1,147 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+
+import argparse
+
+import pytest
+
+from shell_themer import Themer
+from shell_themer.cmdline import fast_parse
+
+# command lines the fast parser handles itself
+FAST = [
+    "list",
+    "-t dracula list",
+    "--theme dracula list",
+    "-f /tmp/theme.toml list",
+    "generate",
+    "generate -c",
+    "generate --comment",
+    "generate -s fzf",
+    "generate --scope fzf,ls_colors -c",
+    "generate -c -s fzf -c",
+    "-t dracula generate -s fzf",
+    "--file /tmp/theme.toml generate --scope bat",
+    "generate --defer-conditions",
+    "generate --format json",
+    "generate --format shell --comment",
+    "generate -o /tmp/out.sh",
+    "generate --split-dir /tmp/split --defer-conditions",
+    "generate --via-daemon -s fzf",
+    # what the shell code from 'init' runs
+    "-f /tmp/theme.toml generate --output /tmp/out.sh --if-stale",
+    # an option value which is a command name
+    "-t generate generate",
+    "--profile generate",
+    "--profile -t dracula generate -s fzf",
+    "-f /tmp/theme.toml --profile list",
+]
+
+# command lines which are valid but are left to argparse
+SLOW = [
+    "",
+    "help",
+    "-h",
+    "-v",
+    "--no-color list",
+    "--color args=red list",
+    "preview",
+    "init bash",
+    "switch dracula",
+    "generate --scope=fzf",
+    "generate -cs fzf",
+    "generate -s fzf -s bat",
+    "generate --stdin-batch",
+    "generate --stdin-batch --jobs 4",
+    "-t dracula --theme dracula list",
+    "-t dracula -t other generate",
+    "-t dracula",
+]
+
+# command lines argparse exits on, with an error or help
+INVALID = [
+    "generate -h",
+    "bogus",
+    "list extra",
+    "generate --bogus",
+    "generate -s",
+    "generate --format xml",
+    "-t",
+    "-t one -f two list",
+    "generate -t dracula",
+]
+
+
+@pytest.mark.parametrize("cmdline", FAST)
+def test_fast_parse(cmdline):
+    argv = cmdline.split()
+    args = fast_parse(argv)
+    assert args is not None
+    assert args == Themer.argparser().parse_args(argv)
+
+
+@pytest.mark.parametrize("cmdline", SLOW)
+def test_fast_parse_defers(cmdline):
+    argv = cmdline.split()
+    assert fast_parse(argv) is None
+    # and they are valid
+    assert isinstance(Themer.argparser().parse_args(argv), argparse.Namespace)
+
+
+@pytest.mark.parametrize("cmdline", INVALID)
+def test_fast_parse_invalid(cmdline):
+    argv = cmdline.split()
+    assert fast_parse(argv) is None
+    with pytest.raises(SystemExit):
+        Themer.argparser().parse_args(argv)
+
+
+def test_fast_parse_defaults():
+    # if an option is added to the generate parser, the fast parser has to
+    # know its default too
+    full = vars(Themer.argparser().parse_args(["generate"]))
+    assert vars(fast_parse(["generate"])) == full
+
+
+def test_main_fast_path(mocker):
+    argparser = mocker.spy(Themer, "argparser")
+    dispatch = mocker.patch("shell_themer.Themer.dispatch", autospec=True)
+    dispatch.return_value = Themer.EXIT_SUCCESS
+    assert Themer.main(["-t", "dracula", "generate", "-s", "fzf"]) == 0
+    assert argparser.call_count == 0
+    args = dispatch.call_args.args[1]
+    assert args.theme == "dracula"
+    assert args.scope == "fzf"
+
+
+def test_main_slow_path(mocker):
+    argparser = mocker.spy(Themer, "argparser")
+    dispatch = mocker.patch("shell_themer.Themer.dispatch", autospec=True)
+    dispatch.return_value = Themer.EXIT_SUCCESS
+    assert Themer.main(["init", "bash"]) == 0
+    assert argparser.call_count == 1
+    assert Themer.main(["generate", "--bogus"]) == Themer.EXIT_USAGE
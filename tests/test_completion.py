@@ -0,0 +1,196 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from shell_themer import Themer, completion
+
+THEME = """
+[scope.fzf]
+generator = "fzf"
+environment_variable = "FZF_DEFAULT_OPTS"
+
+[scope.ls_colors]
+generator = "ls_colors"
+
+[scope.bat]
+generator = "environment_variables"
+"""
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    theme_dir = tmp_path / "themes"
+    theme_dir.mkdir()
+    for name in ["dracula", "dark", "solarized"]:
+        (theme_dir / f"{name}.toml").write_text(THEME)
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("THEME_DIR", str(theme_dir))
+    monkeypatch.setenv("SHELL_THEMER_CACHE_DIR", str(cache_dir))
+    monkeypatch.delenv("THEME_FILE", raising=False)
+    return theme_dir, cache_dir
+
+
+def test_generate_leaves_scope_index(thm, dirs):
+    theme_dir, cache_dir = dirs
+    args = thm.argparser().parse_args(["-t", "dracula", "generate", "-s", "bat"])
+    assert thm.dispatch(args) == Themer.EXIT_SUCCESS
+    assert not (cache_dir / "scopes").exists()
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["-t", "dracula", "switch"],
+        ["-t", "dracula", "init", "bash"],
+        ["completion", "bash"],
+    ],
+)
+def test_scope_index_written(thm, dirs, argv, capsys):
+    theme_dir, cache_dir = dirs
+    assert thm.dispatch(thm.argparser().parse_args(argv)) == Themer.EXIT_SUCCESS
+    capsys.readouterr()
+    index = cache_dir / "scopes" / "dracula"
+    assert index.read_text() == "fzf\nls_colors\nbat\n"
+
+
+def test_list_refreshes_scope_index(thm, dirs):
+    theme_dir, cache_dir = dirs
+    assert thm.dispatch(thm.argparser().parse_args(["list"])) == Themer.EXIT_SUCCESS
+    index_dir = cache_dir / "scopes"
+    assert sorted(path.name for path in index_dir.glob("[!.]*")) == [
+        "dark",
+        "dracula",
+        "solarized",
+    ]
+    # a fresh index is left alone
+    index = index_dir / "dark"
+    os.utime(theme_dir / "dark.toml", ns=(1_000_000_000, 1_000_000_000))
+    index.write_text("stale\n")
+    thm.dispatch(thm.argparser().parse_args(["list"]))
+    assert index.read_text() == "stale\n"
+    # and a stale one is rewritten
+    (theme_dir / "dark.toml").write_text('[scope.only]\ngenerator = "fzf"\n')
+    os.utime(index, ns=(1_000_000_000, 1_000_000_000))
+    thm.dispatch(thm.argparser().parse_args(["list"]))
+    assert index.read_text() == "only\n"
+
+
+def test_list_ignores_broken_themes(thm, dirs, capsys):
+    theme_dir, cache_dir = dirs
+    (theme_dir / "broken.toml").write_text("[scope\n")
+    assert thm.dispatch(thm.argparser().parse_args(["list"])) == Themer.EXIT_SUCCESS
+    out, _ = capsys.readouterr()
+    assert "broken" in out.split()
+    assert not (cache_dir / "scopes" / "broken").exists()
+
+
+def test_completion_spec():
+    spec = completion.parser_spec(Themer.argparser())
+    assert "generate" in spec["commands"]
+    assert "completion" in spec["commands"]
+    options, choices = spec["commands"]["init"]
+    assert choices == ["bash", "zsh"]
+    assert spec["choices"]["--format"] == ["shell", "json"]
+    assert "--theme" in spec["values"]
+    assert "--comment" not in spec["values"]
+    assert "--output" in spec["files"]
+    assert "--scope" not in spec["files"]
+
+
+def test_completion_zsh(thm, dirs, capsys):
+    theme_dir, cache_dir = dirs
+    args = thm.argparser().parse_args(["completion", "zsh"])
+    assert thm.dispatch(args) == Themer.EXIT_SUCCESS
+    out, _ = capsys.readouterr()
+    assert "compdef _shell_themer shell-themer" in out
+    assert str(cache_dir / "scopes") in out
+    assert "--output|--split-dir" in out
+
+
+@pytest.fixture
+def complete(thm, dirs, capsys):  # pylint: disable=unused-argument
+    args = thm.argparser().parse_args(["completion", "bash"])
+    assert thm.dispatch(args) == Themer.EXIT_SUCCESS
+    code, _ = capsys.readouterr()
+
+    def _complete(cmdline, env=None):
+        words = cmdline.split(" ")
+        script = (
+            f"{code}\n"
+            f"COMP_WORDS=(shell-themer {' '.join(words)})\n"
+            f"COMP_CWORD={len(words)}\n"
+            "_shell_themer_complete\n"
+            'printf "%s\\n" "${COMPREPLY[@]}"\n'
+        )
+        proc = subprocess.run(
+            ["bash", "-c", script],
+            capture_output=True,
+            check=True,
+            env=dict(os.environ, **(env or {})),
+        )
+        assert not proc.stderr
+        return sorted(filter(None, proc.stdout.decode().split("\n")))
+
+    return _complete
+
+
+@pytest.mark.skipif(not shutil.which("bash"), reason="bash is not installed")
+def test_complete_bash(complete, dirs):
+    theme_dir, cache_dir = dirs
+    index_dir = cache_dir / "scopes"
+    index_dir.mkdir(parents=True, exist_ok=True)
+    (index_dir / "dracula").write_text("fzf\nls_colors\nbat\n")
+    (index_dir / "other").write_text("only\n")
+
+    assert complete("") == sorted(
+        completion.parser_spec(Themer.argparser())["commands"]
+    )
+    assert complete("gen") == ["generate"]
+    assert complete("--th") == ["--theme"]
+    assert complete("-t d") == ["dark", "dracula"]
+    assert complete("-t nope") == []
+    assert complete("switch so") == ["solarized"]
+    assert complete("init ") == ["bash", "zsh"]
+    assert complete("generate --for") == ["--format"]
+    assert complete("generate --format j") == ["json"]
+    assert complete("-t dracula generate -s ") == ["bat", "fzf", "ls_colors"]
+    assert complete("-t dracula.toml generate -c -s f") == ["fzf"]
+    assert complete("-t dracula generate -s fzf,l") == ["fzf,ls_colors"]
+    assert complete("-f /some/where/other.toml generate -s ") == ["only"]
+    assert complete("generate -s ", {"THEME_FILE": "/x/dracula.toml"}) == [
+        "bat",
+        "fzf",
+        "ls_colors",
+    ]
+    # no index, no scopes
+    (index_dir / "solarized").unlink()
+    assert complete("-t solarized generate -s ") == []
@@ -0,0 +1,404 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+import argparse
+import concurrent.futures
+import functools
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from shell_themer import Themer
+from shell_themer import __main__ as mainmodule
+from shell_themer import daemon
+
+THEME = """
+[variables]
+value = "{value}"
+
+[scope.env]
+generator = "environment_variables"
+environment.export.SOMEVAR = "{{var:value}}"
+
+[scope.gated]
+enabled_if = "test -n \\"$GATE\\""
+generator = "environment_variables"
+environment.export.GATED = "yes"
+"""
+
+
+def write_theme(path, value):
+    path.write_text(THEME.format(value=value))
+
+
+@pytest.fixture
+def server(tmp_path):
+    # keep the socket path short, unix domain sockets have a length limit
+    server = daemon.ThemerServer(
+        tmp_path / "d.sock", functools.partial(Themer, "shell-themer"), max_themes=2
+    )
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def generate_request(theme_file, **kwargs):
+    payload = {"theme_file": str(theme_file), "env": {"GATE": ""}}
+    payload.update(kwargs)
+    return payload
+
+
+def test_socket_path(mocker, tmp_path):
+    mocker.patch.dict(os.environ, {}, clear=True)
+    mocker.patch.dict(os.environ, {"XDG_RUNTIME_DIR": str(tmp_path)})
+    assert daemon.socket_path() == tmp_path / "shell-themer" / "daemon.sock"
+    mocker.patch.dict(os.environ, {"SHELL_THEMER_SOCKET": str(tmp_path / "s")})
+    assert daemon.socket_path() == tmp_path / "s"
+
+
+def test_is_private(tmp_path):
+    directory = tmp_path / "private"
+    directory.mkdir(mode=0o700)
+    assert daemon.is_private(directory)
+    directory.chmod(0o755)
+    assert not daemon.is_private(directory)
+    directory.chmod(0o730)
+    assert not daemon.is_private(directory)
+    assert not daemon.is_private(tmp_path / "nope")
+    (tmp_path / "file").write_text("")
+    assert not daemon.is_private(tmp_path / "file")
+    (tmp_path / "link").symlink_to(tmp_path / "private")
+    assert not daemon.is_private(tmp_path / "link")
+
+
+def test_not_private(server):
+    # someone else could have made the socket, so don't tell it anything
+    server.path.parent.chmod(0o777)
+    try:
+        assert not daemon.is_running(server.path)
+        assert daemon.request(server.path, {}) is None
+    finally:
+        server.path.parent.chmod(0o700)
+
+
+def test_server_not_private(tmp_path):
+    directory = tmp_path / "shared"
+    directory.mkdir(mode=0o777)
+    directory.chmod(0o777)
+    with pytest.raises(PermissionError):
+        daemon.ThemerServer(
+            directory / "d.sock", functools.partial(Themer, "shell-themer")
+        )
+
+
+def test_theme_path(mocker, tmp_path):
+    (tmp_path / "one.toml").write_text("")
+    (tmp_path / "two").write_text("")
+    mocker.patch.dict(os.environ, {"THEME_DIR": str(tmp_path)}, clear=True)
+
+    def _args(theme=None, file=None):
+        return argparse.Namespace(theme=theme, file=file)
+
+    assert daemon.theme_path(_args(file="t.toml")) == os.path.abspath("t.toml")
+    assert daemon.theme_path(_args(theme="one")) == str(tmp_path / "one.toml")
+    assert daemon.theme_path(_args(theme="two")) == str(tmp_path / "two")
+    assert daemon.theme_path(_args(theme="nope")) is None
+    assert daemon.theme_path(_args()) is None
+    mocker.patch.dict(os.environ, {"THEME_FILE": "t.toml"}, clear=True)
+    assert daemon.theme_path(_args()) == os.path.abspath("t.toml")
+    assert daemon.theme_path(_args(theme="one")) is None
+
+
+def test_request_no_daemon(tmp_path):
+    assert daemon.request(tmp_path / "nothing.sock", {}) is None
+    assert not daemon.is_running(tmp_path / "nothing.sock")
+
+
+def test_generate(server, tmp_path):
+    theme_file = tmp_path / "theme.toml"
+    write_theme(theme_file, "one")
+    assert daemon.is_running(server.path)
+    response = daemon.request(server.path, generate_request(theme_file))
+    assert response == {"output": 'export SOMEVAR="one"\n'}
+    # enabled_if runs in the environment sent by the client
+    response = daemon.request(
+        server.path,
+        generate_request(theme_file, env={"GATE": "1"}, scope="gated", comment=True),
+    )
+    assert response == {"output": '# [scope.gated]\nexport GATED="yes"\n'}
+
+
+def test_generate_in_client_directory(server, tmp_path, monkeypatch):
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(
+        '[scope.here]\nenabled_if = "test -f marker"\n'
+        'generator = "environment_variables"\nenvironment.export.HERE = "yes"\n'
+    )
+    client_dir = tmp_path / "client"
+    client_dir.mkdir()
+    (client_dir / "marker").write_text("")
+    # the daemon runs in this process, which isn't where the marker is
+    monkeypatch.chdir(tmp_path)
+    response = daemon.request(
+        server.path, generate_request(theme_file, cwd=str(client_dir))
+    )
+    assert response == {"output": 'export HERE="yes"\n'}
+    response = daemon.request(server.path, generate_request(theme_file))
+    assert response == {"output": ""}
+
+
+def test_generate_sends_directory(tmp_path, mocker, monkeypatch):
+    request = mocker.patch("shell_themer.daemon.request", return_value=None)
+    monkeypatch.chdir(tmp_path)
+    args = argparse.Namespace(
+        scope=None, comment=False, defer_conditions=False, format="shell"
+    )
+    assert daemon.generate(tmp_path / "d.sock", "theme.toml", args) is None
+    payload = request.call_args.args[1]
+    assert payload["cwd"] == str(tmp_path)
+    assert payload["env"] == dict(os.environ)
+
+
+def test_generate_error(server, tmp_path):
+    response = daemon.request(server.path, generate_request(tmp_path / "nope.toml"))
+    assert "nope.toml" in response["error"]
+    theme_file = tmp_path / "theme.toml"
+    write_theme(theme_file, "one")
+    response = daemon.request(server.path, generate_request(theme_file, scope="nope"))
+    assert "no such scope" in response["error"]
+
+
+def test_invalid_request(server):
+    # pylint: disable=import-outside-toplevel
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(server.path))
+        sock.sendall(b"this is not json\n")
+        with sock.makefile("rb") as file:
+            assert b"invalid request" in file.readline()
+
+
+def test_reload_when_changed(server, tmp_path):
+    theme_file = tmp_path / "theme.toml"
+    write_theme(theme_file, "one")
+    daemon.request(server.path, generate_request(theme_file))
+    daemon.request(server.path, generate_request(theme_file))
+    assert server.cache.misses == 1
+    assert server.cache.hits == 1
+    write_theme(theme_file, "two")
+    os.utime(theme_file, ns=(1_000_000_000, 1_000_000_000))
+    response = daemon.request(server.path, generate_request(theme_file))
+    assert response == {"output": 'export SOMEVAR="two"\n'}
+    assert server.cache.misses == 2
+
+
+def test_cache_one_thread_per_themer(tmp_path):
+    theme_file = tmp_path / "theme.toml"
+    write_theme(theme_file, "one")
+    cache = daemon.ThemeCache(functools.partial(Themer, "shell-themer"), 2, max_idle=2)
+    # a theme in use by another request gets a Themer of its own
+    with cache.use(str(theme_file)) as first:
+        with cache.use(str(theme_file)) as second:
+            with cache.use(str(theme_file)) as third:
+                assert len({id(first), id(second), id(third)}) == 3
+    assert cache.misses == 3
+    # and max_idle of them are kept for the next requests
+    with cache.use(str(theme_file)) as thm:
+        assert thm in [first, second, third]
+        with cache.use(str(theme_file)) as other:
+            assert other in [first, second, third]
+            assert other is not thm
+    assert cache.hits == 2
+
+
+def test_lru(server, tmp_path):
+    theme_files = []
+    for num in range(3):
+        theme_file = tmp_path / f"theme{num}.toml"
+        write_theme(theme_file, str(num))
+        theme_files.append(str(theme_file))
+        daemon.request(server.path, generate_request(theme_file))
+    # max_themes is 2, so the first one should be gone
+    assert len(server.cache) == 2
+    assert theme_files[0] not in server.cache
+    assert theme_files[2] in server.cache
+
+
+def test_concurrent_clients(server, tmp_path):
+    theme_files = []
+    for num in range(3):
+        theme_file = tmp_path / f"theme{num}.toml"
+        write_theme(theme_file, str(num))
+        theme_files.append(theme_file)
+
+    def _client(num):
+        theme_file = theme_files[num % len(theme_files)]
+        response = daemon.request(server.path, generate_request(theme_file))
+        return response["output"] == f'export SOMEVAR="{num % len(theme_files)}"\n'
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        assert all(executor.map(_client, range(200)))
+
+
+def test_stale_socket(tmp_path):
+    path = tmp_path / "d.sock"
+    path.write_text("left over")
+    server = daemon.ThemerServer(path, functools.partial(Themer, "shell-themer"))
+    server.server_close()
+    assert not path.exists()
+
+
+def test_generate_via_daemon(thm, server, tmp_path, mocker, capsys):
+    theme_file = tmp_path / "theme.toml"
+    write_theme(theme_file, "one")
+    mocker.patch.dict(os.environ, {"SHELL_THEMER_SOCKET": str(server.path)})
+    load = mocker.patch.object(thm, "load")
+    args = thm.argparser().parse_args(
+        ["-f", str(theme_file), "generate", "--via-daemon"]
+    )
+    exit_code = thm.dispatch(args)
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert out == 'export SOMEVAR="one"\n'
+    # the daemon did the work, not us
+    load.assert_not_called()
+    assert server.cache.misses == 1
+
+
+def test_generate_via_daemon_error(thm, server, tmp_path, mocker, capsys):
+    theme_file = tmp_path / "theme.toml"
+    write_theme(theme_file, "one")
+    mocker.patch.dict(os.environ, {"SHELL_THEMER_SOCKET": str(server.path)})
+    argv = ["-f", str(theme_file), "generate", "--via-daemon", "-s", "nope"]
+    exit_code = thm.dispatch(thm.argparser().parse_args(argv))
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_ERROR
+    assert "no such scope" in err
+
+
+def test_generate_via_daemon_fallback(thm, tmp_path, mocker, capsys):
+    theme_file = tmp_path / "theme.toml"
+    write_theme(theme_file, "one")
+    mocker.patch.dict(os.environ, {"SHELL_THEMER_SOCKET": str(tmp_path / "no.sock")})
+    args = thm.argparser().parse_args(
+        ["-f", str(theme_file), "generate", "--via-daemon"]
+    )
+    exit_code = thm.dispatch(args)
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert out == 'export SOMEVAR="one"\n'
+
+
+def test_main_via_daemon(server, tmp_path):
+    theme_file = tmp_path / "theme.toml"
+    write_theme(theme_file, "one")
+    env = dict(os.environ, SHELL_THEMER_SOCKET=str(server.path))
+    env.pop("SHELL_THEMER_HISTORY", None)
+    env.pop("SHELL_THEMER_TRACE", None)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "shell_themer"]
+        + ["-f", str(theme_file), "generate", "--via-daemon"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert proc.stdout == 'export SOMEVAR="one"\n'
+    assert server.cache.misses == 1
+    # the daemon answered before we imported the expensive stuff
+    assert "shell_themer.daemon" in proc.stderr
+    for module in ["shell_themer.themer", "rich", "tomlkit"]:
+        assert f" {module}\n" not in proc.stderr
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["generate", "--via-daemon", "-s", "nope"],
+        ["generate", "--via-daemon", "--profile"],
+        ["generate", "--via-daemon", "--output", "out.sh"],
+        ["generate"],
+        ["list"],
+    ],
+)
+def test_main_not_via_daemon(server, tmp_path, mocker, argv):
+    theme_file = tmp_path / "theme.toml"
+    write_theme(theme_file, "one")
+    mocker.patch.dict(os.environ, {"SHELL_THEMER_SOCKET": str(server.path)})
+    themer_main = mocker.patch("shell_themer.Themer.main", return_value=42)
+    argv = ["-f", str(theme_file)] + argv
+    assert mainmodule.main(argv) == 42
+    themer_main.assert_called_once_with(argv)
+
+
+def test_main_via_daemon_environment(server, tmp_path, mocker):
+    theme_file = tmp_path / "theme.toml"
+    write_theme(theme_file, "one")
+    mocker.patch.dict(os.environ, {"SHELL_THEMER_SOCKET": str(server.path)})
+    mocker.patch.dict(os.environ, {"SHELL_THEMER_HISTORY": "1"})
+    themer_main = mocker.patch("shell_themer.Themer.main", return_value=42)
+    assert mainmodule.main(["-f", str(theme_file), "generate", "--via-daemon"]) == 42
+    themer_main.assert_called_once()
+
+
+def test_serve_not_private(thm, tmp_path, capsys):
+    directory = tmp_path / "shared"
+    directory.mkdir()
+    directory.chmod(0o777)
+    args = thm.argparser().parse_args(["serve", "--socket", str(directory / "d")])
+    exit_code = thm.dispatch(args)
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_ERROR
+    assert "directory is not private" in err
+
+
+def test_serve_already_running(thm, server, capsys):
+    args = thm.argparser().parse_args(["serve", "--socket", str(server.path)])
+    exit_code = thm.dispatch(args)
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_ERROR
+    assert "already running" in err
+
+
+def test_serve(thm, tmp_path, mocker):
+    serve_forever = mocker.patch.object(
+        daemon.ThemerServer, "serve_forever", side_effect=KeyboardInterrupt
+    )
+    path = tmp_path / "d.sock"
+    args = thm.argparser().parse_args(["serve", "--socket", str(path)])
+    assert thm.dispatch(args) == Themer.EXIT_SUCCESS
+    serve_forever.assert_called_once()
+    # the socket is removed when we exit
+    assert not path.exists()
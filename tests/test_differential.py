@@ -0,0 +1,501 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+"""differential tests of the ways we can get output for a theme
+
+Each theme in tests/differential has the output we expect for it next to it,
+in a file with the same name ending in .out: its styles, the value of every
+variable, and the output for every scope, or the error it fails with. The
+reference path, where a new Themer loads the theme from a string and
+generates every scope, and every other path, like the optimized ones we add
+to make things faster, must produce exactly that. When a path doesn't, the
+theme is minimized to the smallest one for which the path still differs
+from the reference path.
+
+Themes which don't have a .out file fail. After a change in behavior on
+purpose, or to add a theme, refresh the .out files with:
+
+    SHELL_THEMER_FREEZE_REFERENCE=1 pytest tests/test_differential.py
+
+That also writes the themes we make up if they aren't there: a copy of the
+dracula theme, a synthetic theme, and random themes full of edge cases.
+Once they are checked in, they don't change when the code that made them
+does.
+"""
+
+import argparse
+import contextlib
+import difflib
+import io
+import json
+import os
+import pathlib
+import random
+import sys
+import threading
+from unittest import mock
+
+import pytest
+import tomlkit
+
+from shell_themer import Themer, daemon, synthetic
+
+TESTS_DIR = pathlib.Path(__file__).resolve().parent
+FIXTURE_DIR = TESTS_DIR / "differential"
+RANDOM_THEMES = 12
+
+# generate everything, and leave enabled_if in the output instead of
+# running it, so the output is the same with any shell
+ARGS = argparse.Namespace(scope=None, comment=True, defer_conditions=True)
+
+# what the reused Themer has loaded before, with names that overlap with
+# the themes in the corpus
+PREVIOUS_THEME = """
+[variables]
+var0 = "#ff0000"
+green = "#00ff00"
+
+[styles]
+text = "#ffffff on #000000"
+style0 = "{var:var0} bold"
+background = "#123456"
+
+[scope.fzf0]
+generator = "fzf"
+environment_variable = "FZF_PREVIOUS"
+style.text = "text"
+
+[scope.env]
+generator = "environment_variables"
+environment.export.PREVIOUS = "{style:text}"
+"""
+
+
+#
+# the themes
+#
+def edge_case_theme(seed):
+    """a random theme full of edge cases, the same one for the same seed"""
+    rand = random.Random(seed)
+    toml = synthetic.theme(
+        variables=rand.randint(0, 12),
+        chain=rand.randint(1, 4),
+        styles=rand.randint(0, 12),
+        scopes=1,
+        enabled_if=rand.randint(0, 3),
+        fzf_options=rand.randint(0, 4),
+        filesets=rand.randint(0, 2),
+        globs=rand.randint(1, 3),
+        seed=seed,
+    )
+    definition = tomlkit.parse(toml)
+    variables = definition.setdefault("variables", tomlkit.table())
+    styles = definition.setdefault("styles", tomlkit.table())
+    edge_variables = {
+        "flag": rand.choice([True, False]),
+        "number": rand.randint(0, 255),
+        "escaped": "\\{var:var0} and \\{style:text}",
+        "unknown": "{var:nope}",
+        "styled": "{style:text}",
+        "hexnohash": "{style:text:hexnohash}",
+        "badformat": "{style:text:nope}",
+        "missing_style": "{style:nope}",
+        "unclosed": "{var:var0",
+        "empty": "",
+    }
+    for name, value in edge_variables.items():
+        if rand.random() < 0.7:
+            variables[name] = value
+    edge_styles = {"empty": ""}
+    if "number" in variables:
+        edge_styles["with_number"] = "color({var:number})"
+    # these can't be parsed, which is an edge case of its own, but one which
+    # stops the whole theme from loading, so only a few themes get one
+    broken_styles = {
+        "unknown_var": "{var:nope} bold",
+        "escaped": "\\{var:var0}",
+    }
+    for name, value in edge_styles.items():
+        if rand.random() < 0.5:
+            styles[name] = value
+    if rand.random() < 0.1:
+        name = rand.choice(sorted(broken_styles))
+        styles[name] = broken_styles[name]
+    scopes = definition.setdefault("scope", tomlkit.table())
+    commands = {
+        f"edge{num}": f"echo {value}"
+        for num, value in enumerate(
+            [
+                "{var:flag} {var:number} {var:unknown}",
+                "\\{style:text} {style:text} {style:text:hex}",
+                "{var:escaped} {var:styled} {var:hexnohash}",
+                "{style:nope} {var:badformat} {var:empty}",
+            ]
+        )
+        if rand.random() < 0.7
+    }
+    if commands:
+        scopes["edge_shell"] = {"generator": "shell", "command": commands}
+    if rand.random() < 0.5:
+        scopes["edge_env"] = {
+            "generator": "environment_variables",
+            "environment": {
+                "export": {"EDGE_FLAG": "{var:flag}", "EDGE_STYLE": "{style:empty}"},
+                "unset": ["EDGE_UNSET"],
+            },
+        }
+    if rand.random() < 0.3:
+        scopes["edge_disabled"] = {
+            "generator": "shell",
+            "enabled": False,
+            "command": {"nope": "echo nope"},
+        }
+    return tomlkit.dumps(definition)
+
+
+def made_up_themes():
+    """the themes we make up, as a dict of name to toml"""
+    dracula = TESTS_DIR.parent / "themes" / "dracula.toml"
+    themes = {
+        "dracula": dracula.read_text(encoding="utf-8"),
+        "synthetic": synthetic.scaled(1),
+    }
+    for seed in range(RANDOM_THEMES):
+        themes[f"edge-{seed:02}"] = edge_case_theme(seed)
+    return themes
+
+
+def fixtures():
+    """every theme in FIXTURE_DIR, as a list of (name, toml, expected)
+    tuples, expected is None if there is no .out file"""
+    themes = []
+    for theme_file in sorted(FIXTURE_DIR.glob("*.toml")):
+        try:
+            expected = theme_file.with_suffix(".out").read_text(encoding="utf-8")
+        except FileNotFoundError:
+            expected = None
+        themes.append(
+            (theme_file.stem, theme_file.read_text(encoding="utf-8"), expected)
+        )
+    return themes
+
+
+FIXTURES = fixtures()
+
+
+#
+# the paths
+#
+def render(thm, args=ARGS):
+    """everything we can see about a loaded theme: its styles, the value of
+    every variable, and the output for every scope"""
+    lines = ["[styles]"]
+    lines.extend(f"{name} = {style}" for name, style in thm.styles.items())
+    lines.append("[variables]")
+    for name in thm.definition.get("variables", {}):
+        lines.append(f"{name} = {thm.value_of(name)!r}")
+    lines.append("[output]")
+    results = thm.generate_scopes(args)
+    # lazy scopes are included like any other scope, so the output doesn't
+    # depend on where the theme was loaded from
+    lines.append(thm._join_results(results, args.comment))
+    return "\n".join(lines)
+
+
+def shell_output(rendered):
+    """just the output for every scope from the output of render(), for
+    the paths which can't see the styles and variables"""
+    if rendered.startswith("error: "):
+        return rendered
+    return rendered.split("[output]\n", 1)[1]
+
+
+def everything(rendered):
+    """all the output of render(), for the paths which can see it all"""
+    return rendered
+
+
+def _errors_as_output(func):
+    """turn an exception from func into output, so that every path has to
+    fail in the same way too"""
+
+    def _wrapper(toml, tmp_path):
+        try:
+            return func(toml, tmp_path)
+        except Exception as err:  # pylint: disable=broad-except
+            return f"error: {err}"
+
+    return _wrapper
+
+
+@_errors_as_output
+def reference_path(toml, _):
+    thm = Themer(prog="shell-themer")
+    thm.loads(toml)
+    return render(thm)
+
+
+@_errors_as_output
+def reused_path(toml, _):
+    # like every thread in generate --stdin-batch
+    thm = Themer(prog="shell-themer")
+    thm.loads(PREVIOUS_THEME)
+    render(thm)
+    thm.loads(toml)
+    return render(thm)
+
+
+@_errors_as_output
+def cache_path(toml, tmp_path):
+    # the daemon loads from a file, and keeps the loaded theme around
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(toml, encoding="utf-8")
+    cache = daemon.ThemeCache(lambda: Themer(prog="shell-themer"), 1)
+    with cache.use(str(theme_file)) as thm:
+        render(thm)
+    with cache.use(str(theme_file)) as thm:
+        return render(thm)
+
+
+@_errors_as_output
+def scope_path(toml, _):
+    # generate each scope by itself with --scope
+    thm = Themer(prog="shell-themer")
+    thm.loads(toml)
+    output = render(thm, argparse.Namespace(**{**vars(ARGS), "scope": ""}))
+    output = output[: output.index("[output]\n") + len("[output]\n")]
+    for scope in thm.definition.get("scope", {}):
+        args = argparse.Namespace(**{**vars(ARGS), "scope": scope})
+        results = thm.generate_scopes(args)
+        output += thm._join_results(results, args.comment)
+    return output
+
+
+@_errors_as_output
+def daemon_path(toml, tmp_path):
+    # a real daemon, asked twice over its socket so the second answer comes
+    # from the theme it kept loaded
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(toml, encoding="utf-8")
+    server = daemon.ThemerServer(
+        tmp_path / "d.sock", lambda: Themer(prog="shell-themer")
+    )
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    try:
+        payload = {
+            "theme_file": str(theme_file),
+            "comment": ARGS.comment,
+            "defer_conditions": ARGS.defer_conditions,
+        }
+        daemon.request(server.path, payload)
+        response = daemon.request(server.path, payload)
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+    if "error" in response:
+        raise RuntimeError(response["error"])
+    return response["output"]
+
+
+@_errors_as_output
+def batch_path(toml, _):
+    # generate --stdin-batch, with the theme in the middle of others so it
+    # goes to a thread which has already generated one
+    documents = [PREVIOUS_THEME, toml, PREVIOUS_THEME]
+    stdin = io.TextIOWrapper(
+        io.BytesIO(
+            "".join(json.dumps({"toml": doc}) + "\n" for doc in documents).encode()
+        )
+    )
+    stdout = io.StringIO()
+    thm = Themer(prog="shell-themer")
+    argv = ["generate", "--stdin-batch", "--comment", "--defer-conditions"]
+    args = thm.argparser().parse_args([*argv, "--jobs", "1"])
+    with mock.patch.object(sys, "stdin", stdin), contextlib.redirect_stdout(stdout):
+        thm.dispatch(args)
+    record = json.loads(stdout.getvalue().splitlines()[1])
+    if "error" in record:
+        raise RuntimeError(record["error"])
+    return record["output"]
+
+
+# the paths which must give the same answer as the reference path, and
+# how much of the answer each of them can see. Add optimized paths here
+PATHS = {
+    "reused": (reused_path, everything),
+    "cache": (cache_path, everything),
+    "scope": (scope_path, everything),
+    "daemon": (daemon_path, shell_output),
+    "batch": (batch_path, shell_output),
+}
+
+
+#
+# minimizing a theme which shows a difference
+#
+def _paths_in(table, prefix=()):
+    """every key in a toml table, tables before the keys in them"""
+    paths = []
+    for key, value in table.items():
+        paths.append(prefix + (key,))
+        if isinstance(value, dict):
+            paths.extend(_paths_in(value, prefix + (key,)))
+    return paths
+
+
+def _without(toml, path):
+    definition = tomlkit.parse(toml)
+    table = definition
+    for key in path[:-1]:
+        table = table[key]
+    del table[path[-1]]
+    return tomlkit.dumps(definition)
+
+
+def minimize(toml, differs):
+    """the smallest theme we can find by removing tables and keys from toml
+    for which differs(theme) is still true"""
+    changed = True
+    while changed:
+        changed = False
+        for path in _paths_in(tomlkit.parse(toml)):
+            try:
+                smaller = _without(toml, path)
+            except KeyError:
+                # we already removed the table it was in
+                continue
+            if differs(smaller):
+                toml = smaller
+                changed = True
+    return toml
+
+
+def check_path(path, view, toml, expected, tmp_path):
+    """compare path to the expected output for toml
+
+    view is what path can see of the output of the reference path
+
+    :returns: None if they are the same, or a report of the difference,
+        with the smallest theme for which path and the reference path differ
+    """
+    actual = path(toml, tmp_path)
+    if actual == view(expected):
+        return None
+
+    def _differs(theme):
+        return path(theme, tmp_path) != view(reference_path(theme, tmp_path))
+
+    if _differs(toml):
+        toml = minimize(toml, _differs)
+        expected = reference_path(toml, tmp_path)
+        actual = path(toml, tmp_path)
+    diff = difflib.unified_diff(
+        view(expected).splitlines(),
+        actual.splitlines(),
+        "expected",
+        "path",
+        lineterm="",
+    )
+    return f"smallest theme with a difference:\n{toml}\n\n" + "\n".join(diff)
+
+
+#
+# the tests
+#
+def test_freeze_reference(tmp_path):
+    if not os.environ.get("SHELL_THEMER_FREEZE_REFERENCE"):
+        pytest.skip("set $SHELL_THEMER_FREEZE_REFERENCE to refresh the reference")
+    FIXTURE_DIR.mkdir(exist_ok=True)
+    for name, toml in made_up_themes().items():
+        theme_file = FIXTURE_DIR / f"{name}.toml"
+        if not theme_file.exists():
+            theme_file.write_text(toml, encoding="utf-8")
+    for theme_file in FIXTURE_DIR.glob("*.toml"):
+        output = reference_path(theme_file.read_text(encoding="utf-8"), tmp_path)
+        theme_file.with_suffix(".out").write_text(output, encoding="utf-8")
+
+
+@pytest.mark.parametrize(
+    "name, toml, expected", FIXTURES, ids=[name for name, _, _ in FIXTURES]
+)
+def test_reference_unchanged(name, toml, expected, tmp_path):
+    assert expected is not None, f"{name}.out is missing, freeze the reference"
+    report = check_path(reference_path, everything, toml, expected, tmp_path)
+    assert report is None, f"the reference path is different for {name}\n{report}"
+
+
+@pytest.mark.parametrize("path_name", PATHS)
+@pytest.mark.parametrize(
+    "name, toml, expected", FIXTURES, ids=[name for name, _, _ in FIXTURES]
+)
+def test_path_matches_reference(path_name, name, toml, expected, tmp_path):
+    assert expected is not None, f"{name}.out is missing, freeze the reference"
+    path, view = PATHS[path_name]
+    report = check_path(path, view, toml, expected, tmp_path)
+    assert report is None, f"{path_name} is different for {name}\n{report}"
+
+
+def test_fixtures():
+    names = [name for name, _, _ in FIXTURES]
+    # the made up themes are all there
+    assert set(made_up_themes()) <= set(names)
+    # and nothing is left over from themes which are gone
+    outputs = {path.stem for path in FIXTURE_DIR.glob("*.out")}
+    assert outputs <= set(names)
+    edge_themes = "\n".join(toml for name, toml, _ in FIXTURES if "edge" in name)
+    for edge_case in ["\\\\{var:", "true", "{var:nope}", '""', "enabled = false"]:
+        assert edge_case in edge_themes
+    # some of the themes fail, and every path has to fail the same way
+    expected = [output or "" for _, _, output in FIXTURES]
+    assert any(output.startswith("error: ") for output in expected)
+    assert (
+        len([output for output in expected if "[output]" in output]) > len(expected) / 2
+    )
+
+
+def test_minimize(tmp_path):
+    # a broken path which forgets the style for executable files
+    @_errors_as_output
+    def broken_path(toml, tmp_path):
+        return reference_path(toml, tmp_path).replace(":ex=", ":xx=")
+
+    toml = synthetic.scaled(1)
+    expected = reference_path(toml, tmp_path)
+    report = check_path(broken_path, everything, toml, expected, tmp_path)
+    assert report is not None
+    smallest = report[len("smallest theme with a difference:\n") :].split("\n\n---")[0]
+    definition = tomlkit.parse(smallest)
+    # all that's left is the scope with the broken style, and the style and
+    # variables it uses
+    assert list(definition["scope"]) == ["exa_colors0"]
+    assert "executable_file" in definition["scope"]["exa_colors0"]["style"]
+    assert len(smallest) < len(toml) / 10
+    # and the reference path matches itself
+    assert check_path(reference_path, everything, toml, expected, tmp_path) is None
@@ -24,6 +24,11 @@
 # pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
 # pylint: disable=missing-module-docstring, unused-variable
 
+import json
+import os
+import shutil
+import subprocess
+
 import pytest
 import rich.style
 import rich.errors
@@ -221,6 +226,199 @@ def test_generate_enabled_if(cmd, enabled, thm_cmdline, capsys):
         assert not out
 
 
+def test_generate_defer_conditions(thm_cmdline, capsys):
+    tomlstr = """
+        [variables]
+        echocmd = "/bin/echo"
+
+        [scope.deferred]
+        enabled_if = "{var:echocmd} hi"
+        generator = "environment_variables"
+        environment.unset = "DEFERRED"
+
+        [scope.disabled]
+        enabled = false
+        enabled_if = "echo"
+        generator = "environment_variables"
+        environment.unset = "DISABLED"
+
+        [scope.enabled]
+        enabled = true
+        enabled_if = "false"
+        generator = "environment_variables"
+        environment.unset = "ENABLED"
+
+        [scope.empty]
+        enabled_if = "false"
+        generator = "environment_variables"
+    """
+    exit_code = thm_cmdline("generate --defer-conditions", tomlstr)
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert not err
+    assert out == (
+        "if { /bin/echo hi\n} >/dev/null 2>&1; then\n"
+        "unset DEFERRED\n"
+        "fi\n"
+        "unset ENABLED\n"
+    )
+
+
+@pytest.mark.skipif(not shutil.which("bash"), reason="bash is not installed")
+@pytest.mark.parametrize("cmd, enabled", ENABLED_IFS)
+def test_generate_defer_conditions_in_shell(cmd, enabled, thm_cmdline, capsys):
+    tomlstr = f"""
+        [variables]
+        echocmd = "/bin/echo"
+        falsetest = "[[ 1 == 0 ]]"
+
+        [scope.export]
+        enabled_if = "{cmd}"
+        generator = "environment_variables"
+        environment.export.ENVVAR = "enabled"
+    """
+    exit_code = thm_cmdline("generate --defer-conditions", tomlstr)
+    out, _ = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    proc = subprocess.run(
+        ["bash", "-c", f'{out}\necho "$ENVVAR"'], capture_output=True, check=True
+    )
+    assert not proc.stderr
+    if enabled:
+        assert proc.stdout == b"enabled\n"
+    else:
+        assert proc.stdout == b"\n"
+
+
+def test_generate_output(thm, thm_cmdline, capsys, tmp_path):
+    tomlstr = """
+        [scope.somevar]
+        generator = "environment_variables"
+        environment.unset = "SOMEVAR"
+    """
+    output = tmp_path / "output.sh"
+    exit_code = thm_cmdline(f"generate --output {output}", tomlstr)
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert not out
+    assert not err
+    assert output.read_text() == "unset SOMEVAR\n"
+    # generating it again with the same result shouldn't write the file
+    os.utime(output, ns=(1_000_000_000, 1_000_000_000))
+    args = thm.argparser().parse_args(["generate", "-o", str(output)])
+    exit_code = thm.dispatch(args)
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert output.stat().st_mtime_ns == 1_000_000_000
+
+
+def test_generate_split_dir(thm, thm_cmdline, capsys, tmp_path):
+    tomlstr = """
+        [scope.one]
+        generator = "environment_variables"
+        environment.unset = "ONE"
+
+        [scope.two]
+        enabled = false
+        generator = "environment_variables"
+        environment.unset = "TWO"
+
+        [scope.three]
+        enabled_if = "false"
+        generator = "environment_variables"
+        environment.unset = "THREE"
+    """
+    exit_code = thm_cmdline(
+        f"generate --defer-conditions --split-dir {tmp_path}", tomlstr
+    )
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert not out
+    assert not err
+    files = sorted(path.name for path in tmp_path.glob("[!.]*"))
+    assert files == ["manifest.json", "one.sh", "three.sh"]
+    assert (tmp_path / "one.sh").read_text() == "unset ONE\n"
+    assert "unset THREE" in (tmp_path / "three.sh").read_text()
+    with open(tmp_path / "manifest.json", encoding="utf-8") as file:
+        manifest = json.load(file)
+    assert manifest["scopes"] == [
+        {
+            "scope": "one",
+            "generator": "environment_variables",
+            "enabled": True,
+            "enabled_if": None,
+            "trigger": None,
+            "file": "one.sh",
+        },
+        {
+            "scope": "two",
+            "generator": "environment_variables",
+            "enabled": False,
+            "enabled_if": None,
+            "trigger": None,
+            "file": None,
+        },
+        {
+            "scope": "three",
+            "generator": "environment_variables",
+            "enabled": True,
+            "enabled_if": "false",
+            "trigger": None,
+            "file": "three.sh",
+        },
+    ]
+
+    # now generate again without deferring, so three gets disabled, the
+    # unchanged file should be left alone and the disabled one removed
+    os.utime(tmp_path / "one.sh", ns=(1_000_000_000, 1_000_000_000))
+    args = thm.argparser().parse_args(["generate", "--split-dir", str(tmp_path)])
+    exit_code = thm.dispatch(args)
+    assert exit_code == Themer.EXIT_SUCCESS
+    files = sorted(path.name for path in tmp_path.glob("[!.]*"))
+    assert files == ["manifest.json", "one.sh"]
+    assert (tmp_path / "one.sh").stat().st_mtime_ns == 1_000_000_000
+
+
+def test_generate_json(thm_cmdline, capsys):
+    tomlstr = """
+        [styles]
+        background = "#282a36"
+
+        [scope.env]
+        generator = "environment_variables"
+        environment.unset = ["ONE", "TWO"]
+        environment.export.THREE = "{style:background}"
+
+        [scope.iterm]
+        generator = "iterm"
+        style.background = "background"
+
+        [scope.disabled]
+        enabled = false
+        generator = "shell"
+        command.hi = "echo hi"
+    """
+    exit_code = thm_cmdline("generate --format json", tomlstr)
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert not err
+    data = json.loads(out)
+    assert data["theme_file"] is None
+    env, iterm, disabled = data["scopes"]
+    assert env == {
+        "scope": "env",
+        "generator": "environment_variables",
+        "enabled": True,
+        "enabled_if": None,
+        "trigger": None,
+        "environment": {"export": {"THREE": "#282a36"}, "unset": ["ONE", "TWO"]},
+        "commands": [],
+        "escapes": [],
+    }
+    assert iterm["escapes"] == ["\x1b]1337;SetColors=bg=282a36\x07"]
+    assert disabled["enabled"] is False
+    assert disabled["commands"] == []
+
+
 def test_generate_comments(thm_cmdline, capsys):
     tomlstr = """
         [scope.nolistvar]
@@ -0,0 +1,140 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+
+import json
+import pathlib
+import subprocess
+import sys
+
+REPO_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+
+def _importtime(*args):
+    return subprocess.run(
+        [sys.executable, "-m", "benchmarks.importtime", "--runs", "3", *args],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+
+# modules which only some commands need, and which would make every shell
+# that runs generate start slower
+HEAVY_MODULES = [
+    "asyncio",
+    "concurrent",
+    "ctypes",
+    "logging",
+    "multiprocessing",
+    "socketserver",
+    "shell_themer.batch",
+    "shell_themer.daemon",
+    "shell_themer.picker",
+    "shell_themer.swatches",
+    "shell_themer.watcher",
+]
+
+
+def test_generate_imports(tmp_path):
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(
+        '[scope.env]\ngenerator = "environment_variables"\n'
+        'environment.export.SOMEVAR = "value"\n'
+    )
+    proc = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-m",
+            "shell_themer",
+            "-f",
+            str(theme_file),
+            "generate",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert proc.stdout == 'export SOMEVAR="value"\n'
+    imported = {
+        line.rsplit("|", 1)[1].strip()
+        for line in proc.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+    assert "shell_themer.themer" in imported
+    assert not imported & set(HEAVY_MODULES)
+
+
+def test_import_over_budget(tmp_path):
+    budget = tmp_path / "budget.json"
+    budget.write_text('{"modules": ["shell_themer"]}')
+    proc = _importtime("--budget", str(budget), "--max-ms", "0.001")
+    assert proc.returncode == 1
+    assert "the budget is 0.001ms" in proc.stdout
+    assert "imported modules not in the budget: " in proc.stdout
+    assert "tomlkit" in proc.stdout.splitlines()[-1]
+
+
+def test_import_stdlib_not_in_budget(tmp_path):
+    # this is how the budget catches things like concurrent.futures being
+    # imported by every run
+    version = f"{sys.version_info[0]}.{sys.version_info[1]}"
+    budget = tmp_path / "budget.json"
+    budget.write_text(
+        json.dumps(
+            {
+                "modules": ["attr", "rich", "rich_argparse", "shell_themer", "tomlkit"],
+                "stdlib": {version: ["os"], "2.7": []},
+            }
+        )
+    )
+    proc = _importtime("--budget", str(budget))
+    assert proc.returncode == 1
+    last = proc.stdout.splitlines()[-1]
+    assert f"standard library modules not in the budget for python {version}" in last
+    assert "json" in last.split(": ", 1)[1].split(", ")
+
+
+def test_import_save(tmp_path):
+    budget = tmp_path / "budget.json"
+    times = tmp_path / "times" / "import_time.json"
+    proc = _importtime("--budget", str(budget), "--times", str(times), "--save")
+    assert proc.returncode == 0
+    saved = json.loads(budget.read_text())
+    assert "cumulative_ms" not in saved
+    assert "tomlkit" in saved["modules"]
+    version = f"{sys.version_info[0]}.{sys.version_info[1]}"
+    assert "json" in saved["stdlib"][version]
+    assert "tomlkit" not in saved["stdlib"][version]
+    assert 0 < json.loads(times.read_text())["cumulative_ms"] < 10000
+    # and the time is checked from then on
+    times.write_text('{"cumulative_ms": 0.001}')
+    proc = _importtime("--budget", str(budget), "--times", str(times))
+    assert proc.returncode == 1
+    assert "the budget is 0.001ms" in proc.stdout
@@ -0,0 +1,134 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from shell_themer import Themer
+
+
+#
+# test the init command
+#
+@pytest.mark.parametrize("shell", ["bash", "zsh"])
+def test_init(thm_cmdline, capsys, mocker, tmp_path, shell):
+    mocker.patch.dict(os.environ, {"SHELL_THEMER_CACHE_DIR": str(tmp_path)})
+    exit_code = thm_cmdline(f"init {shell}")
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert not err
+    assert f"initialization for {shell}" in out
+    assert "_shell_themer_activate()" in out
+    assert 'local theme_file="$THEME_FILE"' in out
+    assert str(tmp_path) in out
+
+
+def test_init_file(thm_cmdline, capsys):
+    # use a list because there is a space in the path
+    exit_code = thm_cmdline(["-f", "/tmp/some theme.toml", "init", "bash"])
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert "local theme_file='/tmp/some theme.toml'" in out
+
+
+@pytest.mark.skipif(not shutil.which("bash"), reason="bash is not installed")
+def test_init_no_theme(capsys, mocker, tmp_path):
+    mocker.patch.dict(os.environ, {"SHELL_THEMER_CACHE_DIR": str(tmp_path)})
+    mocker.patch.dict(os.environ, {"THEME_FILE": ""})
+    # a name we were run as which would break the shell code if it was in it
+    thm = Themer(prog="it's")
+    assert thm.dispatch(thm.argparser().parse_args(["init", "bash"])) == 0
+    initcode, _ = capsys.readouterr()
+    proc = subprocess.run(
+        ["bash", "-c", initcode], capture_output=True, text=True, check=False
+    )
+    assert proc.stderr == "shell-themer: no theme or theme file specified\n"
+
+
+def test_init_unknown_shell(thm_cmdline, capsys):
+    exit_code = thm_cmdline("init fish")
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_USAGE
+    assert "invalid choice" in err
+
+
+def test_cache_dir(thm, mocker, tmp_path):
+    mocker.patch.dict(os.environ, {}, clear=True)
+    mocker.patch.dict(os.environ, {"XDG_CACHE_HOME": str(tmp_path)})
+    assert thm.cache_dir == tmp_path / "shell-themer"
+    mocker.patch.dict(os.environ, {"SHELL_THEMER_CACHE_DIR": str(tmp_path / "x")})
+    assert thm.cache_dir == tmp_path / "x"
+
+
+@pytest.mark.skipif(not shutil.which("bash"), reason="bash is not installed")
+def test_init_bash_caches_output(thm_cmdline, capsys, mocker, tmp_path):
+    cache_dir = tmp_path / "cache"
+    mocker.patch.dict(os.environ, {"SHELL_THEMER_CACHE_DIR": str(cache_dir)})
+    thm_cmdline("init bash")
+    initcode, _ = capsys.readouterr()
+
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(
+        '[scope.env]\ngenerator = "environment_variables"\n'
+        'environment.export.SOMEVAR = "first"\n'
+    )
+    env = dict(os.environ, THEME_FILE=str(theme_file))
+    script = f'{initcode}\necho "$SOMEVAR"'
+
+    proc = subprocess.run(
+        ["bash", "-c", script], env=env, capture_output=True, check=False
+    )
+    assert proc.stdout.decode().strip() == "first"
+    # ignore the hidden lock file, and the scope index for completion
+    outputs = list(cache_dir.glob("[!.]*.sh"))
+    assert len(outputs) == 1
+    output = outputs[0]
+
+    # if the theme file hasn't changed, the output file must not be regenerated
+    os.utime(theme_file, ns=(1_000_000_000, 1_000_000_000))
+    mtime = output.stat().st_mtime_ns
+    proc = subprocess.run(
+        ["bash", "-c", script], env=env, capture_output=True, check=False
+    )
+    assert proc.stdout.decode().strip() == "first"
+    assert output.stat().st_mtime_ns == mtime
+
+    # but if the theme file is newer, it should be
+    theme_file.write_text(
+        '[scope.env]\ngenerator = "environment_variables"\n'
+        'environment.export.SOMEVAR = "second"\n'
+    )
+    os.utime(output, ns=(1_000_000_000, 1_000_000_000))
+    proc = subprocess.run(
+        ["bash", "-c", script], env=env, capture_output=True, check=False
+    )
+    assert proc.stdout.decode().strip() == "second"
+    # and we shouldn't leave any temporary files around
+    files = [path for path in cache_dir.glob("[!.]*") if path.name != "scopes"]
+    assert files == [output]
@@ -0,0 +1,190 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+import argparse
+import json
+import os
+import subprocess
+
+import pytest
+
+from shell_themer import Themer
+
+LAZY_TOML = """
+    [scope.eager]
+    generator = "environment_variables"
+    environment.export.EAGER = "now"
+
+    [scope.lazytool]
+    activation = "lazy"
+    generator = "environment_variables"
+    environment.export.LAZY_ONE = "one"
+
+    [scope.lazyextra]
+    activation = "lazy"
+    trigger = "lazytool"
+    generator = "environment_variables"
+    environment.export.LAZY_TWO = "two"
+
+    [scope.lazyoff]
+    enabled = false
+    activation = "lazy"
+    generator = "environment_variables"
+    environment.export.LAZY_OFF = "off"
+"""
+
+
+def test_generate_lazy(thm_cmdline, capsys, tmp_path, monkeypatch):
+    monkeypatch.setenv("SHELL_THEMER_CACHE_DIR", str(tmp_path))
+    exit_code = thm_cmdline("generate --comment", LAZY_TOML)
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert not err
+    assert 'export EAGER="now"' in out
+    assert "LAZY_ONE" not in out
+    assert "LAZY_OFF" not in out
+    # both lazy scopes share one wrapper
+    assert out.count("lazytool() {") == 1
+    assert "# [scope.lazyextra] activated by running lazytool" in out
+    (lazy_dir,) = (tmp_path / "lazy").iterdir()
+    files = sorted(path.name for path in lazy_dir.glob("[!.]*"))
+    assert files == ["lazyextra.sh", "lazytool.sh"]
+    assert 'export LAZY_ONE="one"' in (lazy_dir / "lazytool.sh").read_text()
+
+
+def test_generate_lazy_shell(thm_cmdline, capsys, tmp_path, monkeypatch):
+    monkeypatch.setenv("SHELL_THEMER_CACHE_DIR", str(tmp_path / "cache"))
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    tool = bindir / "lazytool"
+    tool.write_text('#!/bin/sh\necho "tool $1 $LAZY_ONE $LAZY_TWO"\n')
+    tool.chmod(0o755)
+    exit_code = thm_cmdline("generate", LAZY_TOML)
+    out, _ = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    script = (
+        f"{out}\n"
+        'echo "before $EAGER $LAZY_ONE"\n'
+        "lazytool first\n"
+        "lazytool second\n"
+        "type -t lazytool\n"
+    )
+    env = dict(os.environ, PATH=f"{bindir}:{os.environ['PATH']}")
+    proc = subprocess.run(
+        ["bash", "-c", script], capture_output=True, check=True, env=env
+    )
+    assert not proc.stderr
+    assert proc.stdout.decode().splitlines() == [
+        "before now ",
+        "tool first one two",
+        "tool second one two",
+        "file",
+    ]
+
+
+def test_generate_lazy_split_dir(thm_cmdline, tmp_path):
+    split_dir = tmp_path / "split"
+    output = tmp_path / "output.sh"
+    exit_code = thm_cmdline(
+        f"generate --split-dir {split_dir} --output {output}", LAZY_TOML
+    )
+    assert exit_code == Themer.EXIT_SUCCESS
+    # the wrapper sources the fragments in the split directory
+    assert f"builtin source {split_dir / 'lazytool.sh'}" in output.read_text()
+    assert f"builtin source {split_dir / 'lazyextra.sh'}" in output.read_text()
+    with open(split_dir / "manifest.json", encoding="utf-8") as file:
+        manifest = json.load(file)
+    triggers = {entry["scope"]: entry["trigger"] for entry in manifest["scopes"]}
+    assert triggers == {
+        "eager": None,
+        "lazytool": "lazytool",
+        "lazyextra": "lazytool",
+        "lazyoff": "lazyoff",
+    }
+
+
+def test_generate_lazy_cache_unwritable(thm_cmdline, capsys, tmp_path, monkeypatch):
+    # a file where the cache directory should be
+    cache_dir = tmp_path / "cache"
+    cache_dir.write_text("")
+    monkeypatch.setenv("SHELL_THEMER_CACHE_DIR", str(cache_dir))
+    exit_code = thm_cmdline("generate", LAZY_TOML)
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert not err
+    # without the fragments the lazy scopes are included like any other
+    assert "lazytool()" not in out
+    assert 'export LAZY_ONE="one"' in out
+    assert 'export LAZY_TWO="two"' in out
+
+
+def test_generate_lazy_json(thm_cmdline, capsys, tmp_path, monkeypatch):
+    monkeypatch.setenv("SHELL_THEMER_CACHE_DIR", str(tmp_path))
+    exit_code = thm_cmdline("generate --format json", LAZY_TOML)
+    out, _ = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert json.loads(out)["scopes"][1]["trigger"] == "lazytool"
+    assert not (tmp_path / "lazy").exists()
+
+
+def test_lazy_dir_per_theme(thm, tmp_path, monkeypatch):
+    monkeypatch.setenv("SHELL_THEMER_CACHE_DIR", str(tmp_path / "cache"))
+    args = argparse.Namespace(
+        scope=None, comment=False, defer_conditions=False, format="shell"
+    )
+    lazy_dirs = set()
+    for subdir in ["one", "two"]:
+        (tmp_path / subdir).mkdir()
+        (tmp_path / subdir / "theme.toml").write_text(LAZY_TOML)
+        # the same relative path in different directories
+        monkeypatch.chdir(tmp_path / subdir)
+        thm.load("theme.toml")
+        lazy_dirs.add(thm._lazy_dir(args))
+    # and two themes which weren't loaded from a file
+    for toml in [LAZY_TOML, LAZY_TOML.replace('"one"', '"uno"')]:
+        thm.loads(toml)
+        lazy_dirs.add(thm._lazy_dir(args))
+    assert len(lazy_dirs) == 4
+
+
+@pytest.mark.parametrize(
+    "setting, message",
+    [
+        ('activation = "sometimes"', "unknown activation"),
+        ('activation = "lazy"\ntrigger = "rm -rf"', "invalid trigger"),
+    ],
+)
+def test_generate_lazy_invalid(thm_cmdline, capsys, setting, message):
+    tomlstr = f"""
+[scope.bad]
+{setting}
+generator = "environment_variables"
+environment.export.BAD = "bad"
+"""
+    exit_code = thm_cmdline("generate", tomlstr)
+    _, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_ERROR
+    assert message in err
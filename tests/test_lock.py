@@ -0,0 +1,115 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+import contextlib
+import os
+import subprocess
+import sys
+import time
+
+from shell_themer import Themer
+from shell_themer import lock
+
+
+def test_exclusive(tmp_path):
+    lockfile = tmp_path / "lock"
+    with lock.exclusive(lockfile, 1) as locked:
+        assert locked
+    # after it's released, we can get it again
+    with lock.exclusive(lockfile, 0) as locked:
+        assert locked
+
+
+def test_exclusive_timeout(tmp_path):
+    lockfile = tmp_path / "lock"
+    with lock.exclusive(lockfile, 1) as locked:
+        assert locked
+        start = time.monotonic()
+        # every open of the file gets its own lock, so this conflicts even
+        # though it's the same process
+        with lock.exclusive(lockfile, 0.1) as locked_again:
+            assert not locked_again
+        assert time.monotonic() - start < 1
+
+
+def test_generate_if_stale(tmp_path):
+    tomlstr = """
+        [scope.somevar]
+        generator = "environment_variables"
+        environment.unset = "SOMEVAR"
+    """
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(tomlstr)
+    output = tmp_path / "output.sh"
+    output.write_text("stale\n")
+    os.utime(output, ns=(1_000_000_000, 1_000_000_000))
+    argv = ["-f", str(theme_file), "generate", "-o", str(output), "--if-stale"]
+    assert Themer.main(argv) == Themer.EXIT_SUCCESS
+    assert output.read_text() == "unset SOMEVAR\n"
+
+    # now it's fresh, so it shouldn't be generated again
+    output.write_text("fresh\n")
+    assert Themer.main(argv) == Themer.EXIT_SUCCESS
+    assert output.read_text() == "fresh\n"
+
+    # if the output is stale but the contents are the same, the output
+    # needs to be marked fresh so the next shell doesn't think it's stale
+    output.write_text("unset SOMEVAR\n")
+    os.utime(output, ns=(1_000_000_000, 1_000_000_000))
+    assert Themer.main(argv) == Themer.EXIT_SUCCESS
+    assert output.stat().st_mtime_ns > theme_file.stat().st_mtime_ns
+
+
+def test_generate_stampede(tmp_path):
+    # a whole bunch of shells starting at the same time should only
+    # generate the output once. The enabled_if command leaves a mark
+    # every time the theme is generated.
+    counter = tmp_path / "counter"
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(f"""
+        [scope.env]
+        enabled_if = "echo generated >> '{counter}'"
+        generator = "environment_variables"
+        environment.export.SOMEVAR = "value"
+        """)
+    output = tmp_path / "cache" / "output.sh"
+    argv = [
+        sys.executable,
+        "-m",
+        "shell_themer",
+        "-f",
+        str(theme_file),
+        "generate",
+        "--output",
+        str(output),
+        "--if-stale",
+    ]
+    with contextlib.ExitStack() as stack:
+        procs = [stack.enter_context(subprocess.Popen(argv)) for _ in range(20)]
+        for proc in procs:
+            assert proc.wait(timeout=60) == 0
+    assert output.read_text() == 'export SOMEVAR="value"\n'
+    assert counter.read_text() == "generated\n"
@@ -0,0 +1,215 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+
+import pytest
+
+from shell_themer import Themer, picker
+
+THEME = """
+name = "{name}"
+
+[styles]
+text = "#f8f8f2 on #282a36"
+comment = "#6272a4"
+
+[scope.fzf]
+generator = "fzf"
+environment_variable = "FZF_DEFAULT_OPTS"
+"""
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    theme_dir = tmp_path / "themes"
+    theme_dir.mkdir()
+    for name in ["dark", "dracula", "light"]:
+        (theme_dir / f"{name}.toml").write_text(THEME.format(name=name))
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("THEME_DIR", str(theme_dir))
+    monkeypatch.setenv("SHELL_THEMER_CACHE_DIR", str(cache_dir))
+    return theme_dir, cache_dir
+
+
+def test_render_preview(thm, dirs):
+    theme_dir, _ = dirs
+    thm.load(theme_dir / "dracula.toml")
+    preview = thm.render_preview(60)
+    assert "\x1b[" in preview
+    assert "dracula" in preview
+    assert "comment" in preview
+    # every line is exactly as wide as we asked for
+    for line in preview.splitlines():
+        assert len(re.sub("\x1b\\[[0-9;]*m", "", line)) == 60
+
+
+def test_content_key(dirs):
+    theme_dir, _ = dirs
+    theme = theme_dir / "dark.toml"
+    key = picker.content_key(theme)
+    assert key == picker.content_key(theme)
+    theme.write_text(THEME.format(name="changed"))
+    assert key != picker.content_key(theme)
+
+
+def test_preview_cache(thm, dirs, capsys):
+    theme_dir, cache_dir = dirs
+    argv = ["-t", "dark", "preview", "--width", "50", "--cache"]
+    assert thm.dispatch(thm.argparser().parse_args(argv)) == Themer.EXIT_SUCCESS
+    out, _ = capsys.readouterr()
+    assert "\x1b[" in out
+    path = thm.preview_cache_file(theme_dir / "dark.toml", 50)
+    assert path.parent == cache_dir / "previews"
+    assert path.read_text() == out
+    # the second time it comes from the cache
+    path.write_text("cached")
+    assert thm.dispatch(thm.argparser().parse_args(argv)) == Themer.EXIT_SUCCESS
+    out, _ = capsys.readouterr()
+    assert out == "cached"
+
+
+@pytest.mark.usefixtures("dirs")
+def test_preview_width(thm, capsys):
+    argv = ["-t", "dark", "preview", "--width", "40"]
+    assert thm.dispatch(thm.argparser().parse_args(argv)) == Themer.EXIT_SUCCESS
+    out, _ = capsys.readouterr()
+    assert max(len(line) for line in out.splitlines()) == 40
+
+
+def _factory():
+    return Themer("shell-themer")
+
+
+def test_render_broken_theme(tmp_path):
+    theme = tmp_path / "broken.toml"
+    theme.write_text("[styles\n")
+    assert picker.render(_factory, theme, 40, tmp_path / "out.ansi") is None
+    assert not (tmp_path / "out.ansi").exists()
+
+
+@pytest.mark.usefixtures("dirs")
+def test_pick_no_fzf(thm, capsys, mocker):
+    mocker.patch("shutil.which", return_value=None)
+    assert thm.dispatch(thm.argparser().parse_args(["pick"])) == Themer.EXIT_ERROR
+    _, err = capsys.readouterr()
+    assert "fzf" in err
+
+
+@pytest.fixture
+def fake_fzf(tmp_path, monkeypatch):
+    """an fzf which waits for the previews to be rendered, and then picks
+    the theme in $FAKE_FZF_PICK"""
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    fzf = bindir / "fzf"
+    fzf.write_text(
+        f"#!{sys.executable}\n"
+        "import json, os, pathlib, sys, time\n"
+        "lines = sys.stdin.readlines()\n"
+        "record = pathlib.Path(os.environ['FAKE_FZF_RECORD'])\n"
+        "record.write_text(json.dumps({'args': sys.argv[1:], 'lines': lines}))\n"
+        "previews = pathlib.Path(os.environ['SHELL_THEMER_CACHE_DIR']) / 'previews'\n"
+        "deadline = time.monotonic() + 10\n"
+        "while time.monotonic() < deadline:\n"
+        "    if previews.is_dir() and len(list(previews.glob('[!.]*'))) >= len(lines):\n"
+        "        break\n"
+        "    time.sleep(0.01)\n"
+        "for line in lines:\n"
+        "    if line.startswith(os.environ.get('FAKE_FZF_PICK', '') + '\\t'):\n"
+        "        sys.stdout.write(line)\n"
+        "        sys.exit(0)\n"
+        "sys.exit(130)\n"
+    )
+    fzf.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bindir}{os.pathsep}{os.environ['PATH']}")
+    record = tmp_path / "fzf.json"
+    monkeypatch.setenv("FAKE_FZF_RECORD", str(record))
+    return record
+
+
+def test_pick(thm, dirs, fake_fzf, monkeypatch, mocker):
+    theme_dir, cache_dir = dirs
+    monkeypatch.setenv("FAKE_FZF_PICK", "dracula")
+    mocker.patch("shutil.get_terminal_size", return_value=os.terminal_size((100, 40)))
+    # a preview of a theme which doesn't exist any more
+    stale = cache_dir / "previews" / "0123.50.ansi"
+    stale.parent.mkdir(parents=True)
+    stale.write_text("stale")
+
+    assert thm.dispatch(thm.argparser().parse_args(["pick"])) == Themer.EXIT_SUCCESS
+    assert not stale.exists()
+    # the previews were rendered in the background at half the terminal width
+    for name in ["dark", "dracula", "light"]:
+        path = thm.preview_cache_file(theme_dir / f"{name}.toml", 50)
+        assert name in path.read_text()
+    # and we switched to the one they picked
+    generation, theme_file = thm.switch_state()
+    assert generation == 1
+    assert theme_file == str(theme_dir / "dracula.toml")
+
+    record = json.loads(fake_fzf.read_text())
+    assert [line.split("\t")[0] for line in record["lines"]] == [
+        "dark",
+        "dracula",
+        "light",
+    ]
+    assert "--preview-window=right:50:noborder" in record["args"]
+
+
+def test_pick_preview_command(thm, dirs, fake_fzf):
+    theme_dir, cache_dir = dirs
+    assert thm.dispatch(thm.argparser().parse_args(["pick"])) == Themer.EXIT_SUCCESS
+    record = json.loads(fake_fzf.read_text())
+    (preview,) = [arg for arg in record["args"] if arg.startswith("--preview=")]
+    _, key, theme_file = record["lines"][0].rstrip("\n").split("\t")
+    # do what fzf does with the preview command, at a width which hasn't
+    # been rendered yet
+    command = (
+        preview[len("--preview=") :]
+        .replace("{2}", shlex.quote(key))
+        .replace("{3}", shlex.quote(theme_file))
+    )
+    env = dict(os.environ, FZF_PREVIEW_COLUMNS="33")
+    proc = subprocess.run(
+        ["sh", "-c", command], capture_output=True, env=env, check=False
+    )
+    assert proc.returncode == 0
+    assert b"dark" in proc.stdout
+    assert (cache_dir / "previews" / f"{key}.33.ansi").read_bytes() == proc.stdout
+
+
+@pytest.mark.usefixtures("dirs", "fake_fzf")
+def test_pick_cancelled(thm, monkeypatch):
+    monkeypatch.setenv("FAKE_FZF_PICK", "nothing")
+    assert thm.dispatch(thm.argparser().parse_args(["pick"])) == Themer.EXIT_SUCCESS
+    assert thm.switch_state() == (0, None)
@@ -24,7 +24,10 @@
 # pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
 # pylint: disable=missing-module-docstring, unused-variable
 
-from shell_themer import Themer
+import pytest
+import rich.style
+
+from shell_themer import Themer, swatches
 
 
 #
@@ -61,3 +64,191 @@ def test_preview(thm_cmdline, capsys):
     tests = ["current_line", "comment", "iterm", "fzf", "someprog"]
     for test in tests:
         assert test in out
+
+
+#
+# test previews of many themes
+#
+SWATCH_THEME = """
+[styles]
+text = "#f8f8f2 on #282a36"
+background = "#282a36"
+comment = "#6272a4"
+selection = "on #44475a"
+plain = "bold"
+"""
+
+
+@pytest.fixture
+def theme_dir(tmp_path, monkeypatch):
+    for name in ["one", "two", "three", "four"]:
+        (tmp_path / f"{name}.toml").write_text(SWATCH_THEME)
+    monkeypatch.setenv("THEME_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.usefixtures("theme_dir")
+def test_preview_some(thm, capsys):
+    args = thm.argparser().parse_args(["-t", "two,one", "preview", "--width", "80"])
+    exit_code = thm.dispatch(args)
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert not err
+    lines = out.splitlines()
+    # side by side, in the order they were given
+    assert lines[0].index("two") < lines[0].index("one")
+    assert "three" not in out
+
+
+def test_preview_all(thm, theme_dir, capsys):
+    (theme_dir / "broken.toml").write_text("[styles\n")
+    args = thm.argparser().parse_args(["preview", "--all", "--width", "60"])
+    exit_code = thm.dispatch(args)
+    out, _ = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    # two panels fit in each row
+    titles = [
+        [name for name in ["broken", "four", "one", "three", "two"] if name in line]
+        for line in out.splitlines()
+        if "╭" in line
+    ]
+    assert titles == [["broken", "four"], ["one", "three"], ["two"]]
+    assert "Unexpected character" in out
+
+
+@pytest.mark.usefixtures("theme_dir")
+def test_preview_some_not_found(thm, capsys):
+    args = thm.argparser().parse_args(["-t", "one,nope", "preview"])
+    exit_code = thm.dispatch(args)
+    _, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_ERROR
+    assert "nope: theme not found" in err
+
+
+def test_preview_all_no_themes(thm, tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("THEME_DIR", str(tmp_path))
+    exit_code = thm.dispatch(thm.argparser().parse_args(["preview", "--all"]))
+    _, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_ERROR
+    assert "no themes" in err
+
+
+def test_swatch_load(theme_dir):
+    data = swatches.load(lambda: Themer("shell-themer"), theme_dir / "one.toml")
+    assert data["name"] == "one"
+    assert data["error"] is None
+    assert rich.style.Style.parse(data["text"]) == rich.style.Style.parse(
+        "#f8f8f2 on #282a36"
+    )
+    # background is shown by the panel itself
+    assert [name for name, _ in data["styles"]] == ["comment", "selection", "plain"]
+
+
+#
+# test paging and filtering
+#
+@pytest.fixture
+def big_theme(tmp_path):
+    lines = ["[styles]"]
+    for num in range(40):
+        lines.append(f'style{num:02} = "#{num:02}{num:02}{num:02}"')
+    for num in range(10):
+        lines.append(f'[scope.scope{num:02}]\ngenerator = "fzf"')
+    theme = tmp_path / "big.toml"
+    theme.write_text("\n".join(lines) + "\n")
+    return theme
+
+
+def test_preview_names(thm, big_theme):
+    thm.load(big_theme)
+    styles, scopes = thm.preview_names()
+    assert len(styles) == 40
+    assert len(scopes) == 10
+    styles, scopes = thm.preview_names("e03")
+    assert styles == ["style03"]
+    assert scopes == ["scope03"]
+    styles, scopes = thm.preview_names("s*[1]")
+    assert styles == ["style01", "style11", "style21", "style31"]
+    assert scopes == ["scope01"]
+
+
+def test_preview_pages(thm, big_theme):
+    thm.load(big_theme)
+    pages = list(thm.preview_pages(15))
+    assert len(pages) == 3
+    assert [page.subtitle for page in pages] == [
+        "page 1 of 3",
+        "page 2 of 3",
+        "page 3 of 3",
+    ]
+    # a page fits in the height it was sized for
+    page_size = thm.preview_page_size(30)
+    for page in thm.preview_pages(page_size):
+        assert len(thm.console.render_lines(page, pad=False)) <= 30
+
+
+def test_preview_page(thm, big_theme, capsys):
+    args = thm.argparser().parse_args(["-f", str(big_theme), "preview", "--page", "2"])
+    thm.console.height = 25
+    exit_code = thm.dispatch(args)
+    out, _ = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    page_size = thm.preview_page_size(25)
+    assert f"style{page_size:02}" in out
+    assert "style00" not in out
+    assert f"style{page_size * 2:02}" not in out
+    assert len(out.splitlines()) <= 25
+
+
+def test_preview_page_out_of_range(thm, big_theme, capsys):
+    args = thm.argparser().parse_args(["-f", str(big_theme), "preview", "--page", "99"])
+    exit_code = thm.dispatch(args)
+    _, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_ERROR
+    assert "99: no such page" in err
+
+
+@pytest.mark.parametrize("page", ["0", "-1", "two"])
+def test_preview_page_invalid(thm_cmdline, capsys, page):
+    exit_code = thm_cmdline(["preview", "--page", page])
+    _, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_USAGE
+    assert f"argument --page: {page}: must be a whole number of 1 or more" in err
+
+
+def test_preview_filter(thm, big_theme, capsys):
+    args = thm.argparser().parse_args(
+        ["-f", str(big_theme), "preview", "--filter", "3"]
+    )
+    exit_code = thm.dispatch(args)
+    out, _ = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert "style13" in out
+    assert "scope03" in out
+    assert "style12" not in out
+
+
+def test_preview_pager(thm, big_theme, tmp_path, monkeypatch):
+    paged = tmp_path / "paged.txt"
+    monkeypatch.setenv("PAGER", f"dd status=none of={paged}")
+    args = thm.argparser().parse_args(["-f", str(big_theme), "preview", "--pager"])
+    assert thm.dispatch(args) == Themer.EXIT_SUCCESS
+    out = paged.read_text()
+    pages = len(list(thm.preview_pages(thm.preview_page_size(thm.console.height))))
+    assert f"page {pages} of {pages}" in out
+    assert "style39" in out
+
+
+def test_preview_pager_quits(thm, big_theme, monkeypatch):
+    # a pager which quits without reading anything
+    monkeypatch.setenv("PAGER", "true")
+    args = thm.argparser().parse_args(["-f", str(big_theme), "preview", "--pager"])
+    assert thm.dispatch(args) == Themer.EXIT_SUCCESS
+
+
+def test_preview_pager_not_found(thm, big_theme, monkeypatch, capsys):
+    monkeypatch.setenv("PAGER", "no-such-pager")
+    args = thm.argparser().parse_args(["-f", str(big_theme), "preview", "--pager"])
+    assert thm.dispatch(args) == Themer.EXIT_ERROR
+    _, err = capsys.readouterr()
+    assert "no-such-pager: pager not found" in err
@@ -0,0 +1,283 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+
+import io
+import json
+import threading
+
+import pytest
+
+from shell_themer import Themer, profiler
+
+THEME = """
+[styles]
+text = "#f8f8f2 on #282a36"
+
+[scope.env]
+generator = "environment_variables"
+environment.export.THEME_TEXT = "{style:text}"
+
+[scope.gated]
+generator = "shell"
+enabled_if = "exit 0"
+command.text = "echo {style:text}"
+
+[scope.off]
+generator = "shell"
+enabled_if = "exit 1"
+command.text = "echo off"
+"""
+
+
+def _labels(report):
+    # the labels of the report, without the header, the indentation, or
+    # the times
+    return [line[: profiler.WIDTH].strip() for line in report[1:]]
+
+
+def test_profiler_nested():
+    prof = profiler.Profiler()
+    with prof.phase("outer"):
+        with prof.phase("inner", "detail"):
+            pass
+    prof.add("after", 1.0, 1.5)
+    report = prof.report()
+    assert _labels(report) == ["outer", "inner detail", "after"]
+    assert report[2].startswith("  inner detail")
+    assert report[3].split()[-1] == "500.00"
+
+
+def test_profiler_wrap():
+    prof = profiler.Profiler()
+    with prof.phase("outer"):
+        double = prof.wrap("double", lambda value: value * 2)
+        assert double(2) == 4
+        assert double(3) == 6
+    report = prof.report()
+    assert _labels(report) == ["outer", "double"]
+    assert report[2].startswith("  double")
+    assert report[2].split()[-2] == "2"
+
+
+def test_profiler_wrap_exception():
+    prof = profiler.Profiler()
+
+    def _fail():
+        raise ValueError
+
+    fail = prof.wrap("fail", _fail)
+    with pytest.raises(ValueError):
+        fail()
+    assert prof.rows[0][3] == 1
+
+
+def test_profiler_long_label():
+    prof = profiler.Profiler()
+    prof.add("x" * 100, 0, 0)
+    label = _labels(prof.report())[0]
+    assert len(label) == profiler.WIDTH
+    assert label.endswith("...")
+
+
+def test_null_profiler():
+    def _func():
+        pass
+
+    assert profiler.NULL.wrap("func", _func) is _func
+    with profiler.NULL.phase("nothing", "at all"):
+        pass
+    profiler.NULL.add("nothing", 0, 1)
+    assert not profiler.NULL.report()
+
+
+def test_themer_null_profiler(thm):
+    assert thm.profiler is profiler.NULL
+
+
+def test_main_profile(tmp_path, capsys):
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(THEME)
+    exit_code = Themer.main(["--profile", "-f", str(theme_file), "generate"])
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert "export THEME_TEXT=" in out
+    assert "echo off" not in out
+    labels = _labels(err.splitlines())
+    assert labels[:3] == ["import", "parse arguments", "generate"]
+    assert labels[-1] == "total"
+    assert [label for label in labels if label.startswith("parse toml ")]
+    assert "process definition" in labels
+    assert "parse styles" in labels
+    assert "scope env" in labels
+    assert "generator environment_variables" in labels
+    assert "enabled_if exit 0" in labels
+    assert "enabled_if exit 1" in labels
+    # the disabled scope doesn't get generated
+    assert labels.count("generator shell") == 1
+
+
+def test_main_profile_error(monkeypatch, capsys):
+    monkeypatch.delenv("THEME_DIR", raising=False)
+    exit_code = Themer.main(["--profile", "-t", "nonexistent", "generate"])
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_ERROR
+    assert not out
+    assert "total" in err
+
+
+def test_main_no_profile(tmp_path, capsys):
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(THEME)
+    exit_code = Themer.main(["-f", str(theme_file), "generate"])
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert not err
+
+
+#
+# chrome trace events from $SHELL_THEMER_TRACE
+#
+def _spans(trace):
+    return [event for event in trace["traceEvents"] if event["ph"] == "X"]
+
+
+def test_tracer_events():
+    tracer = profiler.Tracer()
+    with tracer.phase("outer"):
+        with tracer.phase("scope", "fzf"):
+            double = tracer.wrap("double", lambda value: value * 2)
+            double(1)
+            double(2)
+    tracer.add("import", profiler.IMPORT_START, profiler.IMPORT_START + 0.001)
+    trace = tracer.trace()
+    spans = _spans(trace)
+    assert [span["name"] for span in spans] == [
+        "double",
+        "double",
+        "scope fzf",
+        "outer",
+        "import",
+    ]
+    assert spans[2]["cat"] == "scope"
+    assert spans[2]["args"] == {"detail": "fzf"}
+    outer = spans[3]
+    for span in spans[:3]:
+        assert span["ts"] >= outer["ts"]
+        assert span["ts"] + span["dur"] <= outer["ts"] + outer["dur"]
+    assert spans[4]["ts"] == 0
+    assert spans[4]["dur"] == pytest.approx(1000)
+    # and the report still adds up the wrapped calls
+    assert tracer.rows[2][1:] == ["double", tracer.rows[2][2], 2]
+    names = {
+        event["args"]["name"] for event in trace["traceEvents"] if event["ph"] == "M"
+    }
+    assert names == {"shell-themer", "main"}
+
+
+def test_tracer_threads():
+    tracer = profiler.Tracer()
+
+    def _work():
+        with tracer.phase("work"):
+            pass
+
+    with tracer.phase("main"):
+        thread = threading.Thread(target=_work)
+        thread.start()
+        thread.join()
+    spans = _spans(tracer.trace())
+    tids = {span["name"]: span["tid"] for span in spans}
+    assert tids["main"] != tids["work"]
+    # each thread has its own nesting in the report
+    assert [row[0] for row in tracer.rows] == [0, 0]
+
+
+def test_main_trace(tmp_path, monkeypatch, capsys):
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(THEME)
+    trace_file = tmp_path / "trace.json"
+    monkeypatch.setenv("SHELL_THEMER_TRACE", str(trace_file))
+    exit_code = Themer.main(["-f", str(theme_file), "generate"])
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert "export THEME_TEXT=" in out
+    # without --profile there is no report
+    assert not err
+    with open(trace_file, encoding="utf-8") as file:
+        trace = json.load(file)
+    names = [span["name"] for span in _spans(trace)]
+    for name in [
+        "import",
+        "parse arguments",
+        "generate",
+        "process definition",
+        "scope env",
+        "enabled_if exit 1",
+        "generator environment_variables",
+        "total",
+    ]:
+        assert name in names
+
+
+def test_main_trace_and_profile(tmp_path, monkeypatch, capsys):
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(THEME)
+    trace_file = tmp_path / "trace.json"
+    monkeypatch.setenv("SHELL_THEMER_TRACE", str(trace_file))
+    exit_code = Themer.main(["--profile", "-f", str(theme_file), "generate"])
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert "scope env" in err
+    assert trace_file.exists()
+
+
+def test_main_trace_unwritable(tmp_path, monkeypatch, capsys):
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(THEME)
+    trace_file = tmp_path / "nonexistent" / "trace.json"
+    monkeypatch.setenv("SHELL_THEMER_TRACE", str(trace_file))
+    exit_code = Themer.main(["-f", str(theme_file), "generate"])
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    assert "export THEME_TEXT=" in out
+    assert str(trace_file) in err
+
+
+def test_main_trace_batch(tmp_path, monkeypatch):
+    trace_file = tmp_path / "trace.json"
+    monkeypatch.setenv("SHELL_THEMER_TRACE", str(trace_file))
+    docs = "".join(json.dumps({"toml": THEME}) + "\n" for _ in range(8))
+    monkeypatch.setattr("sys.stdin", io.TextIOWrapper(io.BytesIO(docs.encode())))
+    argv = ["generate", "--stdin-batch", "--jobs", "4"]
+    assert Themer.main(argv) == Themer.EXIT_SUCCESS
+    with open(trace_file, encoding="utf-8") as file:
+        spans = _spans(json.load(file))
+    documents = [span for span in spans if span["cat"] == "document"]
+    assert len(documents) == 8
+    # the documents were generated by the worker threads
+    main_tid = [span for span in spans if span["name"] == "generate"][0]["tid"]
+    assert all(span["tid"] != main_tid for span in documents)
@@ -0,0 +1,208 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+
+import json
+
+import pytest
+
+from shell_themer import Themer, history
+
+THEME = """
+[styles]
+text = "#f8f8f2 on #282a36"
+
+[scope.env]
+generator = "environment_variables"
+environment.export.THEME_TEXT = "{style:text}"
+
+[scope.gated]
+generator = "shell"
+enabled_if = "exit 0"
+command.text = "echo {style:text}"
+"""
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("SHELL_THEMER_CACHE_DIR", str(cache_dir))
+    return cache_dir
+
+
+@pytest.fixture
+def theme_file(tmp_path):
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(THEME)
+    return theme_file
+
+
+#
+# the history log
+#
+def test_append_read(tmp_path):
+    path = tmp_path / "dir" / "history.jsonl"
+    history.append(path, {"seconds": 1})
+    history.append(path, {"seconds": 2})
+    assert history.read(path) == [{"seconds": 1}, {"seconds": 2}]
+
+
+def test_read_missing(tmp_path):
+    assert not history.read(tmp_path / "history.jsonl")
+
+
+def test_read_ignores_garbage(tmp_path):
+    path = tmp_path / "history.jsonl"
+    path.write_text('{"seconds": 1}\n{"seco\n[1, 2]\n\n{"seconds": 2}\n')
+    assert history.read(path) == [{"seconds": 1}, {"seconds": 2}]
+
+
+def test_append_trims(tmp_path):
+    path = tmp_path / "history.jsonl"
+    for num in range(1000):
+        history.append(path, {"num": num}, max_bytes=1000)
+    assert path.stat().st_size <= 1000
+    records = history.read(path)
+    # the newest records are kept, and all of them are intact
+    assert records[-1] == {"num": 999}
+    nums = [record["num"] for record in records]
+    assert nums == list(range(nums[0], 1000))
+
+
+@pytest.mark.parametrize(
+    "pct, expected",
+    [(0, 1), (50, 5), (90, 9), (95, 10), (99, 10), (100, 10)],
+)
+def test_percentile(pct, expected):
+    assert history.percentile(list(range(10, 0, -1)), pct) == expected
+
+
+def test_percentile_empty():
+    assert history.percentile([], 50) is None
+
+
+def test_summarize():
+    records = [
+        {"theme": "a", "seconds": 1, "scopes": {"fzf": 0.5}},
+        {"theme": "a", "seconds": 2, "scopes": {"fzf": 0.25, "ls": 1}},
+        {"theme": "b", "seconds": 3, "scopes": None},
+        # failed runs and garbage are left out
+        {"theme": "b", "seconds": 4, "exit": 1},
+        {"theme": "b"},
+        {"theme": "b", "seconds": "slow"},
+        {"theme": "b", "seconds": 5, "scopes": {"fzf": "slow"}},
+    ]
+    themes, scopes = history.summarize(records)
+    assert themes == {"a": [1, 2], "b": [3, 5]}
+    assert scopes == {("a", "fzf"): [0.5, 0.25], ("a", "ls"): [1]}
+
+
+#
+# recording generate runs
+#
+def test_generate_history(cache_dir, theme_file, monkeypatch, capsys):
+    monkeypatch.setenv("SHELL_THEMER_HISTORY", "1")
+    assert Themer.main(["-f", str(theme_file), "generate"]) == Themer.EXIT_SUCCESS
+    out, err = capsys.readouterr()
+    assert "export THEME_TEXT=" in out
+    assert not err
+    records = history.read(cache_dir / Themer.HISTORY_FILE)
+    assert len(records) == 1
+    record = records[0]
+    assert record["theme"] == str(theme_file)
+    assert record["exit"] == Themer.EXIT_SUCCESS
+    assert record["seconds"] > 0
+    assert list(record["scopes"]) == ["env", "gated"]
+    assert record["subprocesses"] == 1
+
+
+def test_generate_history_fresh(cache_dir, theme_file, tmp_path, monkeypatch):
+    monkeypatch.setenv("SHELL_THEMER_HISTORY", "1")
+    output = tmp_path / "out.sh"
+    argv = ["-f", str(theme_file), "generate", "-o", str(output), "--if-stale"]
+    assert Themer.main(argv) == Themer.EXIT_SUCCESS
+    assert Themer.main(argv) == Themer.EXIT_SUCCESS
+    records = history.read(cache_dir / Themer.HISTORY_FILE)
+    assert len(records) == 2
+    first, second = records[0], records[1]
+    assert first["fresh"] is False
+    assert first["scopes"]
+    assert second["fresh"] is True
+    assert not second["scopes"]
+
+
+@pytest.mark.parametrize("value", [None, "", "0"])
+def test_generate_no_history(cache_dir, theme_file, monkeypatch, value):
+    if value is None:
+        monkeypatch.delenv("SHELL_THEMER_HISTORY", raising=False)
+    else:
+        monkeypatch.setenv("SHELL_THEMER_HISTORY", value)
+    assert Themer.main(["-f", str(theme_file), "generate"]) == Themer.EXIT_SUCCESS
+    assert not (cache_dir / Themer.HISTORY_FILE).exists()
+
+
+def test_generate_history_unwritable(tmp_path, theme_file, monkeypatch, capsys):
+    # the cache directory is a file, so we can't write the history
+    cache_dir = tmp_path / "cache"
+    cache_dir.write_text("")
+    monkeypatch.setenv("SHELL_THEMER_CACHE_DIR", str(cache_dir))
+    monkeypatch.setenv("SHELL_THEMER_HISTORY", "1")
+    assert Themer.main(["-f", str(theme_file), "generate"]) == Themer.EXIT_SUCCESS
+    out, err = capsys.readouterr()
+    assert "export THEME_TEXT=" in out
+    assert not err
+
+
+#
+# the stats command
+#
+def test_stats(thm_cmdline, cache_dir, capsys):
+    cache_dir.mkdir()
+    with open(cache_dir / Themer.HISTORY_FILE, "w", encoding="utf-8") as file:
+        for num in range(1, 101):
+            record = {
+                "theme": "/themes/dracula.toml",
+                "seconds": num / 1000,
+                "scopes": {"fzf": num / 10000},
+            }
+            file.write(json.dumps(record) + "\n")
+    exit_code = thm_cmdline("stats")
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_SUCCESS
+    lines = out.splitlines()
+    theme_line = [line for line in lines if "dracula" in line][0]
+    assert theme_line.split()[1:] == ["100", "50.0", "95.0", "99.0"]
+    scope_line = [line for line in lines if "fzf" in line][0]
+    assert scope_line.split() == ["fzf", "100", "5.0", "9.5", "9.9"]
+
+
+@pytest.mark.usefixtures("cache_dir")
+def test_stats_no_history(thm_cmdline, capsys):
+    exit_code = thm_cmdline("stats")
+    out, err = capsys.readouterr()
+    assert exit_code == Themer.EXIT_ERROR
+    assert not out
+    assert "SHELL_THEMER_HISTORY" in err
@@ -0,0 +1,148 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from shell_themer import Themer
+
+THEME = """
+[scope.env]
+generator = "environment_variables"
+environment.export.SOMEVAR = "{value}"
+"""
+
+LAZY_SCOPE = """
+[scope.lazytool]
+activation = "lazy"
+generator = "environment_variables"
+environment.export.LAZY = "lazy"
+"""
+
+
+@pytest.fixture
+def themes(tmp_path, mocker):
+    theme_dir = tmp_path / "themes"
+    theme_dir.mkdir()
+    for name in ["one", "two"]:
+        (theme_dir / f"{name}.toml").write_text(THEME.format(value=name))
+    mocker.patch.dict(
+        os.environ,
+        {
+            "THEME_DIR": str(theme_dir),
+            "SHELL_THEMER_CACHE_DIR": str(tmp_path / "cache"),
+        },
+    )
+    return theme_dir
+
+
+def test_switch(thm, themes, tmp_path):
+    assert thm.switch_state() == (0, None)
+    assert Themer.main(["switch", "one"]) == Themer.EXIT_SUCCESS
+    assert thm.switch_state() == (1, str(themes / "one.toml"))
+    current = tmp_path / "cache" / Themer.SWITCH_OUTPUT
+    assert current.read_text() == 'export SOMEVAR="one"\n'
+
+    assert Themer.main(["-t", "two", "switch"]) == Themer.EXIT_SUCCESS
+    assert thm.switch_state() == (2, str(themes / "two.toml"))
+    assert current.read_text() == 'export SOMEVAR="two"\n'
+
+
+def test_switch_lazy(themes, tmp_path):
+    (themes / "lazy.toml").write_text(THEME.format(value="eager") + LAZY_SCOPE)
+    assert Themer.main(["switch", "lazy"]) == Themer.EXIT_SUCCESS
+    current = (tmp_path / "cache" / Themer.SWITCH_OUTPUT).read_text()
+    assert 'export SOMEVAR="eager"\n' in current
+    assert "lazytool()" in current
+    # the fragment the wrapper sources has to be there
+    (fragment,) = (tmp_path / "cache" / "lazy").glob("*/*")
+    assert str(fragment) in current
+    assert fragment.read_text() == 'export LAZY="lazy"\n'
+
+
+@pytest.mark.usefixtures("themes")
+def test_switch_unknown_theme(capsys):
+    assert Themer.main(["switch", "three"]) == Themer.EXIT_ERROR
+    out, err = capsys.readouterr()
+    assert "theme not found" in err
+
+
+@pytest.mark.usefixtures("themes")
+def test_init_prompt_hook(thm, capsys):
+    thm.dispatch(thm.argparser().parse_args(["init", "bash"]))
+    out, _ = capsys.readouterr()
+    assert "_shell_themer_prompt() {" in out
+    assert "PROMPT_COMMAND=" in out
+    thm.dispatch(thm.argparser().parse_args(["init", "zsh"]))
+    out, _ = capsys.readouterr()
+    assert "add-zsh-hook precmd _shell_themer_prompt" in out
+
+
+@pytest.mark.skipif(not shutil.which("bash"), reason="bash is not installed")
+def test_switch_in_shell(thm_cmdline, themes, capsys):
+    thm_cmdline("init bash")
+    initcode, _ = capsys.readouterr()
+    themer = f"{shlex.quote(sys.executable)} -m shell_themer"
+    # start with a theme from $THEME_FILE, switch to another one, and
+    # show the prompt. Then show the prompt again without switching, and it
+    # shouldn't source anything
+    script = f"""
+        {initcode}
+        echo "start $SOMEVAR"
+        SOMEVAR=changed_by_hand
+        _shell_themer_prompt
+        echo "prompt $SOMEVAR"
+        {themer} switch two
+        _shell_themer_prompt
+        echo "switched $SOMEVAR $THEME_FILE"
+        SOMEVAR=changed_by_hand
+        _shell_themer_prompt
+        echo "again $SOMEVAR"
+        """
+    env = dict(os.environ, THEME_FILE=str(themes / "one.toml"))
+    proc = subprocess.run(
+        ["bash", "-c", script], env=env, capture_output=True, check=False
+    )
+    assert proc.stdout.decode().splitlines() == [
+        "start one",
+        "prompt changed_by_hand",
+        f"switched two {themes / 'two.toml'}",
+        "again changed_by_hand",
+    ]
+
+    # a new shell starts with the theme we switched to
+    proc = subprocess.run(
+        ["bash", "-c", f'{initcode}\necho "$SOMEVAR"'],
+        env=env,
+        capture_output=True,
+        check=False,
+    )
+    assert proc.stdout.decode() == "two\n"
@@ -0,0 +1,95 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+
+import pytest
+
+from shell_themer import synthetic
+
+
+def _generate_all(thm_cmdline, toml, capsys):
+    exit_code = thm_cmdline("generate", toml)
+    out, err = capsys.readouterr()
+    assert exit_code == 0
+    assert not err
+    return out
+
+
+def test_synthetic_same_seed_same_theme(synthetic_theme):
+    assert synthetic_theme(seed=42) == synthetic_theme(seed=42)
+    assert synthetic_theme(seed=42) != synthetic_theme(seed=43)
+
+
+def test_synthetic_sizes(thm, synthetic_theme):
+    thm.loads(
+        synthetic_theme(
+            variables=50,
+            styles=30,
+            scopes=3,
+            enabled_if=5,
+            fzf_options=6,
+            filesets=4,
+            globs=2,
+        )
+    )
+    assert len(thm.definition["variables"]) == 50
+    assert len(thm.styles) == 30
+    assert len(thm.definition["scope"]) == 3 * len(synthetic.GENERATORS)
+    scopedefs = thm.definition["scope"].values()
+    assert len([s for s in scopedefs if "enabled_if" in s]) == 5
+    assert len(thm.definition["scope"]["fzf0"]["opt"]) == 6
+    filesets = thm.definition["scope"]["ls_colors2"]["fileset"]
+    assert len(filesets) == 4
+    assert all(len(fileset["globs"]) == 2 for fileset in filesets.values())
+
+
+def test_synthetic_variable_chains(thm, synthetic_theme):
+    thm.loads(synthetic_theme(variables=8, chain=4))
+    assert thm.definition["variables"]["var3"] == "{var:var2}"
+    assert thm.definition["variables"]["var4"].startswith("#")
+    var0 = thm.definition["variables"]["var0"]
+    assert thm.variable_interpolate("{var:var3}") == var0
+
+
+def test_synthetic_empty(thm, thm_cmdline, synthetic_theme, capsys):
+    toml = synthetic_theme(variables=0, styles=0, scopes=0, enabled_if=0)
+    assert _generate_all(thm_cmdline, toml, capsys) == ""
+    assert not thm.styles
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_synthetic_generate(thm_cmdline, synthetic_theme, capsys, seed):
+    assert _generate_all(thm_cmdline, synthetic_theme(seed=seed), capsys)
+
+
+def test_synthetic_stress(thm, thm_cmdline, synthetic_theme, capsys):
+    # ten times bigger than the defaults, with every scope gated
+    toml = synthetic_theme(scale=10, enabled_if=1000)
+    out = _generate_all(thm_cmdline, toml, capsys)
+    assert len(thm.styles) == 200
+    for num in range(10):
+        disabled = thm.definition["scope"][f"fzf{num}"]["enabled_if"] == "false"
+        assert (f"FZF_OPTS{num}=" in out) is not disabled
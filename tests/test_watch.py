@@ -0,0 +1,168 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2023 Jared Crapo
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# pylint: disable=protected-access, missing-function-docstring, redefined-outer-name
+# pylint: disable=missing-module-docstring, unused-variable
+
+import os
+import sys
+import threading
+
+import pytest
+
+from shell_themer import Themer
+from shell_themer import watcher
+
+THEME = """
+[scope.env]
+generator = "environment_variables"
+environment.export.SOMEVAR = "{value}"
+"""
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="linux only")
+def test_inotify_watcher(tmp_path):
+    watch = watcher.InotifyWatcher([tmp_path])
+    try:
+        assert watch.wait(0.01) == set()
+        (tmp_path / "theme.toml").write_text("# a theme")
+        assert tmp_path / "theme.toml" in watch.wait(1)
+    finally:
+        watch.close()
+
+
+def test_inotify_watcher_missing_dir(tmp_path):
+    with pytest.raises(OSError):
+        watcher.InotifyWatcher([tmp_path / "nope"])
+
+
+def test_polling_watcher(tmp_path):
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text("# a theme")
+    watch = watcher.PollingWatcher([tmp_path], interval=0.01)
+    assert watch.wait(0.05) == set()
+    os.utime(theme_file, ns=(1_000_000_000, 1_000_000_000))
+    assert watch.wait(1) == {theme_file}
+    theme_file.unlink()
+    assert watch.wait(1) == {theme_file}
+
+
+def test_watcher_for(tmp_path):
+    watch = watcher.watcher_for([tmp_path], poll=True)
+    assert isinstance(watch, watcher.PollingWatcher)
+
+
+class FakeWatcher:
+    """return a canned series of changes from wait()"""
+
+    def __init__(self, changes, stop):
+        self.changes = list(changes)
+        self.stop = stop
+
+    def wait(self, timeout=None):  # pylint: disable=unused-argument
+        if self.changes:
+            return self.changes.pop(0)
+        self.stop.set()
+        return set()
+
+    def close(self):
+        self.changes = []
+
+
+def test_watch_debounce():
+    stop = threading.Event()
+    calls = []
+    changes = [
+        {"a.toml"},
+        {"a.toml"},
+        {"b.swp"},
+        {"a.toml"},
+        set(),
+        {"b.swp"},
+        set(),
+        {"b.toml"},
+        set(),
+    ]
+    fake = FakeWatcher(changes, stop)
+    watcher.watch(
+        fake, lambda path: path.endswith(".toml"), calls.append, 0.01, stop=stop
+    )
+    # the burst of changes at the start only generates once, the lone
+    # irrelevant change is ignored
+    assert calls == [{"a.toml"}, {"b.toml"}]
+
+
+def test_dispatch_watch(thm, tmp_path, mocker):
+    mocker.patch.dict(os.environ, {"SHELL_THEMER_CACHE_DIR": str(tmp_path / "cache")})
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(THEME.format(value="one"))
+
+    def _fake_watch(watch, is_relevant, callback, debounce):
+        # pylint: disable=unused-argument
+        assert is_relevant(theme_file)
+        assert not is_relevant(tmp_path / "theme.toml.swp")
+        theme_file.write_text(THEME.format(value="two"))
+        callback({theme_file})
+        # a broken theme file shouldn't stop us
+        theme_file.write_text("this isn't toml")
+        callback({theme_file})
+        raise KeyboardInterrupt
+
+    mocker.patch("shell_themer.watcher.watch", side_effect=_fake_watch)
+    args = thm.argparser().parse_args(["-f", str(theme_file), "watch", "--poll"])
+    assert thm.dispatch(args) == Themer.EXIT_SUCCESS
+    output = thm.init_output_file(str(theme_file))
+    assert output.parent == tmp_path / "cache"
+    assert output.read_text() == 'export SOMEVAR="two"\n'
+
+
+def test_dispatch_watch_for_real(thm, tmp_path, mocker):
+    theme_file = tmp_path / "theme.toml"
+    theme_file.write_text(THEME.format(value="one"))
+    output = tmp_path / "output.sh"
+    argv = ["-f", str(theme_file), "watch", "-o", str(output), "--debounce", "0.05"]
+    args = thm.argparser().parse_args(argv)
+    stop = threading.Event()
+    real_watch = watcher.watch
+
+    def _watch(*args, **kwargs):
+        real_watch(*args, stop=stop, **kwargs)
+
+    mocker.patch("shell_themer.watcher.watch", side_effect=_watch)
+    thread = threading.Thread(target=thm.dispatch, args=(args,))
+    thread.start()
+    try:
+        for _ in range(100):
+            if output.exists():
+                break
+            stop.wait(0.05)
+        assert output.read_text() == 'export SOMEVAR="one"\n'
+        theme_file.write_text(THEME.format(value="two"))
+        for _ in range(100):
+            if output.read_text() != 'export SOMEVAR="one"\n':
+                break
+            stop.wait(0.05)
+        assert output.read_text() == 'export SOMEVAR="two"\n'
+    finally:
+        stop.set()
+        thread.join()